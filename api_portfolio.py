@@ -2,12 +2,17 @@
 API routes for handling PDF Portfolio requests
 """
 import os
-import traceback
 import logging
 import sys
-import uuid
-from flask import Blueprint, send_file, jsonify, abort, current_app, session, g
+import time
+import threading
+from collections import namedtuple
+from flask import Blueprint, jsonify, abort, current_app, request, g
 from functools import wraps
+from werkzeug.exceptions import HTTPException
+from werkzeug.wsgi import FileWrapper
+from sqlalchemy import select, literal, literal_column, bindparam, event
+from sqlalchemy.orm import joinedload
 
 # Add the parent directory to sys.path to ensure imports work correctly
 parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -17,7 +22,129 @@ if parent_dir not in sys.path:
 # Create a Blueprint for portfolio API routes
 portfolio_api = Blueprint('portfolio_api', __name__, url_prefix='/api/portfolio')
 
+# Models and db from the application module. app.py imports this module while
+# it is still loading, so they are bound when the blueprint is registered
+# rather than imported here.
+db = None
+PDFPortfolio = None
+File = None
+CreatedFile = None
+FilledForm = None
+
+@portfolio_api.record_once
+def _bind_app_models(state):
+    """Bind the models of the application registering this blueprint"""
+    global db, PDFPortfolio, File, CreatedFile, FilledForm
+    app_module = sys.modules[state.app.import_name]
+    db = app_module.db
+    PDFPortfolio = app_module.PDFPortfolio
+    File = app_module.File
+    CreatedFile = app_module.CreatedFile
+    FilledForm = app_module.FilledForm
+    
+    # Keep the lookup cache in step with ORM updates and deletes
+    def on_portfolio_change(mapper, connection, target):
+        invalidate_portfolio(target.id)
+    
+    def on_file_change(mapper, connection, target):
+        invalidate_file(target.id)
+    
+    for event_name in ('after_update', 'after_delete'):
+        event.listen(PDFPortfolio, event_name, on_portfolio_change)
+        for model in (File, CreatedFile, FilledForm):
+            event.listen(model, event_name, on_file_change)
+
+# Read size used when streaming PDFs, also handed to the WSGI file wrapper
+PDF_STREAM_BUFSIZE = int(os.environ.get('PDF_STREAM_BUFSIZE', 1 << 20))
+
+# Validated portfolio and file lookups are cached for a short time so repeat
+# surface-file fetches skip the database entirely
+LOOKUP_CACHE_TTL = 30  # seconds
+LOOKUP_CACHE_MAXSIZE = 4096
+
+# Only scalar columns are cached so no detached ORM instances are kept around
+PortfolioRecord = namedtuple('PortfolioRecord', 'id user_email base_file_id surface_file_id')
+FileRecord = namedtuple('FileRecord', 'id user_email file_path original_filename')
+
+class _TTLCache:
+    """Small thread-safe cache whose entries expire after ttl seconds"""
+    
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = {}
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+    
+    def set(self, key, value):
+        with self._lock:
+            if key not in self._data and len(self._data) >= self.maxsize:
+                # Evict the oldest entry (dicts keep insertion order)
+                del self._data[next(iter(self._data))]
+            self._data[key] = (time.monotonic() + self.ttl, value)
+    
+    def invalidate(self, object_id):
+        """Drop every entry whose key starts with object_id"""
+        with self._lock:
+            for key in [key for key in self._data if key[0] == object_id]:
+                del self._data[key]
+
+_portfolio_cache = _TTLCache(LOOKUP_CACHE_MAXSIZE, LOOKUP_CACHE_TTL)
+_file_cache = _TTLCache(LOOKUP_CACHE_MAXSIZE, LOOKUP_CACHE_TTL)
+
+def invalidate_portfolio(portfolio_id):
+    """Remove a portfolio from the lookup cache"""
+    _portfolio_cache.invalidate(portfolio_id)
+
+def invalidate_file(file_id):
+    """Remove a file ID (from any file table) from the lookup cache"""
+    _file_cache.invalidate(file_id)
+
+# UNION ALL lookup across the three file tables, built once on first use
+_file_lookup_stmt = None
+
+def _get_file_lookup_stmt():
+    """Return the statement that resolves a file ID in any file table"""
+    global _file_lookup_stmt
+    if _file_lookup_stmt is None:
+        def table_select(model, source, priority):
+            return select(
+                literal(priority).label('priority'),
+                literal(source).label('src'),
+                model.id,
+                model.user_email,
+                model.file_path,
+                model.original_filename
+            ).where(model.id == bindparam('file_id'))
+        
+        # Keep the lookup priority of the old sequential queries when an ID
+        # exists in more than one table
+        _file_lookup_stmt = table_select(File, 'File', 0).union_all(
+            table_select(CreatedFile, 'CreatedFile', 1),
+            table_select(FilledForm, 'FilledForm', 2)
+        ).order_by(literal_column('priority'))
+    return _file_lookup_stmt
+
 # Helper functions for common operations
+def _require_user(f):
+    """Reject requests without a logged-in user before any database work"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not g.user_email:
+            return jsonify({'error': 'Authentication required'}), 401
+        return f(*args, **kwargs)
+    return decorated_function
+
 def get_portfolio_with_validation(portfolio_id):
     """
     Get a portfolio with validation and proper error handling
@@ -26,25 +153,31 @@ def get_portfolio_with_validation(portfolio_id):
         portfolio_id: ID of the portfolio to retrieve
         
     Returns:
-        portfolio: The portfolio object if found and validated
+        PortfolioRecord: The portfolio's id, owner and file IDs if found and validated
         
     Raises:
         HTTPException: 404 if not found, 403 if unauthorized
     """
-    from app import PDFPortfolio
+    cache_key = (portfolio_id, g.user_email)
+    cached = _portfolio_cache.get(cache_key)
+    if cached is not None:
+        return cached
     
     # Look up the portfolio
-    portfolio = PDFPortfolio.query.get(portfolio_id)
+    portfolio = db.session.get(PDFPortfolio, portfolio_id)
     if not portfolio:
-        current_app.logger.warning(f"Portfolio not found: {portfolio_id}")
+        current_app.logger.warning("Portfolio not found: %s", portfolio_id)
         abort(404, description="Portfolio not found")
         
     # Security check: portfolio owner should match the logged-in user
-    if portfolio.user_email != session.get('user_email'):
-        current_app.logger.warning(f"Access denied: User {session.get('user_email')} attempted to access portfolio owned by {portfolio.user_email}")
+    if portfolio.user_email != g.user_email:
+        current_app.logger.warning("Access denied: User %s attempted to access portfolio owned by %s", g.user_email, portfolio.user_email)
         abort(403, description="You don't have permission to access this portfolio")
-        
-    return portfolio
+    
+    record = PortfolioRecord(portfolio.id, portfolio.user_email,
+                             portfolio.base_file_id, portfolio.surface_file_id)
+    _portfolio_cache.set(cache_key, record)
+    return record
 
 def get_file_with_validation(file_id, file_type=None):
     """
@@ -52,160 +185,185 @@ def get_file_with_validation(file_id, file_type=None):
     
     Args:
         file_id: ID of the file to retrieve
-        file_type: Optional type of file to check ("File", "CreatedFile")
+        file_type: Optional type of file to check ("File", "CreatedFile", "FilledForm")
         
     Returns:
-        file: The file object if found and validated
+        tuple: (file, file_stat) where file is a FileRecord with the file's id,
+               owner, path and name if found and validated, and file_stat is
+               the os.stat result for its path. When no file_type is given the
+               lookup is a single UNION query across all file tables.
         
     Raises:
         HTTPException: 404 if not found, 403 if unauthorized
     """
-    from app import File, CreatedFile, FilledForm
-    
-    file = None
-    if file_type == "File" or file_type is None:
-        file = File.query.get(file_id)
-    
-    if (file_type == "CreatedFile" or file_type is None) and not file:
-        file = CreatedFile.query.get(file_id)
-    
-    if (file_type == "FilledForm" or file_type is None) and not file:
-        file = FilledForm.query.get(file_id)
+    cache_key = (file_id, file_type, g.user_email)
+    file = _file_cache.get(cache_key)
     
-    if not file:
-        current_app.logger.warning(f"File not found: {file_id}, type: {file_type}")
-        abort(404, description="File not found")
-    
-    # Security check: file owner should match the logged-in user
-    if file.user_email != session.get('user_email'):
-        current_app.logger.warning(f"Access denied: User {session.get('user_email')} attempted to access file owned by {file.user_email}")
-        abort(403, description="You don't have permission to access this file")
+    if file is None:
+        if file_type is None:
+            row = db.session.execute(_get_file_lookup_stmt(), {'file_id': file_id}).first()
+        else:
+            model = {'File': File, 'CreatedFile': CreatedFile, 'FilledForm': FilledForm}[file_type]
+            row = db.session.get(model, file_id)
+        
+        if not row:
+            current_app.logger.warning("File not found: %s, type: %s", file_id, file_type)
+            abort(404, description="File not found")
+        
+        # Security check: file owner should match the logged-in user
+        if row.user_email != g.user_email:
+            current_app.logger.warning("Access denied: User %s attempted to access file owned by %s", g.user_email, row.user_email)
+            abort(403, description="You don't have permission to access this file")
         
-    # Check that file exists on disk
-    if not os.path.exists(file.file_path):
-        current_app.logger.warning(f"File not found on disk: {file.file_path}")
+        file = FileRecord(row.id, row.user_email, row.file_path, row.original_filename)
+        _file_cache.set(cache_key, file)
+        
+    # Check that file exists on disk; the stat is handed back for cache validators
+    try:
+        file_stat = os.stat(file.file_path)
+    except FileNotFoundError:
+        current_app.logger.warning("File not found on disk: %s", file.file_path)
         
         # List directory contents for debugging
-        try:
-            dir_path = os.path.dirname(file.file_path)
-            if os.path.exists(dir_path):
-                dir_contents = os.listdir(dir_path)
-                current_app.logger.debug(f"Directory contents of {dir_path}:")
-                for item in dir_contents:
-                    current_app.logger.debug(f"  {item}")
-            else:
-                current_app.logger.debug(f"Directory does not exist: {dir_path}")
-        except Exception as e:
-            current_app.logger.error(f"Error listing directory: {str(e)}")
+        if current_app.logger.isEnabledFor(logging.DEBUG):
+            try:
+                dir_path = os.path.dirname(file.file_path)
+                if os.path.isdir(dir_path):
+                    current_app.logger.debug("Directory contents of %s: %s", dir_path, os.listdir(dir_path))
+                else:
+                    current_app.logger.debug("Directory does not exist: %s", dir_path)
+            except Exception as e:
+                current_app.logger.error("Error listing directory: %s", e)
         
         abort(404, description="File not found on server")
         
-    return file
+    return file, file_stat
+
+def send_pdf_file(file_path):
+    """
+    Stream a PDF through the WSGI server's file wrapper
+    
+    gunicorn and uWSGI expose wsgi.file_wrapper and use sendfile(2) when
+    handed a real file object, so the PDF never passes through Python.
+    Other servers, and Range requests, get Werkzeug's FileWrapper reading
+    PDF_STREAM_BUFSIZE chunks. It is seekable, so a 206 response starts
+    reading at the requested offset instead of skipping through the file.
+    
+    Args:
+        file_path: Path to the PDF on disk
+        
+    Returns:
+        response: Response streaming the file
+    """
+    f = open(file_path, 'rb', buffering=0)
+    try:
+        size = os.fstat(f.fileno()).st_size
+        
+        # Ask the kernel for aggressive readahead since the whole file is read in order
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        
+        wrapper = request.environ.get('wsgi.file_wrapper')
+        if wrapper is None or request.range is not None:
+            wrapper = FileWrapper
+        response = current_app.response_class(
+            wrapper(f, PDF_STREAM_BUFSIZE),
+            mimetype='application/pdf',
+            direct_passthrough=True
+        )
+    except Exception:
+        f.close()
+        raise
+    
+    # The body may never be iterated (e.g. 304), so close explicitly
+    response.call_on_close(f.close)
+    
+    # The server needs the length up front to take the sendfile path
+    response.content_length = size
+    return response
 
 # Portfolio API routes
 @portfolio_api.route('/<int:portfolio_id>/surface-file', methods=['GET'])
 @portfolio_api.route('/<int:portfolio_id>/surface', methods=['GET'])  # Alternate, cleaner URL
+@_require_user
 def get_surface_file(portfolio_id):
     """Get the surface file for a given portfolio ID"""
     # Log the request
-    current_app.logger.debug(f"Surface file requested for portfolio ID: {portfolio_id}")
+    current_app.logger.debug("Surface file requested for portfolio ID: %s", portfolio_id)
     
     try:
-        # Check if user is logged in
-        if not session.get('user_email'):
-            return jsonify({'error': 'Authentication required'}), 401
-        
-        # Import dependencies from app
-        try:
-            from app import PDFPortfolio, CreatedFile
-        except ImportError as e:
-            current_app.logger.error(f"Import error: {str(e)}")
-            return jsonify({'error': 'Server configuration error'}), 500
-        
         # Get and validate the portfolio
         portfolio = get_portfolio_with_validation(portfolio_id)
         
         # Make sure we have a surface file ID
         if not portfolio.surface_file_id:
-            current_app.logger.warning(f"No surface file ID for portfolio {portfolio_id}")
+            current_app.logger.warning("No surface file ID for portfolio %s", portfolio_id)
             return jsonify({
                 'success': False,
                 'error': 'No surface file exists for this portfolio'
             }), 404
         
-        current_app.logger.debug(f"Surface file ID: {portfolio.surface_file_id}")
+        current_app.logger.debug("Surface file ID: %s", portfolio.surface_file_id)
         
         # Get and validate the surface file
-        surface_file = get_file_with_validation(portfolio.surface_file_id, "CreatedFile")
+        surface_file, st = get_file_with_validation(portfolio.surface_file_id, "CreatedFile")
         
-        # Serve the file with cache control headers to prevent caching issues
-        response = send_file(
-            surface_file.file_path,
-            mimetype="application/pdf",
-            as_attachment=False
-        )
+        # Serve the file with validators; make_conditional turns the response
+        # into a bodiless 304 when the client's copy is still current, or a
+        # 206 when PDF.js asks for a byte range
+        response = send_pdf_file(surface_file.file_path)
+        response.set_etag(f"{surface_file.id}-{st.st_mtime_ns:x}-{st.st_size:x}")
+        response.last_modified = st.st_mtime
+        response.cache_control.private = True
+        response.cache_control.max_age = 0
+        response.cache_control.must_revalidate = True
+        response.make_conditional(request, accept_ranges=True, complete_length=st.st_size)
         
-        # Set cache control headers
-        response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate, max-age=0'
-        response.headers['Pragma'] = 'no-cache'
-        response.headers['Expires'] = '0'
-        
-        # Add ETag with file timestamp for cache validation
-        try:
-            file_timestamp = str(int(os.path.getmtime(surface_file.file_path)))
-            response.headers['ETag'] = f'"{file_timestamp}-{surface_file.id}"'
-        except Exception:
-            # Fallback if we can't get the file timestamp
-            import uuid
-            response.headers['ETag'] = f'"{uuid.uuid4()}"'
-        
-        current_app.logger.debug(f"Surface file served successfully: {surface_file.file_path}")
+        current_app.logger.debug("Surface file served successfully: %s", surface_file.file_path)
         return response
         
+    except HTTPException:
+        # 404/403 from the validation helpers
+        raise
     except Exception as e:
-        current_app.logger.error(f"Error serving surface file: {str(e)}")
-        current_app.logger.error(traceback.format_exc())
+        current_app.logger.exception("Error serving surface file")
         return jsonify({
             'success': False,
             'error': f"Error serving surface file: {str(e)}"
         }), 500
 
 @portfolio_api.route('/<int:portfolio_id>/info', methods=['GET'])
-def get_portfolio_info(portfolio_id):
-    """Get portfolio information"""
-    # Import login_required from app and apply manually to prevent circular imports
-    try:
-        from app import login_required, PDFPortfolio, File, CreatedFile
-        
-        # Security check - ensure user is logged in
-        if not session.get('user_email'):
-            return jsonify({'error': 'Authentication required'}), 401
-    except ImportError as e:
-        current_app.logger.error(f"Import error in portfolio_api: {str(e)}")
-        return jsonify({'error': 'Server configuration error'}), 500
+@_require_user
 def get_portfolio_info(portfolio_id):
     """Get information about a portfolio"""
     try:
-        # Import db, PDFPortfolio, File, CreatedFile from app context to ensure proper registration
-        from app import db, PDFPortfolio, File, CreatedFile
+        # Look up the portfolio and its files in a single query
+        portfolio = db.session.get(PDFPortfolio, portfolio_id, options=[
+            joinedload(PDFPortfolio.base_file),
+            joinedload(PDFPortfolio.surface_file)
+        ])
         
-        # Look up the portfolio
-        portfolio = PDFPortfolio.query.get_or_404(portfolio_id)
-        
-        # Get associated files
-        base_file = File.query.get(portfolio.base_file_id)
-        surface_file = None
-        if portfolio.surface_file_id:
-            surface_file = CreatedFile.query.get(portfolio.surface_file_id)
+        # Associated files are already loaded
+        if portfolio:
+            base_file = portfolio.base_file
+            surface_file = portfolio.surface_file
             
     except Exception as e:
-        tb = traceback.format_exc()
-        current_app.logger.error(f"Error getting portfolio info: {str(e)}\n{tb}")
+        current_app.logger.exception("Error getting portfolio info")
         return jsonify({
             'success': False,
             'error': f'Error retrieving portfolio information: {str(e)}'
         }), 500
     
+    if not portfolio:
+        current_app.logger.warning("Portfolio not found: %s", portfolio_id)
+        return jsonify({'success': False, 'error': 'Portfolio not found'}), 404
+    
+    # Security check: portfolio owner should match the logged-in user
+    if portfolio.user_email != g.user_email:
+        current_app.logger.warning("Access denied: User %s attempted to access portfolio owned by %s", g.user_email, portfolio.user_email)
+        return jsonify({'success': False, 'error': "You don't have permission to access this portfolio"}), 403
+    
     # Return portfolio data
     return jsonify({
         'success': True,
@@ -1,24 +1,52 @@
-import subprocess
-from flask import Flask, request, send_file, render_template, jsonify, url_for, redirect, flash, session
-from functools import wraps
+import shutil
+from flask import Flask, request, send_file, render_template, jsonify, url_for, redirect, flash, session, g, abort
+from functools import wraps, lru_cache
 import os
-import uuid
+import secrets
 import traceback
 import logging
 import hashlib
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import json
 from io import BytesIO
-from docx2pdf import convert
 import sys
-import platform
-# Cross-platform handling for DOCX to PDF conversion
-if platform.system() == 'Windows':
-    import pythoncom  # Windows-specific for COM initialization
+# Make the sibling modules importable however the app is launched
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.insert(0, current_dir)
+# DOCX to PDF conversion runs in a worker pool
+from docx_converter import convert_docx_to_pdf
+# API blueprints; registered at the bottom, once the models exist
+from api_portfolio import portfolio_api
+from error_logging_api import error_logging_api
+from diagnostics_api import diagnostics_api
+# xxhash is optional; fall back to hashlib's blake2b when it isn't installed
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+# orjson is optional; stdlib json is used when it isn't installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+# pikepdf is optional; fill-and-embed falls back to pypdf when it isn't installed
+try:
+    import pikepdf
+except ImportError:
+    pikepdf = None
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import text
-from datetime import datetime
-from werkzeug.utils import secure_filename
+from jinja2 import FileSystemBytecodeCache
+from sqlalchemy import text, select, event, delete, func, exists, insert, union_all, literal, literal_column, bindparam, inspect
+from sqlalchemy.engine import Engine
+import sqlite3
+from sqlalchemy.orm import selectinload, raiseload, joinedload
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from datetime import datetime, timedelta
+from werkzeug.utils import secure_filename, send_file as werkzeug_send_file
+from urllib.parse import quote
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfbase import pdfmetrics
@@ -27,25 +55,103 @@ from reportlab.pdfbase.acroform import AcroForm
 from flask import send_from_directory
 from pypdf import PdfReader, PdfWriter
 from pypdf.generic import DecodedStreamObject, NameObject, DictionaryObject, create_string_object, BooleanObject
-import json
 # Import PdfWrapper from PyPDFForm for form field handling
 from PyPDFForm import PdfWrapper
 
 logging.basicConfig(level=logging.DEBUG)
 
+# JSON helpers for the text columns (schemas, form data, metadata)
+if orjson is not None:
+    def _dumps(obj):
+        # PDF metadata keys are pypdf NameObjects, a str subclass orjson
+        # only accepts as a key with OPT_NON_STR_KEYS
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+    _loads = orjson.loads
+else:
+    _dumps = json.dumps
+    _loads = json.loads
+
 app = Flask(__name__)
 app.secret_key = 'your-temporary-secret-key'
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///files.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Size the pool for threaded workers; total connections per process is pool_size + max_overflow
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+    'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+    'pool_pre_ping': True,
+    'pool_recycle': 1800,
+}
+# Behind nginx/Apache, set USE_X_SENDFILE=1 to hand file bodies to the proxy
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE', '0') == '1'
+# Behind nginx, set X_ACCEL_REDIRECT_PREFIX to an internal location aliased to uploads/
+app.config['X_ACCEL_REDIRECT_PREFIX'] = os.environ.get('X_ACCEL_REDIRECT_PREFIX', '')
 db = SQLAlchemy(app)
 
+# Keep compiled templates across restarts and workers; entries are keyed on the
+# template source checksum, so edited templates are recompiled automatically
+JINJA_CACHE_DIR = os.environ.get('JINJA_CACHE_DIR', os.path.join(app.instance_path, 'jinja_cache'))
+os.makedirs(JINJA_CACHE_DIR, exist_ok=True)
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(JINJA_CACHE_DIR)
+
+@event.listens_for(Engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Use WAL so readers don't block the writer, and relax fsyncs to once per checkpoint."""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA cache_size=-65536")  # 64 MiB page cache
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")  # 256 MiB
+    cursor.close()
+
+if orjson is not None:
+    from flask.json.provider import DefaultJSONProvider
+
+    class OrjsonProvider(DefaultJSONProvider):
+        """jsonify() through orjson, keeping Flask's sorted keys and date handling."""
+        def _options(self):
+            option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+            if self.sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            return option
+
+        def dumps(self, obj, **kwargs):
+            return orjson.dumps(obj, default=self.default, option=self._options()).decode()
+
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+
+        def response(self, *args, **kwargs):
+            """Build the response body as bytes, skipping the str round-trip."""
+            obj = self._prepare_response_obj(args, kwargs)
+            option = self._options() | orjson.OPT_APPEND_NEWLINE
+            if self.compact is False or (self.compact is None and self._app.debug):
+                option |= orjson.OPT_INDENT_2
+            return self._app.response_class(
+                orjson.dumps(obj, default=self.default, option=option),
+                mimetype=self.mimetype
+            )
+
+    app.json = OrjsonProvider(app)
+
 # Custom filters
 @app.template_filter('hash')
 def hash_filter(value):
     """Generate a hash from a string value."""
     if value is None:
         return 0
-    return int(hashlib.md5(str(value).encode()).hexdigest(), 16) % 10000
+    return _hash_bucket(str(value))
+
+@lru_cache(maxsize=4096)
+def _hash_bucket(value):
+    """Map a string to a stable bucket in 0..9999 using a fast non-cryptographic hash."""
+    data = value.encode()
+    if xxhash is not None:
+        return xxhash.xxh64_intdigest(data) % 10000
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'big') % 10000
 
 # File model: for uploaded documents
 class File(db.Model):
@@ -57,6 +163,10 @@ class File(db.Model):
     upload_date = db.Column(db.DateTime, default=datetime.utcnow)
     user_email = db.Column(db.String(255), nullable=False)
     file_path = db.Column(db.String(512), nullable=False)
+    __table_args__ = (
+        # Covers the per-user listing query, including its ORDER BY
+        db.Index('ix_files_user_date', 'user_email', upload_date.desc()),
+    )
     def __init__(self, filename, original_filename, file_type, file_path, user_email):
         self.filename = filename
         self.original_filename = original_filename
@@ -75,6 +185,11 @@ class CreatedFile(db.Model):
     user_email = db.Column(db.String(255), nullable=False)
     file_path = db.Column(db.String(512), nullable=False)
     original_file_id = db.Column(db.Integer, nullable=True)  # ID of the original file used to create this file
+    __table_args__ = (
+        # One surface file per original; NULLs (editor saves) are not constrained
+        db.Index('uq_created_files_original_file_id', 'original_file_id', unique=True),
+        db.Index('ix_created_files_user_date', 'user_email', upload_date.desc()),
+    )
     def __init__(self, filename, original_filename, file_type, file_path, user_email, original_file_id=None):
         self.filename = filename
         self.original_filename = original_filename
@@ -93,13 +208,17 @@ class FilledForm(db.Model):
     filled_date = db.Column(db.DateTime, default=datetime.utcnow)
     user_email = db.Column(db.String(255), nullable=False)
     file_path = db.Column(db.String(512), nullable=False)
-    source_file_id = db.Column(db.Integer, nullable=False)  # ID of the original form that was filled
+    source_file_id = db.Column(db.Integer, index=True, nullable=False)  # ID of the original form that was filled
     form_data = db.Column(db.Text, nullable=True)  # JSON string of form field data
     form_status = db.Column(db.String(20), nullable=False, default='completed')  # Status: draft, completed, submitted
     field_count = db.Column(db.Integer, nullable=True)  # Number of fields in the form
     modified_date = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    __table_args__ = (
+        # Covers per-user listings of filled forms, newest first
+        db.Index('ix_filled_forms_user_date', 'user_email', filled_date.desc()),
+    )
     
-    def __init__(self, filename, original_filename, file_type, file_path, user_email, source_file_id, form_data=None, form_status='completed'):
+    def __init__(self, filename, original_filename, file_type, file_path, user_email, source_file_id, form_data=None, form_status='completed', field_count=None):
         self.filename = filename
         self.original_filename = original_filename
         self.file_type = file_type
@@ -108,12 +227,14 @@ class FilledForm(db.Model):
         self.source_file_id = source_file_id
         self.form_data = form_data
         self.form_status = form_status
+        # Stored so list views don't have to parse form_data; callers holding the dict can pass it
+        self.field_count = field_count if field_count is not None else len(self.get_field_values())
     
     def get_field_values(self):
         if not self.form_data:
             return {}
         try:
-            return json.loads(self.form_data)
+            return _loads(self.form_data)
         except:
             return {}
     
@@ -123,38 +244,55 @@ class FilledForm(db.Model):
             'filename': self.filename,
             'original_filename': self.original_filename,
             'file_type': self.file_type,
-            'filled_date': self.filled_date.strftime('%Y-%m-%d %H:%M:%S'),
+            'filled_date': self.filled_date.isoformat(sep=' ', timespec='seconds'),
             'user_email': self.user_email,
             'source_file_id': self.source_file_id,
             'field_count': self.field_count,
             'form_status': self.form_status,
-            'modified_date': self.modified_date.strftime('%Y-%m-%d %H:%M:%S')
+            'modified_date': self.modified_date.isoformat(sep=' ', timespec='seconds')
         }
 
 # FormDefinition model: for storing JSON-schema form definitions
 class FormDefinition(db.Model):
     __tablename__ = 'form_definitions'
     id = db.Column(db.Integer, primary_key=True)
-    file_id = db.Column(db.Integer, nullable=False)  # Reference to the original File
+    file_id = db.Column(db.Integer, index=True, nullable=False)  # Reference to the original File
     schema = db.Column(db.Text, nullable=False)  # Stored as JSON text
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     user_email = db.Column(db.String(255), nullable=False)
+    field_count = db.Column(db.Integer, nullable=True)  # Number of fields in the schema
+    # Fields are almost always read together with their form, so load them in one IN query
+    fields = db.relationship('PDFFormField', back_populates='form_def',
+                             primaryjoin='foreign(PDFFormField.form_id) == FormDefinition.id',
+                             order_by='PDFFormField.id',
+                             lazy='selectin', cascade='all, delete-orphan')
     
     def __init__(self, file_id, schema, user_email):
         self.file_id = file_id
-        self.schema = json.dumps(schema) if isinstance(schema, dict) else schema
+        self.schema = _dumps(schema) if isinstance(schema, dict) else schema
         self.user_email = user_email
+        self.field_count = len(schema.get('fields', [])) if isinstance(schema, dict) else len(self.get_schema().get('fields', []))
     
     def get_schema(self):
-        """Get schema as a Python dictionary"""
+        """Get schema as a Python dictionary
+
+        The parsed result is cached on the instance and reused until
+        ``schema`` is reassigned, so callers should treat it as read-only.
+        """
         if not self.schema:
             return {"fields": []}
+        
+        cached = self.__dict__.get('_parsed_schema')
+        if cached is not None and cached[0] is self.schema:
+            return cached[1]
             
         try:
-            return json.loads(self.schema)
+            parsed = _loads(self.schema)
         except Exception:
-            return {"fields": []}
+            parsed = {"fields": []}
+        self._parsed_schema = (self.schema, parsed)
+        return parsed
     
     def to_dict(self):
         """Convert model to dictionary for API responses"""
@@ -162,16 +300,17 @@ class FormDefinition(db.Model):
             'id': self.id,
             'file_id': self.file_id,
             'schema': self.get_schema(),
-            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-            'updated_at': self.updated_at.strftime('%Y-%m-%d %H:%M:%S'),
-            'user_email': self.user_email
+            'created_at': self.created_at.isoformat(sep=' ', timespec='seconds'),
+            'updated_at': self.updated_at.isoformat(sep=' ', timespec='seconds'),
+            'user_email': self.user_email,
+            'field_count': self.field_count
         }
 
 # New model for PDF form fields using PyPDFForm
 class PDFFormField(db.Model):
     __tablename__ = 'pdf_form_fields'
     id = db.Column(db.Integer, primary_key=True)
-    form_id = db.Column(db.Integer, nullable=False)  # Reference to FormDefinition
+    form_id = db.Column(db.Integer, index=True, nullable=False)  # Reference to FormDefinition
     name = db.Column(db.String(255), nullable=False)
     field_type = db.Column(db.String(50), nullable=False)  # text, checkbox, signature, etc.
     x = db.Column(db.Float, nullable=False)
@@ -186,6 +325,8 @@ class PDFFormField(db.Model):
     format = db.Column(db.String(50), nullable=True)  # date, number, text
     read_only = db.Column(db.Boolean, nullable=False, default=False)
     required = db.Column(db.Boolean, nullable=False, default=False)
+    form_def = db.relationship('FormDefinition', back_populates='fields',
+                               primaryjoin='foreign(PDFFormField.form_id) == FormDefinition.id')
     
     def __init__(self, form_id, name, field_type, x, y, width, height, page=0,
                 default_value=None, font_size=None, font_name=None, text_color=None,
@@ -234,11 +375,34 @@ class PDFPortfolio(db.Model):
     __tablename__ = 'pdf_portfolios'
     id = db.Column(db.Integer, primary_key=True)
     base_file_id = db.Column(db.Integer, nullable=False)  # ID of original uploaded PDF
-    surface_file_id = db.Column(db.Integer, nullable=True)  # ID of generated surface PDF with fields
+    surface_file_id = db.Column(db.Integer, index=True, nullable=True)  # ID of generated surface PDF with fields
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     user_email = db.Column(db.String(255), nullable=False)
     status = db.Column(db.String(20), nullable=False, default='active')  # active, archived
+    __table_args__ = (
+        # One portfolio per base file
+        db.Index('uq_pdf_portfolios_base_file_id', 'base_file_id', unique=True),
+        db.Index('ix_pdf_portfolios_user_created', 'user_email', created_at),
+    )
+    
+    # Read-only links to the files so callers can eager-load them with the portfolio
+    base_file = db.relationship(
+        'File',
+        primaryjoin='foreign(PDFPortfolio.base_file_id) == File.id',
+        viewonly=True
+    )
+    surface_file = db.relationship(
+        'CreatedFile',
+        primaryjoin='foreign(PDFPortfolio.surface_file_id) == CreatedFile.id',
+        viewonly=True
+    )
+    submissions = db.relationship(
+        'Submission',
+        primaryjoin='foreign(Submission.portfolio_id) == PDFPortfolio.id',
+        back_populates='portfolio',
+        viewonly=True
+    )
     
     def __init__(self, base_file_id, user_email, surface_file_id=None, status='active'):
         self.base_file_id = base_file_id
@@ -253,27 +417,45 @@ class Submission(db.Model):
     """
     __tablename__ = 'submissions'
     id = db.Column(db.Integer, primary_key=True)
-    portfolio_id = db.Column(db.Integer, nullable=True)  # Add this line
+    portfolio_id = db.Column(db.Integer, nullable=True)  # Indexed by ix_submissions_portfolio_status
     filled_file_id = db.Column(db.Integer, nullable=True)  # ID of filled surface PDF
     form_data = db.Column(db.Text, nullable=False)  # JSON string of form field values
     form_metadata = db.Column(db.Text, nullable=True)  # JSON string of PDF metadata (renamed from metadata)
     submitted_at = db.Column(db.DateTime, default=datetime.utcnow)
     user_email = db.Column(db.String(255), nullable=False)
     status = db.Column(db.String(20), nullable=False, default='submitted')  # draft, submitted, processed
+    __table_args__ = (
+        # One submission per filled form; re-saving a form updates it in place
+        db.Index('uq_submissions_filled_file_id', 'filled_file_id', unique=True),
+        # Per-portfolio counts and status filters read only this index
+        db.Index('ix_submissions_portfolio_status', 'portfolio_id', 'status'),
+    )
+    
+    portfolio = db.relationship(
+        'PDFPortfolio',
+        primaryjoin='foreign(Submission.portfolio_id) == PDFPortfolio.id',
+        back_populates='submissions',
+        viewonly=True
+    )
+    filled_file = db.relationship(
+        'FilledForm',
+        primaryjoin='foreign(Submission.filled_file_id) == FilledForm.id',
+        viewonly=True
+    )
     
     def __init__(self, portfolio_id, user_email, filled_file_id=None, form_metadata=None, status='submitted'):
         self.portfolio_id = portfolio_id
         self.filled_file_id = filled_file_id
         self.user_email = user_email
         self.status = status
-        self.form_metadata = json.dumps(form_metadata) if isinstance(form_metadata, dict) else form_metadata
+        self.form_metadata = _dumps(form_metadata) if isinstance(form_metadata, dict) else form_metadata
     
     def get_form_data(self):
         """Get form data as a Python dictionary"""
         if not self.form_data:
             return {}
         try:
-            return json.loads(self.form_data)
+            return _loads(self.form_data)
         except:
             return {}
     
@@ -282,10 +464,25 @@ class Submission(db.Model):
         if not self.form_metadata:
             return {}
         try:
-            return json.loads(self.form_metadata)
+            return _loads(self.form_metadata)
         except:
             return {}
 
+# Model for background job state; kept in the database so any worker process
+# can answer a poll and finished jobs survive a worker restart
+class BackgroundJob(db.Model):
+    """
+    Tracks one background job (surface generation, conversion, filling) for polling
+    """
+    __tablename__ = 'background_jobs'
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # surface, convert, fill_embed, fill_form, fill_batch
+    user_email = db.Column(db.String(255), nullable=True)  # NULL for jobs any caller may poll
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, done, error
+    state = db.Column(db.Text, nullable=True)  # JSON of the fields reported to the poller
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, index=True, nullable=True)
+
 # Define upload folder configuration
 UPLOAD_FOLDER_UPLOADED = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads', 'uploaded')
 UPLOAD_FOLDER_CREATED = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads', 'created')
@@ -294,6 +491,36 @@ os.makedirs(UPLOAD_FOLDER_UPLOADED, exist_ok=True)
 os.makedirs(UPLOAD_FOLDER_CREATED, exist_ok=True)
 os.makedirs(UPLOAD_FOLDER_FILLED, exist_ok=True)
 
+UPLOAD_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
+
+def send_upload(path, **kwargs):
+    """
+    Send a file from the uploads tree, letting nginx stream it when configured.
+    
+    With X_ACCEL_REDIRECT_PREFIX set, the response carries only headers and an
+    X-Accel-Redirect to the file; otherwise this is plain send_file.
+    
+    Args:
+        path: Path of the file to send
+        **kwargs: Passed through to send_file
+        
+    Returns:
+        Response object
+    """
+    prefix = app.config['X_ACCEL_REDIRECT_PREFIX']
+    abs_path = os.path.abspath(path)
+    if not prefix or os.path.commonpath([abs_path, UPLOAD_ROOT]) != UPLOAD_ROOT:
+        return send_file(path, **kwargs)
+    
+    # Let Werkzeug build the headers (Content-Disposition, ETag, 304s) for an
+    # X-Sendfile response, then point nginx at the internal location instead
+    response = werkzeug_send_file(abs_path, request.environ, use_x_sendfile=True,
+                                  response_class=app.response_class, **kwargs)
+    response.headers.pop('X-Sendfile', None)
+    rel_path = os.path.relpath(abs_path, UPLOAD_ROOT).replace(os.sep, '/')
+    response.headers['X-Accel-Redirect'] = f"{prefix.rstrip('/')}/{quote(rel_path)}"
+    return response
+
 # Test user credentials
 TEST_USER = {
     'email': 'test@shl.com',
@@ -301,10 +528,16 @@ TEST_USER = {
 }
 
 # Login required decorator
+@app.before_request
+def load_logged_in_user():
+    """Read the login state from the session once so handlers can use g."""
+    g.logged_in = session.get('logged_in', False)
+    g.user_email = session.get('user_email', '')
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if not session.get('logged_in'):
+        if not g.logged_in:
             return redirect(url_for('login'))
         return f(*args, **kwargs)
     return decorated_function
@@ -312,7 +545,7 @@ def login_required(f):
 # Make the root URL redirect to login if not authenticated
 @app.route('/')
 def index():
-    if not session.get('logged_in'):
+    if not g.logged_in:
         return redirect(url_for('login'))
     return redirect(url_for('home'))
 
@@ -323,7 +556,7 @@ def login():
         session.clear()
     
     # Redirect to home if already logged in
-    if session.get('logged_in'):
+    if g.logged_in:
         return redirect(url_for('home'))
         
     if request.method == 'POST':
@@ -344,7 +577,7 @@ def login():
 @app.route('/forgot-password', methods=['GET', 'POST'])
 def forgot_password():
     # Redirect to home if already logged in
-    if session.get('logged_in'):
+    if g.logged_in:
         return redirect(url_for('home'))
         
     if request.method == 'POST':
@@ -363,42 +596,43 @@ def logout():
     flash('You have been logged out successfully.', 'info')
     return redirect(url_for('login'))
 
+def _list_user_files(email):
+    """Return the listing columns for a user's uploaded files, newest first.
+
+    Selects plain rows instead of File objects, since the listing views only
+    read four columns and never modify them. SQLite formats the upload date,
+    so no datetime objects are built or formatted in Python.
+    """
+    rows = db.session.execute(
+        select(
+            File.id.label('id'),
+            File.original_filename.label('name'),
+            func.strftime('%Y-%m-%d %H:%M:%S', File.upload_date).label('upload_date'),
+            File.file_type.label('file_type')
+        )
+        .where(File.user_email == email)
+        .order_by(File.upload_date.desc())
+    )
+    return [row._asdict() for row in rows]
+
 # Protected home route
 @app.route('/home')
 @login_required
 def home():
-    user_files = File.query.filter_by(user_email=session['user_email']).order_by(File.upload_date.desc()).all()
-    files_data = [{
-        'id': file.id,
-        'name': file.original_filename,
-        'upload_date': file.upload_date.strftime('%Y-%m-%d %H:%M:%S'),
-        'file_type': file.file_type
-    } for file in user_files]
+    files_data = _list_user_files(g.user_email)
     
     return render_template('index.html', files=files_data)
 
 @app.route("/start-editing")
 @login_required
 def start_editing():
-    user_files = File.query.filter_by(user_email=session['user_email']).order_by(File.upload_date.desc()).all()
-    files_data = [{
-        'id': file.id,
-        'name': file.original_filename,
-        'upload_date': file.upload_date.strftime('%Y-%m-%d %H:%M:%S'),
-        'file_type': file.file_type
-    } for file in user_files]
+    files_data = _list_user_files(g.user_email)
     return render_template("pages/start_editing.html", files=files_data)
 
 @app.route("/analytics")
 @login_required
 def analytics():
-    user_files = File.query.filter_by(user_email=session['user_email']).order_by(File.upload_date.desc()).all()
-    files_data = [{
-        'id': file.id,
-        'name': file.original_filename,
-        'upload_date': file.upload_date.strftime('%Y-%m-%d %H:%M:%S'),
-        'file_type': file.file_type
-    } for file in user_files]
+    files_data = _list_user_files(g.user_email)
     
     return render_template('Pages/analytics.html', files=files_data)
 
@@ -406,13 +640,7 @@ def analytics():
 @login_required
 def submissions():
     # Get files for submissions data
-    user_files = File.query.filter_by(user_email=session['user_email']).order_by(File.upload_date.desc()).all()
-    files_data = [{
-        'id': file.id,
-        'name': file.original_filename,
-        'upload_date': file.upload_date.strftime('%Y-%m-%d %H:%M:%S'),
-        'file_type': file.file_type
-    } for file in user_files]
+    files_data = _list_user_files(g.user_email)
     return render_template("pages/submissions.html", files=files_data)
 
 @app.route("/settings")
@@ -446,12 +674,19 @@ def designer_page():
             return redirect(url_for('home'))
             
         # Check if we already have a form definition for this file
-        form_def = FormDefinition.query.filter_by(file_id=file.id).first()
+        # Fields come in with the form; any other relationship access raises instead of lazy-loading
+        form_def = FormDefinition.query.options(
+            selectinload(FormDefinition.fields), raiseload('*')
+        ).filter_by(file_id=file.id).first()
         
         # If no form definition exists, create an empty schema
         schema = {"fields": []} 
         if form_def:
-            schema = form_def.get_schema()
+            if form_def.fields:
+                schema = {"fields": [field.to_dict() for field in form_def.fields]}
+            else:
+                # Older definitions may only have the JSON schema stored
+                schema = form_def.get_schema()
         
         # Log for debugging
         logging.debug(f"[DESIGNER] Rendering designer page for file ID: {file_id}, URL: {file_url}")
@@ -469,14 +704,256 @@ def designer_page():
         flash('Error loading file for editing', 'error')
         return redirect(url_for('home'))
 
+def _form_field_rows(form_id, fields):
+    """Build PDFFormField insert mappings from designer field dicts."""
+    return [{
+        'form_id': form_id,
+        # Only generate a name when the field has none
+        'name': field['name'] if 'name' in field else f"field_{secrets.token_hex(4)}",
+        'field_type': field.get('type', 'text'),
+        'x': field.get('x', 0),
+        'y': field.get('y', 0),
+        'width': field.get('width', 100),
+        'height': field.get('height', 20),
+        'page': field.get('page', 0),
+        'default_value': field.get('default_value', ''),
+        'font_size': field.get('font_size'),
+        'font_name': field.get('font_name'),
+        'text_color': field.get('text_color'),
+        'format': field.get('format'),
+        'read_only': field.get('read_only', False),
+        'required': field.get('required', False)
+    } for field in fields]
+
+def _upsert_surface_file(original_file_id, filename, original_filename, file_path, user_email):
+    """Insert or update the CreatedFile generated from original_file_id in one statement.
+
+    Must be the first statement of its transaction: it takes SQLite's write
+    lock up front so the path it reports as replaced is the one it overwrites.
+
+    Returns:
+        (int, str or None): ID of the CreatedFile row and the surface path it
+        replaced; pass that to _remove_replaced_surface after committing
+    """
+    db.session.execute(text("BEGIN IMMEDIATE"))
+    previous_path = db.session.execute(
+        select(CreatedFile.file_path).where(CreatedFile.original_file_id == original_file_id)
+    ).scalar()
+    stmt = sqlite_insert(CreatedFile).values(
+        filename=filename,
+        original_filename=original_filename,
+        file_type='pdf',
+        file_path=file_path,
+        user_email=user_email,
+        original_file_id=original_file_id
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['original_file_id'],
+        set_={'filename': stmt.excluded.filename, 'file_path': stmt.excluded.file_path}
+    ).returning(CreatedFile.id)
+    return db.session.execute(stmt).scalar_one(), previous_path
+
+def _remove_replaced_surface(previous_path, file_path):
+    """Delete the surface file a committed _upsert_surface_file replaced."""
+    # Each save writes a new surface; the old one is a hard link into the
+    # surface cache, which can't be pruned while this link remains
+    if previous_path and previous_path != file_path:
+        try:
+            os.remove(previous_path)
+        except FileNotFoundError:
+            pass
+
+def _upsert_portfolio(base_file_id, user_email, surface_file_id):
+    """Insert or update the portfolio for base_file_id in one statement.
+
+    Returns:
+        int: ID of the PDFPortfolio row
+    """
+    stmt = sqlite_insert(PDFPortfolio).values(
+        base_file_id=base_file_id,
+        user_email=user_email,
+        surface_file_id=surface_file_id,
+        status='active'
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['base_file_id'],
+        set_={'surface_file_id': stmt.excluded.surface_file_id, 'updated_at': datetime.utcnow()}
+    ).returning(PDFPortfolio.id)
+    return db.session.execute(stmt).scalar_one()
+
+def _upsert_submission(portfolio_id, filled_file_id, form_data_json, form_metadata, user_email):
+    """Insert or update the submission for filled_file_id in one statement.
+
+    Returns:
+        int: ID of the Submission row
+    """
+    stmt = sqlite_insert(Submission).values(
+        portfolio_id=portfolio_id,
+        filled_file_id=filled_file_id,
+        form_data=form_data_json,
+        form_metadata=_dumps(form_metadata) if isinstance(form_metadata, dict) else form_metadata,
+        user_email=user_email,
+        status='submitted',
+        submitted_at=datetime.utcnow()
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['filled_file_id'],
+        set_={
+            'portfolio_id': stmt.excluded.portfolio_id,
+            'form_data': stmt.excluded.form_data,
+            'form_metadata': stmt.excluded.form_metadata,
+            'status': stmt.excluded.status,
+            'submitted_at': stmt.excluded.submitted_at
+        }
+    ).returning(Submission.id)
+    return db.session.execute(stmt).scalar_one()
+
+def _invalidate_portfolio_api(portfolio_id=None, file_id=None):
+    """Drop rows changed by Core upserts from the portfolio API lookup cache.
+
+    ORM flushes do this through mapper events; Core statements bypass them.
+    """
+    try:
+        from api_portfolio import invalidate_portfolio, invalidate_file
+    except ImportError:
+        return
+    if portfolio_id is not None:
+        invalidate_portfolio(portfolio_id)
+    if file_id is not None:
+        invalidate_file(file_id)
+
+# Background jobs
+# Jobs run in small thread pools; their state lives in the background_jobs
+# table so polls work from any worker. Finished jobs are deleted after an hour,
+# and a job still pending after JOB_STALE_AFTER seconds is reported as
+# interrupted, since the worker running it must have gone away.
+JOB_TTL = 3600
+JOB_STALE_AFTER = int(os.environ.get('JOB_STALE_AFTER', 3600))
+
+def _create_job(kind, user_email=None, **state):
+    """Record a pending job, dropping expired ones, and return its id."""
+    job_id = secrets.token_hex(16)
+    db.session.execute(
+        delete(BackgroundJob)
+        .where(BackgroundJob.finished_at < datetime.utcnow() - timedelta(seconds=JOB_TTL))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.add(BackgroundJob(id=job_id, kind=kind, user_email=user_email, status='pending', state=_dumps(state)))
+    db.session.commit()
+    return job_id
+
+def _finish_job(job_id, result):
+    """Store a job's outcome; result holds 'status' plus the fields to report."""
+    result = dict(result)
+    with app.app_context():
+        try:
+            job = db.session.get(BackgroundJob, job_id)
+            if job:
+                state = _loads(job.state) if job.state else {}
+                job.status = result.pop('status')
+                state.update(result)
+                job.state = _dumps(state)
+                job.finished_at = datetime.utcnow()
+                db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error recording result of job {job_id}: {str(e)}")
+
+def _load_job(job_id, kind, user_email=None):
+    """
+    Read a job for a status poll.
+    
+    Returns:
+        (status, state dict), or None if there is no such job for this user
+    """
+    job = db.session.get(BackgroundJob, job_id)
+    if not job or job.kind != kind or (job.user_email is not None and job.user_email != user_email):
+        return None
+    state = _loads(job.state) if job.state else {}
+    if job.status == 'pending' and (datetime.utcnow() - job.created_at).total_seconds() > JOB_STALE_AFTER:
+        return 'error', {**state, 'error': 'Job was interrupted before it finished'}
+    return job.status, state
+
+def _job_status_response(job_id, kind, user_email=None):
+    """Build the JSON reply for polling a single job."""
+    job = _load_job(job_id, kind, user_email)
+    if not job:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    status, state = job
+    return jsonify({'success': status != 'error', 'job_id': job_id, 'status': status, **state})
+
+# Background surface PDF generation, polled through /api/form-status/<job_id>
+SURFACE_JOB_WORKERS = int(os.environ.get('SURFACE_JOB_WORKERS', 2))
+_surface_executor = ThreadPoolExecutor(max_workers=SURFACE_JOB_WORKERS, thread_name_prefix='surface-pdf')
+
+def _submit_surface_job(base_file_path, base_original_filename, fields, output_path, file_id, user_email):
+    """Queue surface PDF generation for a base file and return the job id."""
+    # file_id arrives as a JSON number or string; store one form so
+    # _surface_job_superseded can match jobs for the same file
+    file_id = int(file_id)
+    job_id = _create_job('surface', user_email, file_id=file_id)
+    _surface_executor.submit(_generate_surface_job, job_id, base_file_path, base_original_filename,
+                             fields, output_path, file_id, user_email)
+    return job_id
+
+def _surface_job_superseded(job_id, file_id):
+    """True if a surface job for the same file was queued after job_id."""
+    queued_at = select(BackgroundJob.created_at).where(BackgroundJob.id == job_id).scalar_subquery()
+    return db.session.execute(select(exists().where(
+        BackgroundJob.kind == 'surface',
+        BackgroundJob.created_at > queued_at,
+        func.json_extract(BackgroundJob.state, '$.file_id') == file_id
+    ))).scalar()
+
+def _generate_surface_job(job_id, base_file_path, base_original_filename, fields, output_path, file_id, user_email):
+    """Generate the surface PDF and link it to the file's portfolio."""
+    from pdf_portfolio_utils import surface_pdf_generator
+    
+    with app.app_context():
+        try:
+            surface_path = surface_pdf_generator.create_surface_pdf_with_fields(base_file_path, fields, output_path)
+            logging.info(f"Surface PDF generated at {surface_path}")
+            
+            surface_file_id, previous_path = _upsert_surface_file(
+                file_id,
+                os.path.basename(output_path),
+                f"Form_{base_original_filename}",
+                surface_path,
+                user_email
+            )
+            portfolio_id = _upsert_portfolio(file_id, user_email, surface_file_id)
+            # Jobs finish in any order. _upsert_surface_file took SQLite's write
+            # lock, so a newer save is either visible here or links its surface
+            # after this commit; an older layout must not replace a newer one
+            if _surface_job_superseded(job_id, file_id):
+                db.session.rollback()
+                os.remove(surface_path)
+                logging.info(f"Surface job {job_id} for file {file_id} superseded by a newer save")
+                result = {'status': 'done', 'superseded': True}
+            else:
+                db.session.commit()
+                _remove_replaced_surface(previous_path, surface_path)
+                _invalidate_portfolio_api(portfolio_id, surface_file_id)
+                logging.debug(f"Portfolio updated with surface file ID: {surface_file_id}")
+                result = {'status': 'done', 'created_file_id': surface_file_id, 'portfolio_id': portfolio_id}
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error generating surface PDF: {str(e)}")
+            result = {'status': 'error', 'error': f'Error generating surface PDF: {str(e)}'}
+    
+    _finish_job(job_id, result)
+
+@app.route('/api/form-status/<job_id>')
+@login_required
+def form_status(job_id):
+    """Report the state of a background surface PDF job started by save_form_schema"""
+    return _job_status_response(job_id, 'surface', g.user_email)
+
 @app.route('/api/save-form-schema', methods=['POST'])
 @login_required
 def save_form_schema():
     """Save form schema definition and fields from designer page"""
     try:
-        # Import the PDF portfolio utilities
-        from pdf_portfolio_utils import surface_pdf_generator
-        
         data = request.json
         if not data or 'file_id' not in data or 'schema' not in data:
             return jsonify({'success': False, 'error': 'Missing required data'}), 400
@@ -486,7 +963,7 @@ def save_form_schema():
         fields = schema.get('fields', [])
         
         # Get the file to work with - this should be the base file
-        base_file = File.query.get(file_id)
+        base_file = db.session.get(File, file_id)
         if not base_file:
             return jsonify({'success': False, 'error': 'Base file not found'}), 404
         
@@ -499,105 +976,67 @@ def save_form_schema():
         
         if form_def:
             # Update existing schema
-            form_def.schema = json.dumps(schema)
+            form_def.schema = _dumps(schema)
+            form_def.field_count = len(fields)
             form_def.updated_at = datetime.utcnow()
         else:
             # Create new form definition
             form_def = FormDefinition(
                 file_id=file_id, 
                 schema=schema,
-                user_email=session.get('user_email', '')
+                user_email=g.user_email
             )
             db.session.add(form_def)
-            db.session.commit()  # Commit to get form_def.id
-        
-        # Clear existing PDF form fields
-        PDFFormField.query.filter_by(form_id=form_def.id).delete()
-        
-        # Create PDF form fields from schema
-        for field in fields:
-            pdf_field = PDFFormField(
-                form_id=form_def.id,
-                name=field.get('name', f"field_{uuid.uuid4().hex[:8]}"),
-                field_type=field.get('type', 'text'),
-                x=field.get('x', 0),
-                y=field.get('y', 0),
-                width=field.get('width', 100),
-                height=field.get('height', 20),
-                page=field.get('page', 0),
-                default_value=field.get('default_value', ''),
-                font_size=field.get('font_size'),
-                font_name=field.get('font_name'),
-                text_color=field.get('text_color'),
-                format=field.get('format'),
-                read_only=field.get('read_only', False),
-                required=field.get('required', False)
+            db.session.flush()  # Flush to get form_def.id; committed with the rest below
+        
+        # Clear existing PDF form fields with one DELETE; nothing reads the old rows afterwards
+        db.session.execute(
+            delete(PDFFormField)
+            .where(PDFFormField.form_id == form_def.id)
+            .execution_options(synchronize_session=False)
+        )
+        
+        # Create PDF form fields from schema in a single multi-row INSERT
+        field_rows = _form_field_rows(form_def.id, fields)
+        if field_rows:
+            db.session.bulk_insert_mappings(PDFFormField, field_rows)
+        
+        # Make sure the portfolio exists so its id can be returned right away;
+        # the background job links the surface file once it has been generated
+        portfolio_id, surface_file_id = db.session.execute(
+            sqlite_insert(PDFPortfolio)
+            .values(base_file_id=file_id, user_email=g.user_email, status='active')
+            .on_conflict_do_update(
+                index_elements=['base_file_id'],
+                set_={'base_file_id': PDFPortfolio.base_file_id}  # no-op so RETURNING yields the row
             )
-            db.session.add(pdf_field)
+            .returning(PDFPortfolio.id, PDFPortfolio.surface_file_id)
+        ).one()
         
-        # Save changes to the database
+        # Single commit for the form definition, its fields and the portfolio
         db.session.commit()
         
-        # Get output directory and create if necessary
-        output_dir = os.path.join(app.root_path, 'uploads', 'created')
-        os.makedirs(output_dir, exist_ok=True)
-        output_filename = f"{uuid.uuid4()}.pdf"
-        output_path = os.path.join(output_dir, output_filename)
+        output_path = os.path.join(UPLOAD_FOLDER_CREATED, f"{secrets.token_hex(16)}.pdf")
         
-        # Use surface PDF generator to create a new surface PDF with AcroForm fields
-        try:
-            # Generate the surface PDF
-            surface_path = surface_pdf_generator.create_surface_pdf(base_file.file_path, fields, output_path)
-            logging.info(f"Surface PDF generated at {surface_path}")
-            
-            # Create or update the surface file record
-            surface_file = CreatedFile.query.filter_by(original_file_id=file_id).first()
-            if not surface_file:
-                surface_file = CreatedFile(
-                    filename=output_filename,
-                    original_filename=f"Form_{base_file.original_filename}",
-                    file_type='pdf',
-                    file_path=surface_path,
-                    user_email=session.get('user_email', ''),
-                    original_file_id=file_id
-                )
-                db.session.add(surface_file)
-            else:
-                # Update existing surface file
-                surface_file.filename = output_filename
-                surface_file.file_path = surface_path
-                surface_file.modified_date = datetime.utcnow()
-            
-            db.session.commit()
-            
-            # Get or create a PDF Portfolio entry
-            portfolio = PDFPortfolio.query.filter_by(base_file_id=file_id).first()
-            if not portfolio:
-                portfolio = PDFPortfolio(
-                    base_file_id=file_id,
-                    user_email=session.get('user_email', ''),
-                    surface_file_id=surface_file.id
-                )
-                db.session.add(portfolio)
-            else:
-                # Update existing portfolio
-                portfolio.surface_file_id = surface_file.id
-                portfolio.updated_at = datetime.utcnow()
-                
-            db.session.commit()
-            logging.debug(f"Portfolio updated with surface file ID: {surface_file.id}")
-            
-        except Exception as e:
-            logging.error(f"Error generating surface PDF: {str(e)}")
-            return jsonify({'success': False, 'error': f'Error generating surface PDF: {str(e)}'}), 500
+        # Generate the surface PDF with AcroForm fields off the request thread
+        job_id = _submit_surface_job(
+            base_file.file_path,
+            base_file.original_filename,
+            fields,
+            output_path,
+            file_id,
+            g.user_email
+        )
         
         return jsonify({
             'success': True, 
+            'status': 'pending',
+            'job_id': job_id,
             'id': form_def.id,
-            'created_file_id': surface_file.id,
-            'portfolio_id': portfolio.id,
-            'message': 'Form schema and fields saved successfully'
-        })
+            'created_file_id': surface_file_id,
+            'portfolio_id': portfolio_id,
+            'message': 'Form schema and fields saved; surface PDF is being generated'
+        }), 202
         
     except Exception as e:
         db.session.rollback()
@@ -605,24 +1044,79 @@ def save_form_schema():
         return jsonify({'success': False, 'error': str(e)}), 500
 @app.route("/get-file/<file_id>", endpoint='get_file')
 def get_file(file_id):
-    file = File.query.get_or_404(file_id)
+    file = db.session.get(File, file_id) or abort(404)
     try:
-        return send_file(
-            os.path.join(UPLOAD_FOLDER_UPLOADED, file.filename),
-            mimetype='application/pdf'
+        # Stored names are unique per upload, so the bytes behind a URL never change;
+        # let browsers revalidate with ETag/Last-Modified and get 304s on reloads
+        return send_from_directory(
+            UPLOAD_FOLDER_UPLOADED,
+            file.filename,
+            mimetype='application/pdf',
+            conditional=True,
+            etag=True,
+            max_age=3600
         )
     except Exception as e:
         print(f"Error serving file: {str(e)}")
         return jsonify({'error': str(e)}), 404
 
+ALLOWED_UPLOAD_EXTENSIONS = frozenset({'pdf', 'docx'})
+# Copy uploads in 1 MiB chunks; FileStorage.save uses much smaller ones
+UPLOAD_COPY_BUFSIZE = 1 << 20
+# Concurrent file writes for multi-file uploads
+UPLOAD_SAVE_WORKERS = 4
+
+def _save_stream(stream, path):
+    """Copy a readable byte stream to path with a large copy buffer."""
+    with open(path, 'wb', buffering=0) as out:
+        shutil.copyfileobj(stream, out, length=UPLOAD_COPY_BUFSIZE)
+
+def _save_upload(file, path):
+    """Stream an uploaded FileStorage to path with a large copy buffer."""
+    _save_stream(file.stream, path)
+
+def _content_digest(stream):
+    """Hash a seekable stream's contents and rewind it; xxh3-128 when available."""
+    h = xxhash.xxh3_128() if xxhash is not None else hashlib.blake2b(digest_size=16)
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(UPLOAD_COPY_BUFSIZE), b''):
+        h.update(chunk)
+    stream.seek(0)
+    return h.hexdigest()
+
+def _save_upload_blob(file, path):
+    """Save an upload under its content-addressed path unless it is already there."""
+    if os.path.exists(path):
+        return
+    # Write to a private temp name and rename, so concurrent uploads of the
+    # same content never expose a half-written blob
+    temp_path = f"{path}.{secrets.token_hex(16)}.part"
+    try:
+        _save_upload(file, temp_path)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def _remove_unused_blob(filename, path):
+    """Delete a stored blob once no File row points at it; call after the row's delete commits."""
+    # BEGIN IMMEDIATE holds SQLite's write lock across the check and the
+    # unlink. An upload of the same bytes then commits its row either before
+    # the check, keeping the blob, or after the unlink, where api_upload_file
+    # finds the blob gone and writes it again
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        if not conn.execute(select(exists().where(File.filename == filename))).scalar():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
 @app.route('/upload', methods=['POST'])
 @login_required
 def upload_document():
     """Handle PDF / DOCX upload. Returns new file metadata."""
     try:
-        # Import the PDF portfolio utilities
-        from pdf_portfolio_utils import surface_pdf_generator
-        
         # Check if file exists in request
         if 'file' not in request.files:
             return jsonify({'success': False, 'error': 'No file part'}), 400
@@ -632,13 +1126,15 @@ def upload_document():
             return jsonify({'success': False, 'error': 'No selected file'}), 400
 
         filename = secure_filename(file.filename)
-        file_ext = filename.rsplit('.', 1)[-1].lower()
-        uid = uuid.uuid4().hex
+        file_ext = os.path.splitext(filename)[1][1:].lower()
+        if file_ext not in ALLOWED_UPLOAD_EXTENSIONS:
+            return jsonify({'success': False, 'error': 'Only PDF and DOCX allowed'}), 400
+        uid = secrets.token_hex(16)
         stored_pdf_path = os.path.join(UPLOAD_FOLDER_UPLOADED, f"{uid}.pdf")
         
         if file_ext == 'pdf':
             try:
-                file.save(stored_pdf_path)
+                _save_upload(file, stored_pdf_path)
                 logging.debug(f"PDF saved to {stored_pdf_path}")
             except Exception as e:
                 logging.error(f"Error saving PDF file: {str(e)}")
@@ -646,52 +1142,13 @@ def upload_document():
         elif file_ext == 'docx':
             temp_docx = os.path.join(UPLOAD_FOLDER_UPLOADED, f"{uid}.docx")
             try:
-                file.save(temp_docx)
+                _save_upload(file, temp_docx)
                 logging.debug(f"DOCX saved to {temp_docx}")
                 
-                # Cross-platform DOCX to PDF conversion
+                # Convert in the shared worker pool (see docx_converter)
                 try:
                     logging.debug("Starting DOCX conversion")
-                    
-                    if platform.system() == 'Windows':
-                        # Windows: Use COM initialization with pythoncom
-                        pythoncom.CoInitialize()
-                        try:
-                            convert(temp_docx, stored_pdf_path)
-                        finally:
-                            pythoncom.CoUninitialize()
-                            logging.debug("COM uninitialized")
-                    elif platform.system() == 'Darwin':  # macOS
-                        # macOS: Try docx2pdf (which uses AppleScript if Word is installed)
-                        try:
-                            convert(temp_docx, stored_pdf_path)
-                        except Exception as mac_err:
-                            logging.error(f"Native docx2pdf failed on macOS: {str(mac_err)}")
-                            # Fall back to LibreOffice if available
-                            try:
-                                subprocess.run([
-                                    'soffice', '--headless', '--convert-to', 'pdf',
-                                    '--outdir', os.path.dirname(stored_pdf_path),
-                                    temp_docx
-                                ], check=True)
-                                # Rename if needed
-                                generated_pdf = temp_docx.replace('.docx', '.pdf')
-                                if os.path.exists(generated_pdf) and generated_pdf != stored_pdf_path:
-                                    os.rename(generated_pdf, stored_pdf_path)
-                            except subprocess.SubprocessError as libre_err:
-                                raise Exception(f"LibreOffice conversion failed: {str(libre_err)}")
-                    else:  # Linux or other
-                        # Try LibreOffice / unoconv
-                        subprocess.run([
-                            'soffice', '--headless', '--convert-to', 'pdf',
-                            '--outdir', os.path.dirname(stored_pdf_path),
-                            temp_docx
-                        ], check=True)
-                        # Rename if needed
-                        generated_pdf = temp_docx.replace('.docx', '.pdf')
-                        if os.path.exists(generated_pdf) and generated_pdf != stored_pdf_path:
-                            os.rename(generated_pdf, stored_pdf_path)
-                            
+                    convert_docx_to_pdf(temp_docx, stored_pdf_path)
                     logging.debug(f"DOCX converted to PDF: {stored_pdf_path}")
                 except Exception as conv_err:
                     logging.error(f"DOCX conversion error: {str(conv_err)}")
@@ -710,15 +1167,12 @@ def upload_document():
         else:
             return jsonify({'success': False, 'error': 'Only PDF and DOCX allowed'}), 400
 
-        # Verify the PDF is readable
+        # Verify the PDF is readable. Only the page count is needed here, so
+        # parse leniently and don't walk the document info or AcroForm tree.
         try:
-            reader = PdfReader(stored_pdf_path)
-            pages = len(reader.pages)
+            reader = PdfReader(stored_pdf_path, strict=False)
+            pages = reader.get_num_pages()
             logging.debug(f"PDF verified with {pages} pages")
-            
-            # Extract PDF metadata
-            pdf_metadata = surface_pdf_generator.extract_pdf_metadata(stored_pdf_path)
-            logging.debug(f"Extracted metadata: {pdf_metadata}")
         except Exception as e:
             logging.error(f"Error reading PDF: {str(e)}")
             return jsonify({'success': False, 'error': f'Error reading PDF: {str(e)}'}), 500
@@ -730,22 +1184,23 @@ def upload_document():
                 original_filename=filename,
                 file_type='pdf',
                 file_path=stored_pdf_path,
-                user_email=session.get('user_email', '')
+                user_email=g.user_email
             )
             db.session.add(new_file)
-            db.session.commit()
+            db.session.flush()  # Assigns new_file.id without a separate commit
             logging.debug(f"Base file database record created with ID {new_file.id}")
             
             # Create PDF Portfolio entry linking base PDF (no surface PDF yet)
             portfolio = PDFPortfolio(
                 base_file_id=new_file.id,
-                user_email=session.get('user_email', ''),
+                user_email=g.user_email,
                 surface_file_id=None  # Will be set when surface PDF is generated in design page
             )
             db.session.add(portfolio)
             db.session.commit()
             logging.debug(f"PDF Portfolio created with ID {portfolio.id}")
         except Exception as db_err:
+            db.session.rollback()
             logging.error(f"Database error: {str(db_err)}")
             return jsonify({'success': False, 'error': f'Database error: {str(db_err)}'}), 500            
     except Exception as e:
@@ -765,30 +1220,24 @@ def upload_document():
 @app.route("/files")
 @login_required
 def get_files():
-    user_files = File.query.filter_by(user_email=session['user_email']).order_by(File.upload_date.desc()).all()
-    files_data = [{
-        'id': file.id,
-        'name': file.original_filename,
-        'upload_date': file.upload_date.strftime('%Y-%m-%d %H:%M:%S'),
-        'file_type': file.file_type
-    } for file in user_files]
+    files_data = _list_user_files(g.user_email)
     return jsonify(files_data)
 
 @app.route("/download/<int:file_id>")
 @login_required
 def download_file_route(file_id):
-    file = File.query.get_or_404(file_id)
-    if file.user_email != session['user_email']:
+    file = db.session.get(File, file_id) or abort(404)
+    if file.user_email != g.user_email:
         return jsonify({"error": "Unauthorized"}), 403
-    return send_file(file.file_path, 
-                    download_name=file.original_filename,
-                    as_attachment=True)
+    return send_upload(file.file_path, 
+                       download_name=file.original_filename,
+                       as_attachment=True)
 
 @app.route("/edit/<int:file_id>")
 @login_required
 def edit_file(file_id):
-    file = File.query.get_or_404(file_id)
-    if file.user_email != session['user_email']:
+    file = db.session.get(File, file_id) or abort(404)
+    if file.user_email != g.user_email:
         return jsonify({"error": "Unauthorized"}), 403
     
     # Check if we're using the portfolio approach (look for portfolio ID in query params or localStorage)
@@ -802,20 +1251,14 @@ def edit_file(file_id):
         app.logger.debug(f"Found portfolio for surface file: {portfolio.id}")
     elif portfolio_id:
         # Try to find portfolio by ID from query params
-        portfolio = PDFPortfolio.query.get(portfolio_id)
+        portfolio = db.session.get(PDFPortfolio, portfolio_id)
         app.logger.debug(f"Looking up portfolio by ID from query: {portfolio_id}")
     
     # Get form schema if available
     schema = None
     form_def = FormDefinition.query.filter_by(file_id=file_id).first()
     if form_def:
-        try:
-            if isinstance(form_def.schema, str):
-                schema = json.loads(form_def.schema)
-            else:
-                schema = form_def.schema
-        except Exception as e:
-            app.logger.error(f"Error parsing form schema: {str(e)}")
+        schema = form_def.get_schema()
     
     app.logger.debug(f"Edit file: {file_id}, portfolio: {portfolio.id if portfolio else 'None'}, use_portfolio_approach: {use_portfolio_approach}")
     
@@ -830,16 +1273,18 @@ def edit_file(file_id):
 @app.route("/delete/<int:file_id>", methods=["DELETE"])
 @login_required
 def delete_file_route(file_id):
-    file = File.query.get_or_404(file_id)
-    if file.user_email != session['user_email']:
+    file = db.session.get(File, file_id) or abort(404)
+    if file.user_email != g.user_email:
         return jsonify({"error": "Unauthorized"}), 403
     
     try:
-        # Delete physical file
-        os.remove(file.file_path)
-        # Delete database record
+        filename, file_path = file.filename, file.file_path
+        # Delete the database record first, so a failed commit never leaves
+        # a row without its file
         db.session.delete(file)
         db.session.commit()
+        # Delete physical file unless another upload shares it
+        _remove_unused_blob(filename, file_path)
         return jsonify({"message": "File deleted successfully"})
     except Exception as e:
         db.session.rollback()
@@ -848,7 +1293,7 @@ def delete_file_route(file_id):
 @app.route('/preview/<file_id>')
 @login_required
 def preview_file_route(file_id):
-    file = File.query.get_or_404(file_id)
+    file = db.session.get(File, file_id) or abort(404)
     try:
         return send_from_directory(UPLOAD_FOLDER_UPLOADED, file.filename)
     except Exception as e:
@@ -856,7 +1301,7 @@ def preview_file_route(file_id):
 
 @app.route('/api/preview/<file_id>', methods=['GET'], endpoint='api_preview_file')
 def preview_file(file_id):
-    file = File.query.get_or_404(file_id)
+    file = db.session.get(File, file_id) or abort(404)
     try:
         return send_from_directory(UPLOAD_FOLDER_UPLOADED, file.filename)
     except Exception as e:
@@ -864,18 +1309,20 @@ def preview_file(file_id):
 
 @app.route('/api/delete/<file_id>', methods=['DELETE'], endpoint='api_delete_file')
 def delete_file(file_id):
-    file = File.query.get_or_404(file_id)
+    file = db.session.get(File, file_id) or abort(404)
     try:
-        os.remove(os.path.join(UPLOAD_FOLDER_UPLOADED, file.filename))
+        filename = file.filename
         db.session.delete(file)
         db.session.commit()
+        _remove_unused_blob(filename, os.path.join(UPLOAD_FOLDER_UPLOADED, filename))
         return jsonify({'success': True})
     except Exception as e:
+        db.session.rollback()
         return jsonify({'success': False, 'error': str(e)})
 
 @app.route('/api/download/<file_id>', methods=['GET'], endpoint='api_download_file')
 def download_file(file_id):
-    file = File.query.get_or_404(file_id)
+    file = db.session.get(File, file_id) or abort(404)
     try:
         return send_file(
             os.path.join(UPLOAD_FOLDER_UPLOADED, file.filename),
@@ -892,29 +1339,110 @@ def api_upload_file():
     
     files = request.files.getlist('files[]')
     uploaded_files = []
+    file_rows = []
+    pending_saves = []
+    blob_sources = {}
     
     for file in files:
         if file and allowed_file(file.filename):
             filename = secure_filename(file.filename or '')
-            unique_filename = str(uuid.uuid4()) + os.path.splitext(filename)[1]
-            file.save(os.path.join(UPLOAD_FOLDER_UPLOADED, unique_filename))
+            # Store by content hash so repeated uploads share one blob on disk
+            unique_filename = _content_digest(file.stream) + os.path.splitext(filename)[1].lower()
+            file_path = os.path.join(UPLOAD_FOLDER_UPLOADED, unique_filename)
+            if not os.path.exists(file_path) and file_path not in blob_sources:
+                pending_saves.append((file, file_path))
+            blob_sources.setdefault(file_path, file)
             
-            new_file = File(
-                filename=unique_filename,
-                original_filename=filename,
-                file_type=os.path.splitext(filename)[1].lower()[1:],
-                file_path=os.path.join(UPLOAD_FOLDER_UPLOADED, unique_filename),
-                user_email=session.get('user_email', '')
-            )
-            db.session.add(new_file)
+            file_rows.append({
+                'filename': unique_filename,
+                'original_filename': filename,
+                'file_type': os.path.splitext(filename)[1].lower()[1:],
+                'file_path': file_path,
+                'user_email': g.user_email
+            })
             uploaded_files.append(filename)
     
+    # Write the files concurrently; the copies release the GIL while in I/O
+    if len(pending_saves) > 1:
+        with ThreadPoolExecutor(max_workers=min(UPLOAD_SAVE_WORKERS, len(pending_saves))) as executor:
+            list(executor.map(lambda item: _save_upload_blob(*item), pending_saves))
+    elif pending_saves:
+        _save_upload_blob(*pending_saves[0])
+    
     if uploaded_files:
+        # One executemany INSERT for the whole batch; the response needs no ids
+        db.session.execute(insert(File), file_rows)
         db.session.commit()
+        # A delete of the last row sharing a blob may have removed it after the
+        # exists() checks above; now that these rows are committed it can't
+        # happen again, so put back anything that went missing
+        for file_path, file in blob_sources.items():
+            if not os.path.exists(file_path):
+                file.stream.seek(0)
+                _save_upload_blob(file, file_path)
         return jsonify({'success': True, 'files': uploaded_files})
     
     return jsonify({'success': False, 'error': 'No valid files uploaded'})
 
+@app.route('/api/upload-stream/<filename>', methods=['PUT'], endpoint='api_upload_stream')
+@login_required
+def api_upload_stream(filename):
+    """
+    Upload a single file sent as the raw request body.
+    The original filename comes from the URL; the body is written straight to
+    disk without multipart parsing, so memory use stays at one copy buffer.
+    """
+    filename = secure_filename(filename)
+    if not filename or not allowed_file(filename):
+        return jsonify({'success': False, 'error': 'File type not allowed'}), 400
+    
+    unique_filename = secrets.token_hex(16) + os.path.splitext(filename)[1]
+    file_path = os.path.join(UPLOAD_FOLDER_UPLOADED, unique_filename)
+    try:
+        _save_stream(request.stream, file_path)
+        
+        new_file = File(
+            filename=unique_filename,
+            original_filename=filename,
+            file_type=os.path.splitext(filename)[1].lower()[1:],
+            file_path=file_path,
+            user_email=g.user_email
+        )
+        db.session.add(new_file)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"[UPLOAD_STREAM] Error: {str(e)}")
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        return jsonify({'success': False, 'error': str(e)}), 500
+    
+    return jsonify({'success': True, 'id': new_file.id, 'name': filename}), 201
+
+# Per-user cache of the saved-files page data, keyed on a change stamp
+SAVED_FILES_CACHE_TTL = 300
+_saved_files_cache = {}
+_saved_files_cache_lock = threading.Lock()
+
+def _saved_files_stamp(user_email):
+    """
+    Summarize the user's rows behind the saved-files page in one query.
+    
+    Any insert, delete or timestamped update changes at least one of the
+    count / max id / max date triples, so the result works as a cache key.
+    """
+    parts = [
+        select(func.count(), func.max(model.id), func.max(date_col)).where(model.user_email == user_email)
+        for model, date_col in (
+            (File, File.upload_date),
+            (CreatedFile, CreatedFile.upload_date),
+            (FilledForm, FilledForm.modified_date),
+            (PDFPortfolio, PDFPortfolio.updated_at),
+            (Submission, Submission.submitted_at),
+        )
+    ]
+    return tuple(tuple(row) for row in db.session.execute(union_all(*parts)))
+
 @app.route("/saved-files")
 @login_required
 def saved_files():
@@ -924,50 +1452,51 @@ def saved_files():
     - Surface PDFs are shown for form templates
     - Filled PDFs are grouped by portfolio
     """
-    # Get all PDF portfolios for the user with their associated files
-    portfolios = PDFPortfolio.query.filter_by(user_email=session['user_email']).all()
+    stamp = _saved_files_stamp(g.user_email)
+    with _saved_files_cache_lock:
+        cached = _saved_files_cache.get(g.user_email)
+    if cached and cached[0] == stamp and time.time() - cached[1] < SAVED_FILES_CACHE_TTL:
+        return render_template("pages/saved_files/saved_files.html", **cached[2])
+    
+    # Get all PDF portfolios for the user with their associated files in a
+    # fixed number of queries; any other relationship access raises
+    portfolios = db.session.execute(
+        select(PDFPortfolio)
+        .where(PDFPortfolio.user_email == g.user_email)
+        .options(
+            joinedload(PDFPortfolio.base_file),
+            joinedload(PDFPortfolio.surface_file),
+            selectinload(PDFPortfolio.submissions).joinedload(Submission.filled_file),
+            raiseload('*')
+        )
+    ).unique().scalars().all()
     
     # Create portfolio data structure
     portfolio_data = []
     
     for portfolio in portfolios:
         # Get base file (original upload - not shown to users directly)
-        base_file = File.query.get(portfolio.base_file_id)
+        base_file = portfolio.base_file
         if not base_file:
             continue
             
         # Get surface file (with AcroForm fields)
-        surface_file = None
-        if portfolio.surface_file_id:
-            surface_file = CreatedFile.query.get(portfolio.surface_file_id)
-        
-        # Get submissions for this portfolio - with error handling for schema migration
-        try:
-            submissions = Submission.query.filter_by(portfolio_id=portfolio.id).all()
-        except Exception as e:
-            logging.error(f"Error querying submissions by portfolio_id: {str(e)}")
-            submissions = []  # Default to empty list if query fails
+        surface_file = portfolio.surface_file
         
         # Get filled forms from submissions
         filled_forms = []
-        for submission in submissions:
-            if hasattr(submission, 'filled_file_id') and submission.filled_file_id:
-                filled_form = FilledForm.query.get(submission.filled_file_id)
-                if filled_form:
-                    submission_metadata = {}
-                    if hasattr(submission, 'form_metadata') and submission.form_metadata:
-                        try:
-                            submission_metadata = json.loads(submission.form_metadata)
-                        except Exception as e:
-                            logging.error(f"Error parsing submission metadata: {str(e)}")
-                    
-                    filled_forms.append({
-                        'id': filled_form.id,
-                        'name': filled_form.original_filename,
-                        'filled_date': filled_form.filled_date.strftime('%Y-%m-%d %H:%M:%S'),
-                        'submission_id': submission.id,
-                        'metadata': submission_metadata
-                    })
+        for submission in portfolio.submissions:
+            filled_form = submission.filled_file
+            if filled_form:
+                submission_metadata = submission.get_form_metadata()
+                
+                filled_forms.append({
+                    'id': filled_form.id,
+                    'name': filled_form.original_filename,
+                    'filled_date': filled_form.filled_date.isoformat(sep=' ', timespec='seconds'),
+                    'submission_id': submission.id,
+                    'metadata': submission_metadata
+                })
         
         # Add portfolio to result
         portfolio_data.append({
@@ -975,63 +1504,72 @@ def saved_files():
             'base_file': {
                 'id': base_file.id,
                 'name': base_file.original_filename,
-                'upload_date': base_file.upload_date.strftime('%Y-%m-%d %H:%M:%S')
+                'upload_date': base_file.upload_date.isoformat(sep=' ', timespec='seconds')
             },
             'surface_file': {
                 'id': surface_file.id if surface_file else None,
                 'name': surface_file.original_filename if surface_file else None,
-                'upload_date': surface_file.upload_date.strftime('%Y-%m-%d %H:%M:%S') if surface_file else None
+                'upload_date': surface_file.upload_date.isoformat(sep=' ', timespec='seconds') if surface_file else None
             } if surface_file else None,
             'filled_forms': filled_forms,
             'status': portfolio.status,
-            'created_at': portfolio.created_at.strftime('%Y-%m-%d %H:%M:%S')
+            'created_at': portfolio.created_at.isoformat(sep=' ', timespec='seconds')
         })
     
     # Get any legacy uploaded files not in portfolios
-    all_portfolio_base_file_ids = [p.base_file_id for p in portfolios]
-    legacy_files = File.query.filter(
-        File.user_email == session['user_email'],
-        ~File.id.in_(all_portfolio_base_file_ids) if all_portfolio_base_file_ids else True
+    legacy_files = File.query.with_entities(
+        File.id, File.original_filename, File.upload_date, File.file_type
+    ).filter(
+        File.user_email == g.user_email,
+        ~exists().where(PDFPortfolio.base_file_id == File.id)
     ).order_by(File.upload_date.desc()).all()
     
     legacy_files_data = [{
         'id': file.id,
         'name': file.original_filename,
-        'upload_date': file.upload_date.strftime('%Y-%m-%d %H:%M:%S'),
+        'upload_date': file.upload_date.isoformat(sep=' ', timespec='seconds'),
         'file_type': file.file_type,
         'source': 'legacy_uploaded'
     } for file in legacy_files]
     
     # Get any legacy created files not linked to portfolios
-    legacy_created_files = CreatedFile.query.filter_by(user_email=session['user_email']).all()
+    legacy_created_files = CreatedFile.query.with_entities(
+        CreatedFile.id, CreatedFile.original_filename, CreatedFile.upload_date, CreatedFile.file_type
+    ).filter_by(user_email=g.user_email).all()
     
     legacy_created_files_data = [{
         'id': file.id,
         'name': file.original_filename,
-        'upload_date': file.upload_date.strftime('%Y-%m-%d %H:%M:%S'),
+        'upload_date': file.upload_date.isoformat(sep=' ', timespec='seconds'),
         'file_type': file.file_type,
         'source': 'legacy_created'
     } for file in legacy_created_files]
     
     # Get any legacy filled forms
-    legacy_filled_forms = FilledForm.query.filter_by(user_email=session['user_email']).all()
+    legacy_filled_forms = FilledForm.query.with_entities(
+        FilledForm.id, FilledForm.original_filename, FilledForm.filled_date,
+        FilledForm.file_type, FilledForm.source_file_id
+    ).filter_by(user_email=g.user_email).all()
     
     legacy_filled_forms_data = [{
         'id': form.id,
         'name': form.original_filename,
-        'filled_date': form.filled_date.strftime('%Y-%m-%d %H:%M:%S'),
+        'filled_date': form.filled_date.isoformat(sep=' ', timespec='seconds'),
         'file_type': form.file_type,
         'source': 'legacy_filled',
         'source_file_id': form.source_file_id
     } for form in legacy_filled_forms]
     
-    return render_template(
-        "pages/saved_files/saved_files.html", 
-        portfolios=portfolio_data,
-        legacy_files=legacy_files_data,
-        legacy_created_files=legacy_created_files_data,
-        legacy_filled_forms=legacy_filled_forms_data
-    )
+    context = {
+        'portfolios': portfolio_data,
+        'legacy_files': legacy_files_data,
+        'legacy_created_files': legacy_created_files_data,
+        'legacy_filled_forms': legacy_filled_forms_data
+    }
+    with _saved_files_cache_lock:
+        _saved_files_cache[g.user_email] = (stamp, time.time(), context)
+    
+    return render_template("pages/saved_files/saved_files.html", **context)
 
 @app.route("/save-form", methods=["POST"])
 @login_required
@@ -1051,14 +1589,11 @@ def save_form():
         filename = secure_filename(file.filename)
         
         # Create unique filename for storage
-        unique_filename = f"{uuid.uuid4()}.pdf"
-        
-        # Ensure the created folder exists
-        os.makedirs(UPLOAD_FOLDER_CREATED, exist_ok=True)
+        unique_filename = f"{secrets.token_hex(16)}.pdf"
         
         # Save to filesystem
         file_path = os.path.join(UPLOAD_FOLDER_CREATED, unique_filename)
-        file.save(file_path)
+        _save_upload(file, file_path)
         
         logging.debug(f"[SAVE_FORM] File saved to {file_path}")
         
@@ -1068,7 +1603,7 @@ def save_form():
             original_filename=filename,
             file_type='pdf',
             file_path=file_path,
-            user_email=session['user_email']
+            user_email=g.user_email
         )
         
         # Add and commit to database
@@ -1100,19 +1635,43 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+_listdir_cache = {}
+_listdir_cache_lock = threading.Lock()
+
+def cached_listdir(directory):
+    """
+    List a directory, reusing the previous listing while its mtime is unchanged.
+    
+    Args:
+        directory: Path of the directory to list
+        
+    Returns:
+        frozenset of entry names
+    """
+    mtime = os.stat(directory).st_mtime_ns
+    with _listdir_cache_lock:
+        cached = _listdir_cache.get(directory)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    entries = frozenset(os.listdir(directory))
+    with _listdir_cache_lock:
+        _listdir_cache[directory] = (mtime, entries)
+    return entries
+
 @app.route('/api/cleanup', methods=['POST'])
 def cleanup_files():
     try:
         # Delete all records from the database
-        File.query.delete()
+        db.session.execute(delete(File))
         db.session.commit()
         
-        # Delete all files from the uploads directory
+        # Delete all files from the uploads directory; DirEntry caches the
+        # file type, so there is no extra stat per entry
         upload_dir = UPLOAD_FOLDER_UPLOADED
-        for filename in os.listdir(upload_dir):
-            file_path = os.path.join(upload_dir, filename)
-            if os.path.isfile(file_path):
-                os.remove(file_path)
+        with os.scandir(upload_dir) as entries:
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False):
+                    os.unlink(entry.path)
         
         return jsonify({'success': True, 'message': 'All files cleaned up successfully'})
     except Exception as e:
@@ -1126,9 +1685,10 @@ def sync_files():
         db_files = File.query.all()
         db_files_dict = {file.filename: file for file in db_files}
         
-        # Get all files from upload directory
+        # Get all files from upload directory; this path deletes rows and
+        # files, so read the directory fresh rather than from the mtime cache
         upload_dir = UPLOAD_FOLDER_UPLOADED
-        actual_files = set(os.listdir(upload_dir))
+        actual_files = frozenset(os.listdir(upload_dir))
         
         # Remove database records where physical file is missing
         for db_file in db_files:
@@ -1161,12 +1721,12 @@ def sync_files():
 def list_files():
     try:
         # Get all files from database
-        db_files = File.query.all()
-        db_files_info = [{'id': f.id, 'name': f.name, 'filename': f.filename} for f in db_files]
+        db_files = File.query.with_entities(File.id, File.original_filename, File.filename).all()
+        db_files_info = [{'id': f.id, 'name': f.original_filename, 'filename': f.filename} for f in db_files]
         
         # Get all files from upload directory
         upload_dir = UPLOAD_FOLDER_UPLOADED
-        actual_files = os.listdir(upload_dir)
+        actual_files = sorted(cached_listdir(upload_dir))
         
         return jsonify({
             'success': True,
@@ -1189,53 +1749,39 @@ def convert_to_pdf(file_path, output_path=None):
     """
     if not output_path:
         output_path = file_path.replace('.docx', '.pdf')
-        
-    if platform.system() == 'Windows':
-        try:
-            pythoncom.CoInitialize()  # Initialize COM
-            convert(file_path, output_path)  # docx2pdf conversion
-        finally:
-            pythoncom.CoUninitialize()  # Cleanup
-    elif platform.system() == 'Darwin':  # macOS
+    return convert_docx_to_pdf(file_path, output_path)
+
+CONVERT_JOB_WORKERS = int(os.environ.get('CONVERT_JOB_WORKERS', 2))
+_convert_executor = ThreadPoolExecutor(max_workers=CONVERT_JOB_WORKERS, thread_name_prefix='docx-convert')
+
+def _convert_document_job(job_id, file_path, pdf_path, pdf_filename, original_filename, user_email):
+    """Convert a DOCX upload to PDF and record the result as a new File."""
+    with app.app_context():
         try:
-            # Try docx2pdf first (uses AppleScript if Word is installed)
-            convert(file_path, output_path)
-        except Exception as mac_err:
-            logging.error(f"Native docx2pdf failed on macOS: {str(mac_err)}")
-            # Fall back to LibreOffice if available
-            try:
-                output_dir = os.path.dirname(output_path)
-                subprocess.run([
-                    'soffice', '--headless', '--convert-to', 'pdf',
-                    '--outdir', output_dir,
-                    file_path
-                ], check=True)
-                # Rename if needed
-                generated_pdf = file_path.replace('.docx', '.pdf')
-                if os.path.exists(generated_pdf) and generated_pdf != output_path:
-                    os.rename(generated_pdf, output_path)
-            except subprocess.SubprocessError as libre_err:
-                raise Exception(f"LibreOffice conversion failed: {str(libre_err)}")
-    else:  # Linux or other
-        # Use LibreOffice
-        output_dir = os.path.dirname(output_path)
-        subprocess.run([
-            'soffice', '--headless', '--convert-to', 'pdf',
-            '--outdir', output_dir,
-            file_path
-        ], check=True)
-        # Rename if needed
-        generated_pdf = file_path.replace('.docx', '.pdf')
-        if os.path.exists(generated_pdf) and generated_pdf != output_path:
-            os.rename(generated_pdf, output_path)
-    
-    return output_path
-
-# Example usage in a route:
+            output_path = convert_to_pdf(file_path, pdf_path)
+            
+            # Create a new File record for the PDF
+            pdf_file = File(
+                filename=pdf_filename,
+                original_filename=f"{os.path.splitext(original_filename)[0]}.pdf",
+                file_type='pdf',
+                file_path=output_path,
+                user_email=user_email
+            )
+            db.session.add(pdf_file)
+            db.session.commit()
+            result = {'status': 'done', 'pdf_file_id': pdf_file.id}
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error converting document: {str(e)}")
+            result = {'status': 'error', 'error': str(e)}
+    
+    _finish_job(job_id, result)
+
 @app.route('/convert/<file_id>', methods=['POST'])
 def convert_document(file_id):
     try:
-        file = File.query.get_or_404(file_id)
+        file = db.session.get(File, file_id) or abort(404)
         file_path = os.path.join(UPLOAD_FOLDER_UPLOADED, file.filename)
         
         # Only proceed if it's a DOCX file
@@ -1246,32 +1792,29 @@ def convert_document(file_id):
         pdf_filename = f"{os.path.splitext(file.filename)[0]}.pdf"
         pdf_path = os.path.join(UPLOAD_FOLDER_UPLOADED, pdf_filename)
         
-        # Convert to PDF using our platform-specific function
-        output_path = convert_to_pdf(file_path, pdf_path)
-        
-        # Create a new File record for the PDF
-        pdf_file = File(
-            filename=pdf_filename,
-            original_filename=f"{os.path.splitext(file.original_filename)[0]}.pdf",
-            file_type='pdf',
-            file_path=output_path,
-            user_email=file.user_email
-        )
-        db.session.add(pdf_file)
-        db.session.commit()
+        # Queue the conversion; the file's owner polls /convert/status/<job_id>
+        job_id = _create_job('convert', file.user_email, file_id=file.id)
+        _convert_executor.submit(_convert_document_job, job_id, file_path, pdf_path,
+                                 pdf_filename, file.original_filename, file.user_email)
         
         return jsonify({
             'success': True,
-            'pdf_file_id': pdf_file.id,
-            'pdf_path': pdf_path
-        })
+            'status': 'pending',
+            'job_id': job_id
+        }), 202
     except Exception as e:
         logging.error(f"Error converting document: {str(e)}")
         return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/convert/status/<job_id>')
+@login_required
+def convert_status(job_id):
+    """Report the state of a background DOCX conversion started by convert_document"""
+    return _job_status_response(job_id, 'convert', g.user_email)
+
 @app.route('/editor/<file_id>')
 def editor(file_id):
-    file = File.query.get_or_404(file_id)
+    file = db.session.get(File, file_id) or abort(404)
     file_path = os.path.join(UPLOAD_FOLDER_UPLOADED, file.filename)
     if not os.path.exists(file_path):
         flash('File not found', 'error')
@@ -1282,11 +1825,11 @@ def editor(file_id):
 @login_required
 def design(file_id):
     # Try to find the file in regular files table first
-    file = File.query.get(file_id)
+    file = db.session.get(File, file_id)
     
     # If not found, try created files
     if not file:
-        file = CreatedFile.query.get_or_404(file_id)
+        file = db.session.get(CreatedFile, file_id) or abort(404)
     
     # Generate URL for serving the PDF
     file_url = url_for('serve_pdf', file_id=file.id)
@@ -1300,11 +1843,11 @@ def design(file_id):
 @login_required
 def get_design_file(file_id):
     # Try to fetch file from regular files database first
-    file = File.query.get(file_id)
+    file = db.session.get(File, file_id)
     
     # If not found in regular files, try created files
     if not file:
-        file = CreatedFile.query.get(file_id)
+        file = db.session.get(CreatedFile, file_id)
         print(f'[SERVE] File found in CreatedFile table: {file_id}')
     
     # If still not found, return 404
@@ -1313,27 +1856,27 @@ def get_design_file(file_id):
         return jsonify({'error': 'File not found'}), 404
     
     # Security check
-    if file.user_email != session['user_email']:
-        print(f'[SERVE] Unauthorized access for file {file_id} by user {session.get("user_email")}')
+    if file.user_email != g.user_email:
+        print(f'[SERVE] Unauthorized access for file {file_id} by user {g.user_email}')
         return jsonify({'error': 'Unauthorized'}), 403
     try:
         print(f'[SERVE] Attempting to serve file: {file.file_path}')
-        if not os.path.exists(file.file_path):
-            print(f'[SERVE] File not found on disk: {file.file_path}')
-            return jsonify({'error': 'File not found'}), 404
         return send_file(
             file.file_path,
             mimetype='application/pdf'
         )
+    except FileNotFoundError:
+        print(f'[SERVE] File not found on disk: {file.file_path}')
+        return jsonify({'error': 'File not found'}), 404
     except Exception as e:
         print(f"[SERVE ERROR] {str(e)}")
         return jsonify({'error': str(e)}), 404
 
 @app.route('/view/file/<file_id>', endpoint='view_file')
 def view_file(file_id):
-    file = File.query.get_or_404(file_id)
+    file = db.session.get(File, file_id) or abort(404)
     try:
-        return send_file(
+        return send_upload(
             os.path.join(UPLOAD_FOLDER_UPLOADED, file.filename),
             mimetype='application/pdf'
         )
@@ -1346,11 +1889,52 @@ def pdf_editor():
     file_id = request.args.get('file_id')
     if not file_id:
         return redirect(url_for('start_editing'))
-    file = File.query.get_or_404(file_id)
+    file = db.session.get(File, file_id) or abort(404)
     # Generate a local URL for the PDF file (served by another Flask route)
     file_url = url_for('serve_pdf', file_id=file.id)
     return render_template('Pages/f_designer/designpage.html', file=file, file_url=file_url)
 
+# Last location found per (stored path, filename); misses are never cached
+_pdf_path_cache = {}
+_pdf_path_cache_lock = threading.Lock()
+PDF_PATH_CACHE_SIZE = 4096
+
+def _resolve_pdf_path(stored_path, filename):
+    """
+    Return the first existing location for a stored file, or None.
+    A remembered location costs one stat to confirm; when it has gone away
+    only this file's entry is dropped and the folders are searched again.
+    """
+    key = (stored_path, filename)
+    with _pdf_path_cache_lock:
+        cached = _pdf_path_cache.get(key)
+    if cached is not None and os.path.isfile(cached):
+        return cached
+    
+    path = _find_pdf_path(stored_path, filename)
+    with _pdf_path_cache_lock:
+        if path is None:
+            _pdf_path_cache.pop(key, None)
+        else:
+            if key not in _pdf_path_cache and len(_pdf_path_cache) >= PDF_PATH_CACHE_SIZE:
+                # Drop the oldest entry; dicts keep insertion order
+                del _pdf_path_cache[next(iter(_pdf_path_cache))]
+            _pdf_path_cache[key] = path
+    return path
+
+def _find_pdf_path(stored_path, filename):
+    """Check the path from the database, then the upload folders by filename."""
+    potential_paths = [
+        stored_path,  # Original path from database
+        os.path.join(UPLOAD_FOLDER_UPLOADED, filename),  # Uploaded folder
+        os.path.join(UPLOAD_FOLDER_CREATED, filename),   # Created folder
+        os.path.join(UPLOAD_FOLDER, filename),           # General uploads folder
+    ]
+    for path in potential_paths:
+        if os.path.isfile(path):
+            return path
+    return None
+
 @app.route("/serve-pdf/<file_id>", endpoint="serve_pdf")
 @login_required
 def serve_pdf(file_id):
@@ -1359,12 +1943,12 @@ def serve_pdf(file_id):
         logging.debug(f"[SERVE_PDF] Request to serve file ID: {file_id}")
         
         # Try to fetch file from regular files database first
-        file = File.query.get(file_id)
+        file = db.session.get(File, file_id)
         file_type = "File"
         
         # If not found in regular files, try created files
         if not file:
-            file = CreatedFile.query.get(file_id)
+            file = db.session.get(CreatedFile, file_id)
             file_type = "CreatedFile"
             logging.debug(f"[SERVE_PDF] File found in CreatedFile table: {file_id}")
         
@@ -1374,8 +1958,8 @@ def serve_pdf(file_id):
             return jsonify({'error': 'File not found in database'}), 404
         
         # Security check - ensure user can only access their own files
-        if file.user_email != session.get('user_email'):
-            logging.warning(f"[SERVE_PDF] Unauthorized access attempt: {file_id} by {session.get('user_email')}")
+        if file.user_email != g.user_email:
+            logging.warning(f"[SERVE_PDF] Unauthorized access attempt: {file_id} by {g.user_email}")
             return jsonify({'error': 'Unauthorized access'}), 403
         
         # Get the absolute file path
@@ -1384,36 +1968,16 @@ def serve_pdf(file_id):
         # Debug logging
         logging.debug(f"[SERVE_PDF] Attempting to serve {file_type} file: {file_path}")
         
-        # Define possible locations to search for the file
-        potential_paths = [
-            file_path,  # Original path from database
-            os.path.join(UPLOAD_FOLDER_UPLOADED, file.filename),  # Uploaded folder
-            os.path.join(UPLOAD_FOLDER_CREATED, file.filename),   # Created folder
-            os.path.join(UPLOAD_FOLDER, file.filename),           # General uploads folder
-        ]
-        
-        # For CreatedFiles, also check the original PDF location
-        if file_type == "CreatedFile":
-            # Try to find the most recent version in the created folder
-            created_folder = os.path.join(UPLOAD_FOLDER_CREATED)
-            if os.path.exists(created_folder):
-                potential_paths.append(os.path.join(created_folder, file.filename))
-        
-        # Try each potential path
-        valid_path = None
-        for path in potential_paths:
-            logging.debug(f"[SERVE_PDF] Checking potential file path: {path}")
-            if os.path.exists(path) and os.path.isfile(path):
-                logging.info(f"[SERVE_PDF] Found file at: {path}")
-                valid_path = path
-                
-                # Update database with correct path if it's different from what's stored
-                if valid_path != file_path:
-                    file.file_path = valid_path
-                    db.session.commit()
-                    logging.info(f"[SERVE_PDF] Updated file path in database to: {valid_path}")
-                
-                break
+        # Find the file on disk; the location is remembered, so repeated
+        # PDF.js requests cost one stat to confirm it
+        valid_path = _resolve_pdf_path(file_path, file.filename)
+        
+        if valid_path:
+            logging.debug(f"[SERVE_PDF] Found file at: {valid_path}")
+            # Leave the stored path alone: this is a GET, and the memoized
+            # lookup already makes the fallback cheap on repeat requests
+            if valid_path != file_path:
+                logging.debug(f"[SERVE_PDF] Stored path {file_path} is stale; serving {valid_path}")
         
         if not valid_path:
             # Advanced debugging info
@@ -1422,40 +1986,26 @@ def serve_pdf(file_id):
             # List contents of upload folders to help debugging
             for folder in [UPLOAD_FOLDER, UPLOAD_FOLDER_UPLOADED, UPLOAD_FOLDER_CREATED]:
                 if os.path.exists(folder):
-                    contents = os.listdir(folder)
+                    contents = sorted(cached_listdir(folder))
                     logging.debug(f"[SERVE_PDF] Contents of {folder}: {contents}")
             
             return jsonify({'error': 'File not found on disk'}), 404
         
-        # Ensure the file is actually readable
-        try:
-            with open(valid_path, 'rb') as f:
-                # Just read a few bytes to check if file is readable
-                f.read(10)
-        except Exception as read_error:
-            logging.error(f"[SERVE_PDF] File exists but is not readable: {str(read_error)}")
-            return jsonify({'error': 'File exists but is not readable'}), 500
-        
-        # Serve the file with the correct MIME type and cache control headers
-        response = send_file(
+        # Serve the file with conditional and Range support; Werkzeug derives the
+        # ETag from mtime and size, so PDF.js revalidates instead of refetching
+        response = send_upload(
             valid_path,
             mimetype="application/pdf",
             as_attachment=False,
-            download_name=file.original_filename if file.original_filename else None
+            download_name=file.original_filename if file.original_filename else None,
+            conditional=True,
+            etag=True
         )
         
-        # Add very strong cache control headers to prevent caching issues with PDF.js
-        response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate, max-age=0'
-        response.headers['Pragma'] = 'no-cache'
-        response.headers['Expires'] = '0'
-        
-        # Add a unique ETag to force revalidation (includes file timestamp)
-        try:
-            file_timestamp = str(int(os.path.getmtime(valid_path)))
-            response.headers['ETag'] = f'"{file_timestamp}-{file_id}"'
-        except:
-            # Fallback to a random ETag if we can't get the file timestamp
-            response.headers['ETag'] = f'"{uuid.uuid4()}"'
+        # Always revalidate, but allow the browser to keep the bytes
+        response.cache_control.private = True
+        response.cache_control.max_age = 0
+        response.cache_control.must_revalidate = True
         
         logging.debug(f"[SERVE_PDF] Successfully serving file: {valid_path}")
         return response
@@ -1466,6 +2016,116 @@ def serve_pdf(file_id):
         logging.error(traceback.format_exc())
         return jsonify({'error': f'Error serving PDF: {str(e)}'}), 500
 
+def _fill_and_embed_pdf(input_pdf_path, output_pdf_path, field_values, payload_json):
+    """
+    Fill the first page's form fields and attach the payload as payload.json.
+    
+    Uses pikepdf (libqpdf) when available so the document is edited in place
+    rather than deep-copied object by object; otherwise falls back to pypdf.
+    
+    Args:
+        input_pdf_path: Path to the source PDF
+        output_pdf_path: Path where the filled PDF is written
+        field_values: Dict of field name to value
+        payload_json: Bytes of the JSON payload to embed
+    """
+    if pikepdf is not None:
+        with pikepdf.open(input_pdf_path) as pdf:
+            for annot in pdf.pages[0].get('/Annots', []):
+                if annot.get('/Subtype') != '/Widget':
+                    continue
+                field = annot if '/T' in annot else annot.get('/Parent')
+                if field is None or str(field.get('/T', '')) not in field_values:
+                    continue
+                value = field_values[str(field.T)]
+                if field.get('/FT') == '/Btn':
+                    if isinstance(value, bool):
+                        value = "Yes" if value else "Off"
+                    state = pikepdf.Name(value if str(value).startswith('/') else f"/{value}")
+                    field.V = state
+                    # Radio kids share the field; only the kid with an appearance
+                    # for this state is switched on, the others are turned off
+                    appearances = annot.get('/AP', {}).get('/N')
+                    if isinstance(appearances, pikepdf.Dictionary) and str(state) not in appearances:
+                        annot.AS = pikepdf.Name.Off
+                    else:
+                        annot.AS = state
+                else:
+                    field.V = pikepdf.String(str(value))
+            if '/AcroForm' in pdf.Root:
+                # Let viewers rebuild appearance streams for the new values
+                pdf.Root.AcroForm.NeedAppearances = True
+            pdf.attachments['payload.json'] = pikepdf.AttachedFileSpec(
+                pdf, payload_json, filename='payload.json', mime_type='application/json')
+            pdf.save(output_pdf_path)
+        return
+    
+    reader = PdfReader(input_pdf_path)
+    writer = PdfWriter()
+    writer.clone_document_from_reader(reader)
+    writer.update_page_form_field_values(writer.pages[0], field_values)
+    # Embed JSON payload
+    file_entry = DecodedStreamObject()
+    file_entry.set_data(payload_json)
+    file_entry.update({
+        NameObject("/Type"): NameObject("/EmbeddedFile"),
+        NameObject("/Subtype"): NameObject("/application/json"),
+    })
+    file_entry_obj = writer._add_object(file_entry)
+    ef_dict = DictionaryObject({
+        NameObject("/F"): file_entry_obj,
+        NameObject("/UF"): file_entry_obj,
+    })
+    filespec = DictionaryObject({
+        NameObject("/Type"): NameObject("/Filespec"),
+        NameObject("/F"): create_string_object("payload.json"),
+        NameObject("/EF"): ef_dict,
+    })
+    filespec_obj = writer._add_object(filespec)
+    embedded_files_names = [create_string_object("payload.json"), filespec_obj]
+    embedded_files_dict = DictionaryObject({
+        NameObject("/Names"): embedded_files_names
+    })
+    embedded_files_obj = writer._add_object(embedded_files_dict)
+    writer._root_object.update({
+        NameObject("/Names"): DictionaryObject({
+            NameObject("/EmbeddedFiles"): embedded_files_obj
+        })
+    })
+    # Save the new PDF
+    with open(output_pdf_path, "wb") as f_out:
+        writer.write(f_out)
+
+FILL_JOB_WORKERS = int(os.environ.get('FILL_JOB_WORKERS', 2))
+_fill_executor = ThreadPoolExecutor(max_workers=FILL_JOB_WORKERS, thread_name_prefix='fill-embed')
+
+def _fill_and_embed_job(job_id, input_pdf_path, output_pdf_path, unique_filename, original_filename,
+                        field_values, payload_json, user_email):
+    """Fill the PDF, embed the payload and record the result as a CreatedFile."""
+    try:
+        # No session is open during the PDF work, so no pool connection is held
+        _fill_and_embed_pdf(input_pdf_path, output_pdf_path, field_values, payload_json)
+        with app.app_context():
+            try:
+                new_file = CreatedFile(
+                    filename=unique_filename,
+                    original_filename=original_filename,
+                    file_type='pdf',
+                    file_path=output_pdf_path,
+                    user_email=user_email
+                )
+                db.session.add(new_file)
+                db.session.commit()
+                result = {'status': 'done', 'id': new_file.id, 'name': new_file.original_filename}
+            except Exception:
+                db.session.rollback()
+                raise
+    except Exception as e:
+        logging.error(f"Error filling and embedding PDF: {str(e)}")
+        result = {'status': 'error', 'error': str(e)}
+    
+    _finish_job(job_id, result)
+
 @app.route('/api/fill-and-embed', methods=['POST'])
 @login_required
 def fill_and_embed():
@@ -1475,70 +2135,35 @@ def fill_and_embed():
         payload = request.form.get('payload')
         if not file_id or not field_values or not payload:
             return jsonify({'success': False, 'error': 'Missing required data'}), 400
-        field_values = json.loads(field_values)
-        payload = json.loads(payload)
+        field_values = _loads(field_values)
+        payload = _loads(payload)
         # Get the original PDF path
-        file = File.query.get_or_404(file_id)
+        file = db.session.get(File, file_id) or abort(404)
         input_pdf_path = file.file_path
         # Prepare output path
-        unique_filename = f"{uuid.uuid4()}.pdf"
+        unique_filename = f"{secrets.token_hex(16)}.pdf"
         output_pdf_path = os.path.join(UPLOAD_FOLDER_CREATED, unique_filename)
-        # Open and fill PDF
-        reader = PdfReader(input_pdf_path)
-        writer = PdfWriter()
-        writer.clone_document_from_reader(reader)
-        writer.update_page_form_field_values(writer.pages[0], field_values)
-        # Embed JSON payload
         payload_json = json.dumps(payload, indent=2).encode("utf-8")
-        file_entry = DecodedStreamObject()
-        file_entry.set_data(payload_json)
-        file_entry.update({
-            NameObject("/Type"): NameObject("/EmbeddedFile"),
-            NameObject("/Subtype"): NameObject("/application/json"),
-        })
-        file_entry_obj = writer._add_object(file_entry)
-        ef_dict = DictionaryObject({
-            NameObject("/F"): file_entry_obj,
-            NameObject("/UF"): file_entry_obj,
-        })
-        filespec = DictionaryObject({
-            NameObject("/Type"): NameObject("/Filespec"),
-            NameObject("/F"): create_string_object("payload.json"),
-            NameObject("/EF"): ef_dict,
-        })
-        filespec_obj = writer._add_object(filespec)
-        embedded_files_names = [create_string_object("payload.json"), filespec_obj]
-        embedded_files_dict = DictionaryObject({
-            NameObject("/Names"): embedded_files_names
-        })
-        embedded_files_obj = writer._add_object(embedded_files_dict)
-        writer._root_object.update({
-            NameObject("/Names"): DictionaryObject({
-                NameObject("/EmbeddedFiles"): embedded_files_obj
-            })
-        })
-        # Save the new PDF
-        with open(output_pdf_path, "wb") as f_out:
-            writer.write(f_out)
-        # Save to CreatedFile table
-        new_file = CreatedFile(
-            filename=unique_filename,
-            original_filename=file.original_filename,
-            file_type='pdf',
-            file_path=output_pdf_path,
-            user_email=session['user_email']
-        )
-        db.session.add(new_file)
-        db.session.commit()
-        return jsonify({'success': True, 'id': new_file.id, 'name': new_file.original_filename})
+        
+        # Queue the PDF work; the client polls /api/fill-and-embed/status/<job_id>
+        job_id = _create_job('fill_embed', g.user_email)
+        _fill_executor.submit(_fill_and_embed_job, job_id, input_pdf_path, output_pdf_path, unique_filename,
+                              file.original_filename, field_values, payload_json, g.user_email)
+        return jsonify({'success': True, 'status': 'pending', 'job_id': job_id}), 202
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/fill-and-embed/status/<job_id>')
+@login_required
+def fill_and_embed_status(job_id):
+    """Report the state of a background fill-and-embed job"""
+    return _job_status_response(job_id, 'fill_embed', g.user_email)
+
 @app.route("/debug-pdf/<file_id>")
 @login_required
 def debug_pdf(file_id):
-    file = File.query.get_or_404(file_id)
+    file = db.session.get(File, file_id) or abort(404)
     return jsonify({
         "file_id": file.id,
         "filename": file.filename,
@@ -1577,7 +2202,7 @@ def add_form_fields():
         return jsonify({'success': False, 'error': 'No fields provided'}), 400
     
     # Get the file from database
-    source_file = File.query.get(file_id) or CreatedFile.query.get(file_id)
+    source_file = db.session.get(File, file_id) or db.session.get(CreatedFile, file_id)
     if not source_file:
         return jsonify({'success': False, 'error': 'File not found'}), 404
     
@@ -1590,48 +2215,34 @@ def add_form_fields():
         if not form_def:
             form_def = FormDefinition(
                 file_id=file_id,
-                schema=json.dumps({"fields": fields}),  # Store the full fields schema
-                user_email=session['user_email']
+                schema=_dumps({"fields": fields}),  # Store the full fields schema
+                user_email=g.user_email
             )
             db.session.add(form_def)
         else:
             # Update existing form definition with new fields
-            form_def.schema = json.dumps({"fields": fields})
+            form_def.schema = _dumps({"fields": fields})
+            form_def.field_count = len(fields)
             form_def.updated_at = datetime.utcnow()
         
-        db.session.commit()
+        # Flush for form_def.id; everything is committed together below
+        db.session.flush()
         
         # Clear existing fields for this form
-        PDFFormField.query.filter_by(form_id=form_def.id).delete()
-        
-        # Add new fields to database
-        for field in fields:
-            pdf_field = PDFFormField(
-                form_id=form_def.id,
-                name=field.get('name', f"field_{uuid.uuid4().hex[:8]}"),
-                field_type=field.get('type', 'text'),
-                x=field.get('x', 0),
-                y=field.get('y', 0),
-                width=field.get('width', 100),
-                height=field.get('height', 20),
-                page=field.get('page', 0),
-                default_value=field.get('default_value', ''),
-                font_size=field.get('font_size'),
-                font_name=field.get('font_name'),
-                text_color=field.get('text_color'),
-                format=field.get('format'),
-                read_only=field.get('read_only', False),
-                required=field.get('required', False)
-            )
-            db.session.add(pdf_field)
+        db.session.execute(
+            delete(PDFFormField)
+            .where(PDFFormField.form_id == form_def.id)
+            .execution_options(synchronize_session=False)
+        )
+        
+        # Add new fields to database in a single multi-row INSERT
+        db.session.bulk_insert_mappings(PDFFormField, _form_field_rows(form_def.id, fields))
         
         db.session.commit()
         
         # Create output filename and path
-        output_dir = os.path.join(app.root_path, 'uploads', 'created')
-        os.makedirs(output_dir, exist_ok=True)
-        output_filename = f"{uuid.uuid4()}.pdf"
-        output_path = os.path.join(output_dir, output_filename)
+        output_filename = f"{secrets.token_hex(16)}.pdf"
+        output_path = os.path.join(UPLOAD_FOLDER_CREATED, output_filename)
         
         # Create the actual PDF with fields using our utility function
         try:
@@ -1646,31 +2257,23 @@ def add_form_fields():
             return jsonify({'error': f'Failed to create PDF: {str(e)}'}), 500
         
         # Create or update the created file record
-        created_file = CreatedFile.query.filter_by(original_file_id=file_id).first()
-        if not created_file:
-            created_file = CreatedFile(
-                filename=output_filename,
-                original_filename=f"Form_{source_file.original_filename}",
-                file_type='pdf',
-                file_path=output_path,
-                user_email=session['user_email'],
-                original_file_id=file_id
-            )
-            db.session.add(created_file)
-        else:
-            # Update existing file
-            created_file.filename = output_filename
-            created_file.file_path = output_path
-            created_file.modified_date = datetime.utcnow()
-        
-        db.session.commit();
+        created_file_id, previous_path = _upsert_surface_file(
+            file_id,
+            output_filename,
+            f"Form_{source_file.original_filename}",
+            output_path,
+            g.user_email
+        )
+        db.session.commit()
+        _remove_replaced_surface(previous_path, output_path)
+        _invalidate_portfolio_api(file_id=created_file_id)
         
         # Return success with created file ID
         return jsonify({
             'success': True,
             'message': f"Added {len(fields)} fields to the PDF form",
-            'created_file_id': created_file.id,
-            'url': url_for('serve_pdf', file_id=created_file.id, _external=True)
+            'created_file_id': created_file_id,
+            'url': url_for('serve_pdf', file_id=created_file_id, _external=True)
         })
         
     except Exception as e:
@@ -1679,6 +2282,76 @@ def add_form_fields():
         app.logger.error(traceback.format_exc())
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# Background form filling for /api/fill-form; clients opt in with "async": true,
+# or FILL_FORM_ASYNC=1 makes it the default
+FILL_FORM_ASYNC = os.environ.get('FILL_FORM_ASYNC', '0') == '1'
+PDF_JOB_WORKERS = int(os.environ.get('PDF_JOB_WORKERS', 2))
+_pdf_job_executor = ThreadPoolExecutor(max_workers=PDF_JOB_WORKERS, thread_name_prefix='pdf-fill')
+
+def _fill_form_job(job_id, surface_path, form_data, filled_path, filled_file_id, portfolio_id, user_email):
+    """Fill the PDF for a pending FilledForm, then mark it completed and add its submission."""
+    from pdf_portfolio_utils import surface_pdf_generator
+    
+    try:
+        # The PDF work runs before any session is opened
+        filled_path, pdf_metadata = surface_pdf_generator.fill_surface_pdf_with_metadata(
+            surface_path, form_data, filled_path)
+    except Exception as e:
+        logging.error(f"Error filling form: {str(e)}")
+        result = {'status': 'error', 'error': f'Error filling form: {str(e)}'}
+    else:
+        result = None
+    
+    with app.app_context():
+        try:
+            filled_file = db.session.get(FilledForm, filled_file_id)
+            if result:
+                filled_file.form_status = 'error'
+            else:
+                filled_file.form_status = 'completed'
+                submission_id = _upsert_submission(
+                    portfolio_id, filled_file.id, filled_file.form_data, pdf_metadata, user_email)
+            db.session.commit()
+            if not result:
+                logging.info(f"Form filled and saved successfully. Submission ID: {submission_id}")
+                result = {'status': 'done', 'submission_id': submission_id}
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error saving filled form: {str(e)}")
+            result = {'status': 'error', 'error': f'Error saving filled form: {str(e)}'}
+    
+    _finish_job(job_id, result)
+
+@app.route('/api/pdf-job/<job_id>')
+@login_required
+def pdf_job_status(job_id):
+    """Report the state of a background fill started by fill_form"""
+    return _job_status_response(job_id, 'fill_form', g.user_email)
+
+def _load_fill_context(portfolio_id, user_email):
+    """
+    Load a portfolio's surface file for filling, checking ownership.
+    
+    Returns:
+        (surface_file, None) on success or (None, (error_response, status_code))
+    """
+    portfolio = db.session.execute(
+        select(PDFPortfolio)
+        .options(joinedload(PDFPortfolio.surface_file))
+        .where(PDFPortfolio.id == portfolio_id)
+    ).scalar_one_or_none()
+    if not portfolio:
+        return None, (jsonify({'success': False, 'error': 'Portfolio not found'}), 404)
+    
+    # Security check - only the owner can fill their forms
+    if portfolio.user_email != user_email:
+        return None, (jsonify({'success': False, 'error': 'Unauthorized access'}), 403)
+    
+    if not portfolio.surface_file:
+        return None, (jsonify({'success': False, 'error': 'Surface file not found'}), 404)
+    
+    return portfolio.surface_file, None
+
 @app.route('/api/fill-form', methods=['POST'])
 @login_required
 def fill_form():
@@ -1694,37 +2367,51 @@ def fill_form():
         portfolio_id = data['portfolio_id']
         form_data = data['form_data']
         
-        # Get the PDF portfolio
-        portfolio = PDFPortfolio.query.get(portfolio_id)
-        if not portfolio:
-            return jsonify({'success': False, 'error': 'Portfolio not found'}), 404
-        
-        # Security check - only the owner can fill their forms
-        if portfolio.user_email != session.get('user_email', ''):
-            return jsonify({'success': False, 'error': 'Unauthorized access'}), 403
-            
-        # Get the surface file
-        surface_file = CreatedFile.query.get(portfolio.surface_file_id)
-        if not surface_file:
-            return jsonify({'success': False, 'error': 'Surface file not found'}), 404
-            
-        # Check if surface file exists on disk
-        if not os.path.exists(surface_file.file_path):
-            return jsonify({'success': False, 'error': 'Surface file not found on disk'}), 404
+        # Get the PDF portfolio, its surface file and the ownership check in one query
+        surface_file, error = _load_fill_context(portfolio_id, g.user_email)
+        if error:
+            return error
             
         # Generate a filled PDF with the form data
         try:
             # Create output path for filled PDF
-            filled_dir = os.path.join(app.root_path, 'uploads', 'filled')
-            os.makedirs(filled_dir, exist_ok=True)
-            filled_filename = f"filled_{uuid.uuid4()}.pdf"
-            filled_path = os.path.join(filled_dir, filled_filename)
+            filled_filename = f"filled_{secrets.token_hex(16)}.pdf"
+            filled_path = os.path.join(UPLOAD_FOLDER_FILLED, filled_filename)
+            
+            if data.get('async', FILL_FORM_ASYNC):
+                # Record the form as pending and fill the PDF in the background;
+                # the client polls /api/pdf-job/<job_id>
+                filled_file = FilledForm(
+                    filename=filled_filename,
+                    original_filename=f"Filled_{surface_file.original_filename}",
+                    file_type='pdf',
+                    file_path=filled_path,
+                    user_email=g.user_email,
+                    source_file_id=surface_file.id,
+                    form_data=_dumps(form_data),
+                    form_status='pending',
+                    field_count=len(form_data)
+                )
+                db.session.add(filled_file)
+                db.session.commit()
+                
+                job_id = _create_job('fill_form', g.user_email, filled_file_id=filled_file.id)
+                _pdf_job_executor.submit(_fill_form_job, job_id, surface_file.file_path, form_data,
+                                         filled_path, filled_file.id, portfolio_id, g.user_email)
+                
+                return jsonify({
+                    'success': True,
+                    'status': 'pending',
+                    'job_id': job_id,
+                    'filled_file_id': filled_file.id
+                }), 202
             
-            # Fill the PDF with the form data
-            filled_path = surface_pdf_generator.fill_surface_pdf(surface_file.file_path, form_data, filled_path)
+            # Fill the PDF with the form data; metadata comes from the same pass
+            filled_path, pdf_metadata = surface_pdf_generator.fill_surface_pdf_with_metadata(
+                surface_file.file_path, form_data, filled_path)
             
-            # Extract metadata from filled PDF
-            pdf_metadata = surface_pdf_generator.extract_pdf_metadata(filled_path)
+            # Serialize the form data once for both records
+            form_data_json = _dumps(form_data)
             
             # Create filled file record
             filled_file = FilledForm(
@@ -1732,33 +2419,32 @@ def fill_form():
                 original_filename=f"Filled_{surface_file.original_filename}",
                 file_type='pdf',
                 file_path=filled_path,
-                user_email=session.get('user_email', ''),
-                created_file_id=surface_file.id
+                user_email=g.user_email,
+                source_file_id=surface_file.id,
+                form_data=form_data_json,
+                field_count=len(form_data)
             )
             db.session.add(filled_file)
             db.session.commit()
             
             # Create submission record with form data and metadata
-            submission = Submission(
-                portfolio_id=portfolio_id,
-                filled_file_id=filled_file.id,
-                form_data=form_data,
-                form_metadata=pdf_metadata,
-                user_email=session.get('user_email', ''),
-                status='submitted'
-            )
-            db.session.add(submission)
+            submission_id = _upsert_submission(
+                portfolio_id, filled_file.id, form_data_json, pdf_metadata, g.user_email)
             db.session.commit()
             
-            logging.info(f"Form filled and saved successfully. Submission ID: {submission.id}")
+            logging.info(f"Form filled and saved successfully. Submission ID: {submission_id}")
             
             return jsonify({
                 'success': True,
-                'submission_id': submission.id,
+                'submission_id': submission_id,
                 'filled_file_id': filled_file.id,
                 'message': 'Form filled and saved successfully'
             })
             
+        except FileNotFoundError:
+            # Opening the surface PDF is the existence check
+            db.session.rollback()
+            return jsonify({'success': False, 'error': 'Surface file not found on disk'}), 404
         except Exception as e:
             logging.error(f"Error filling form: {str(e)}")
             return jsonify({'success': False, 'error': f'Error filling form: {str(e)}'}), 500
@@ -1767,6 +2453,162 @@ def fill_form():
         logging.error(f"Unexpected error during form filling: {str(e)}")
         return jsonify({'success': False, 'error': f'Unexpected error: {str(e)}'}), 500
 
+# Batch form filling: PDFs are filled in worker processes, then all rows are
+# written in one transaction by a coordinator thread
+BATCH_FILL_WORKERS = int(os.environ.get('BATCH_FILL_WORKERS', 4))
+_batch_fill_pool = None
+_batch_fill_pool_lock = threading.Lock()
+_batch_coordinator = ThreadPoolExecutor(max_workers=2, thread_name_prefix='fill-batch')
+
+def _get_batch_fill_pool():
+    """Create the PDF fill process pool on first use."""
+    global _batch_fill_pool
+    with _batch_fill_pool_lock:
+        if _batch_fill_pool is None:
+            _batch_fill_pool = ProcessPoolExecutor(max_workers=BATCH_FILL_WORKERS)
+        return _batch_fill_pool
+
+def _run_fill_batch(batch_id, items, futures):
+    """Collect the worker results for a batch and persist them in one commit."""
+    filled = []
+    for item, future in zip(items, futures):
+        try:
+            item['filled_path'], item['metadata'] = future.result()
+            filled.append(item)
+        except Exception as e:
+            logging.error(f"Error filling form in batch {batch_id}: {str(e)}")
+            item.update(status='error', error=str(e))
+    
+    with app.app_context():
+        try:
+            new_forms = []
+            for item in filled:
+                form_data_json = _dumps(item['form_data'])
+                filled_form = db.session.get(FilledForm, item['filled_form_id']) if item['filled_form_id'] else None
+                if filled_form:
+                    filled_form.form_data = form_data_json
+                    filled_form.field_count = len(item['form_data'])
+                    filled_form.modified_date = datetime.utcnow()
+                else:
+                    filled_form = FilledForm(
+                        filename=os.path.basename(item['filled_path']),
+                        original_filename=f"Filled_{item['surface_name']}",
+                        file_type='pdf',
+                        file_path=item['filled_path'],
+                        user_email=item['user_email'],
+                        source_file_id=item['surface_file_id'],
+                        form_data=form_data_json,
+                        field_count=len(item['form_data'])
+                    )
+                    new_forms.append(filled_form)
+                item['filled_form'] = filled_form
+            db.session.add_all(new_forms)
+            # One flush assigns every new FilledForm id for the submissions
+            db.session.flush()
+            
+            # Upsert, since items that re-fill an existing form already have a submission
+            submission_ids = [
+                _upsert_submission(item['portfolio_id'], item['filled_form'].id, item['filled_form'].form_data,
+                                   item['metadata'], item['user_email'])
+                for item in filled
+            ]
+            db.session.commit()
+            
+            for item, submission_id in zip(filled, submission_ids):
+                item.update(status='done', filled_file_id=item['filled_form'].id, submission_id=submission_id)
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error saving batch {batch_id}: {str(e)}")
+            for item in filled:
+                item.update(status='error', error=f'Error saving filled form: {str(e)}')
+    
+    results = [{key: item[key] for key in ('index', 'portfolio_id', 'status', 'filled_file_id', 'submission_id', 'error')
+                if key in item} for item in items]
+    _finish_job(batch_id, {'status': 'done', 'items': results})
+
+@app.route('/api/fill-form/batch', methods=['POST'])
+@login_required
+def fill_form_batch():
+    """Fill several forms at once; returns a batch id to poll for results"""
+    try:
+        from pdf_portfolio_utils import fill_surface_pdf_task
+        
+        data = request.json
+        entries = data.get('items') if isinstance(data, dict) else data
+        if not entries or not isinstance(entries, list):
+            return jsonify({'success': False, 'error': 'Missing required data'}), 400
+        if any(not isinstance(entry, dict) or 'portfolio_id' not in entry or 'form_data' not in entry
+               for entry in entries):
+            return jsonify({'success': False, 'error': 'Each item needs portfolio_id and form_data'}), 400
+        
+        # Load every referenced portfolio the user owns, with its surface file
+        portfolio_ids = {entry['portfolio_id'] for entry in entries}
+        portfolios = {p.id: p for p in db.session.execute(
+            select(PDFPortfolio)
+            .where(PDFPortfolio.id.in_(portfolio_ids), PDFPortfolio.user_email == g.user_email)
+            .options(joinedload(PDFPortfolio.surface_file))
+        ).scalars()}
+        filled_form_ids = {entry['filled_form_id'] for entry in entries if entry.get('filled_form_id')}
+        filled_forms = {f.id: f for f in db.session.execute(
+            select(FilledForm).where(FilledForm.id.in_(filled_form_ids), FilledForm.user_email == g.user_email)
+        ).scalars()} if filled_form_ids else {}
+        
+        items = []
+        for index, entry in enumerate(entries):
+            portfolio = portfolios.get(entry['portfolio_id'])
+            if not portfolio or not portfolio.surface_file:
+                return jsonify({'success': False, 'error': f"Portfolio not found: {entry['portfolio_id']}"}), 404
+            existing = filled_forms.get(entry.get('filled_form_id'))
+            items.append({
+                'index': index,
+                'status': 'pending',
+                'portfolio_id': portfolio.id,
+                'surface_file_id': portfolio.surface_file.id,
+                'surface_name': portfolio.surface_file.original_filename,
+                'surface_path': portfolio.surface_file.file_path,
+                'form_data': entry['form_data'],
+                'filled_form_id': existing.id if existing else None,
+                'output_path': existing.file_path if existing else
+                    os.path.join(UPLOAD_FOLDER_FILLED, f"filled_{secrets.token_hex(16)}.pdf"),
+                'user_email': g.user_email
+            })
+        
+        batch_id = _create_job('fill_batch', g.user_email, items=[
+            {'index': item['index'], 'portfolio_id': item['portfolio_id'], 'status': 'pending'}
+            for item in items
+        ])
+        
+        pool = _get_batch_fill_pool()
+        futures = [pool.submit(fill_surface_pdf_task, item['surface_path'], item['form_data'], item['output_path'])
+                   for item in items]
+        _batch_coordinator.submit(_run_fill_batch, batch_id, items, futures)
+        
+        return jsonify({'success': True, 'batch_id': batch_id, 'count': len(items)}), 202
+    
+    except Exception as e:
+        logging.error(f"Error starting fill batch: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/fill-form/batch/<batch_id>')
+@login_required
+def fill_form_batch_status(batch_id):
+    """Report per-item and overall state of a fill batch"""
+    job = _load_job(batch_id, 'fill_batch', g.user_email)
+    if not job:
+        return jsonify({'success': False, 'error': 'Batch not found'}), 404
+    
+    job_status, state = job
+    items = state['items']
+    if job_status == 'error':
+        # The batch was interrupted; nothing still pending will finish
+        for item in items:
+            if item['status'] == 'pending':
+                item.update(status='error', error=state['error'])
+    
+    counts = {state: sum(1 for item in items if item['status'] == state) for state in ('pending', 'done', 'error')}
+    status = 'pending' if counts['pending'] else ('error' if counts['error'] == len(items) else 'done')
+    return jsonify({'success': True, 'batch_id': batch_id, 'status': status, **counts, 'items': items})
+
 @app.route('/save-filled-form', methods=['POST'])
 @login_required
 def save_filled_form():
@@ -1781,41 +2623,41 @@ def save_filled_form():
         if not source_file_id or not form_data_str:
             return jsonify({'success': False, 'error': 'Missing required data'}), 400
         
-        # Parse form data JSON
+        # Parse form data JSON; the validated request string is stored as-is
         try:
-            form_data = json.loads(form_data_str)
+            form_data = _loads(form_data_str)
         except Exception as e:
             return jsonify({'success': False, 'error': f'Invalid form data format: {str(e)}'}), 400
+        form_data_json = form_data_str
         
         # Get source file
-        source_file = CreatedFile.query.get(source_file_id)
+        source_file = db.session.get(CreatedFile, source_file_id)
         if not source_file:
-            source_file = File.query.get(source_file_id)
+            source_file = db.session.get(File, source_file_id)
         
         if not source_file:
             return jsonify({'success': False, 'error': 'Source file not found'}), 404
-            
-        # Check if source file exists on disk
-        if not os.path.exists(source_file.file_path):
-            return jsonify({'success': False, 'error': 'Source file not found on disk'}), 404
         
         # Generate output path for filled PDF
-        filled_dir = os.path.join(app.root_path, 'uploads', 'filled')
-        os.makedirs(filled_dir, exist_ok=True)
-        filled_filename = secure_filename(filename) if filename else f"filled_{uuid.uuid4()}.pdf"
-        filled_path = os.path.join(filled_dir, filled_filename)
+        filled_filename = secure_filename(filename) if filename else f"filled_{secrets.token_hex(16)}.pdf"
+        filled_path = os.path.join(UPLOAD_FOLDER_FILLED, filled_filename)
         
         # Check if we're editing an existing form
         if filled_form_id:
-            existing_form = FilledForm.query.get(filled_form_id)
+            existing_form = db.session.get(FilledForm, filled_form_id)
             if existing_form:
                 filled_path = existing_form.file_path
         
         # Import the needed module
         from pdf_portfolio_utils import surface_pdf_generator
         
-        # Fill the PDF with form data
-        filled_path = surface_pdf_generator.fill_surface_pdf(source_file.file_path, form_data, filled_path)
+        # Fill the PDF with form data; metadata comes from the same pass.
+        # Opening the source PDF is the existence check
+        try:
+            filled_path, pdf_metadata = surface_pdf_generator.fill_surface_pdf_with_metadata(
+                source_file.file_path, form_data, filled_path)
+        except FileNotFoundError:
+            return jsonify({'success': False, 'error': 'Source file not found on disk'}), 404
         
         # Get portfolio ID - check if source file is part of a portfolio
         portfolio = PDFPortfolio.query.filter_by(surface_file_id=source_file.id).first()
@@ -1823,9 +2665,10 @@ def save_filled_form():
         
         # Create or update filled form record
         if filled_form_id:
-            filled_form = FilledForm.query.get(filled_form_id)
+            filled_form = db.session.get(FilledForm, filled_form_id)
             if filled_form:
-                filled_form.form_data = json.dumps(form_data)
+                filled_form.form_data = form_data_json
+                filled_form.field_count = len(form_data)
                 filled_form.modified_date = datetime.utcnow()
             else:
                 # Create new record if ID not found
@@ -1834,9 +2677,10 @@ def save_filled_form():
                     original_filename=filename or f"Filled_{source_file.original_filename}",
                     file_type='pdf',
                     file_path=filled_path,
-                    user_email=session.get('user_email', ''),
+                    user_email=g.user_email,
                     source_file_id=source_file.id,
-                    form_data=json.dumps(form_data)
+                    form_data=form_data_json,
+                    field_count=len(form_data)
                 )
                 db.session.add(filled_form)
         else:
@@ -1846,38 +2690,31 @@ def save_filled_form():
                 original_filename=filename or f"Filled_{source_file.original_filename}",
                 file_type='pdf',
                 file_path=filled_path,
-                user_email=session.get('user_email', ''),
+                user_email=g.user_email,
                 source_file_id=source_file.id,
-                form_data=json.dumps(form_data)
+                form_data=form_data_json,
+                field_count=len(form_data)
             )
             db.session.add(filled_form)
         
-        db.session.commit()
+        # Flush for filled_form.id; the filled form and its submission commit together
+        db.session.flush()
         
         # Create submission record if we have a portfolio
         if portfolio_id:
-            # Extract metadata from filled PDF
-            pdf_metadata = surface_pdf_generator.extract_pdf_metadata(filled_path)
-            
             # Create or update submission
-            submission = Submission(
-                portfolio_id=portfolio_id,
-                filled_file_id=filled_form.id,
-                user_email=session.get('user_email', ''),
-                form_metadata=pdf_metadata,
-                status='submitted'
-            )
-            submission.form_data = json.dumps(form_data)
-            db.session.add(submission)
+            submission_id = _upsert_submission(
+                portfolio_id, filled_form.id, form_data_json, pdf_metadata, g.user_email)
             db.session.commit()
             
             return jsonify({
                 'success': True,
-                'submission_id': submission.id,
+                'submission_id': submission_id,
                 'filled_file_id': filled_form.id,
                 'message': 'Form filled and saved successfully'
             })
         else:
+            db.session.commit()
             return jsonify({
                 'success': True,
                 'filled_file_id': filled_form.id,
@@ -1891,25 +2728,41 @@ def save_filled_form():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 # Helper functions for file management
+def _file_lookup_stmt(*sources):
+    """
+    Build one UNION ALL query that finds a file ID in the given tables.
+    
+    Rows come back in the order of sources, so .first() keeps the priority of
+    checking the tables one after another. Each row also reports whether a
+    form definition exists for the ID.
+    """
+    models = {'file': File, 'created_file': CreatedFile, 'filled_form': FilledForm}
+    has_form_def = exists().where(FormDefinition.file_id == bindparam('file_id'))
+    return union_all(*[
+        select(
+            literal(priority).label('priority'),
+            literal(source).label('src'),
+            models[source].id,
+            models[source].file_path,
+            models[source].file_type,
+            models[source].user_email,
+            has_form_def.label('has_form_def')
+        ).where(models[source].id == bindparam('file_id'))
+        for priority, source in enumerate(sources)
+    ]).order_by(literal_column('priority'))
+
+FILE_INFO_LOOKUP = _file_lookup_stmt('file', 'created_file', 'filled_form')
+FILE_EXISTS_LOOKUP = _file_lookup_stmt('created_file', 'filled_form', 'file')
+
 def get_file_info(file_id):
     """
     Get file information from the database with error handling.
     Returns (file, None) on success or (None, (error_response, status_code)) on failure.
+    The file is a row with id, file_path, file_type, user_email and src.
     """
     try:
-        # Try to get the file from different tables
-        file = None
-        
-        # Check uploaded files first
-        file = File.query.get(file_id)
-        
-        # If not found, check created files
-        if not file:
-            file = CreatedFile.query.get(file_id)
-            
-        # If not found, check filled forms
-        if not file:
-            file = FilledForm.query.get(file_id)
+        # Uploaded files first, then created files, then filled forms
+        file = db.session.execute(FILE_INFO_LOOKUP, {'file_id': file_id}).first()
             
         if not file:
             error_response = jsonify({'error': 'File not found'})
@@ -1931,37 +2784,23 @@ def check_file_exists(file_id):
     app.logger.info(f"Checking file existence for ID: {file_id}")
     
     try:
-        # Try to find the file in different tables
-        file = CreatedFile.query.get(file_id)
-        file_source = "created_file"
-        
-        if not file:
-            file = FilledForm.query.get(file_id)
-            file_source = "filled_form" if file else None
-            
-        if not file:
-            file = File.query.get(file_id)
-            file_source = "file" if file else None
+        # Created files first, then filled forms, then uploads, plus the
+        # form definition check, all in one query
+        file = db.session.execute(FILE_EXISTS_LOOKUP, {'file_id': file_id}).first()
         
         if file:
             # If file exists, check if the file path is valid
-            file_path = getattr(file, 'file_path', None)
-            file_exists = file_path and os.path.exists(file_path)
-            
-            # Check if it has a form definition
-            has_form_def = False
-            if hasattr(file, 'id'):
-                form_def = FormDefinition.query.filter_by(file_id=file.id).first()
-                has_form_def = form_def is not None
+            file_exists = bool(file.file_path) and os.path.exists(file.file_path)
+            has_form_def = bool(file.has_form_def)
             
-            app.logger.info(f"File found: type={file_source}, path_exists={file_exists}, has_form_def={has_form_def}")
+            app.logger.info(f"File found: type={file.src}, path_exists={file_exists}, has_form_def={has_form_def}")
             
             return jsonify({
                 'exists': True,
                 'file_path_exists': file_exists,
-                'file_type': getattr(file, 'file_type', 'unknown'),
-                'user_email': getattr(file, 'user_email', None),
-                'file_source': file_source,
+                'file_type': file.file_type or 'unknown',
+                'user_email': file.user_email,
+                'file_source': file.src,
                 'has_form_definition': has_form_def
             })
         else:
@@ -1978,41 +2817,27 @@ def rebuild_submissions_table():
     app.logger.info("Rebuilding submissions table...")
     
     # Check if the table exists
-    if db.engine.dialect.has_table(db.engine.connect(), 'submissions'):
-        # Get all existing data
+    if inspect(db.engine).has_table('submissions'):
         try:
-            # Get all existing submissions
-            cursor = db.session.execute(text("SELECT id, user_email, filled_file_id, form_data, form_metadata, created_at FROM submissions"))
-            submissions_data = cursor.fetchall()
-            
-            # Drop the table
-            db.session.execute(text("DROP TABLE submissions"))
-            db.session.commit()
-            app.logger.info("Dropped submissions table")
-            
-            # Create the table with the new schema
-            db.create_all()
-            app.logger.info("Created new submissions table with portfolio_id column")
-            
-            # Restore the data
-            for submission in submissions_data:
-                # Create new submission with the existing data (portfolio_id will be NULL)
-                db.session.execute(
-                    text("INSERT INTO submissions (id, user_email, filled_file_id, form_data, form_metadata, created_at) VALUES (:id, :user_email, :filled_file_id, :form_data, :form_metadata, :created_at)"),
-                    {
-                        "id": submission[0],
-                        "user_email": submission[1],
-                        "filled_file_id": submission[2],
-                        "form_data": submission[3],
-                        "form_metadata": submission[4],
-                        "created_at": submission[5]
-                    }
-                )
-            db.session.commit()
-            app.logger.info(f"Restored {len(submissions_data)} submissions")
+            # Rename, recreate and copy the rows inside SQLite in one transaction,
+            # so the rows never pass through Python (portfolio_id will be NULL).
+            # pysqlite only opens a transaction before DML, so BEGIN is issued
+            # here to keep the DDL in it too; a failed copy rolls everything back
+            with db.engine.begin() as conn:
+                conn.exec_driver_sql("BEGIN")
+                conn.execute(text("ALTER TABLE submissions RENAME TO submissions_old"))
+                # The new table's unique filled_file_id index can't take
+                # duplicates left by older versions
+                _dedupe_rows(conn, 'submissions_old', 'filled_file_id', [])
+                Submission.__table__.create(conn)
+                copied = conn.execute(text(
+                    "INSERT INTO submissions (id, user_email, filled_file_id, form_data, form_metadata, submitted_at, status) "
+                    "SELECT id, user_email, filled_file_id, form_data, form_metadata, created_at, 'submitted' FROM submissions_old"
+                )).rowcount
+                conn.execute(text("DROP TABLE submissions_old"))
+            app.logger.info(f"Rebuilt submissions table with portfolio_id column; restored {copied} submissions")
             return True
         except Exception as e:
-            db.session.rollback()
             app.logger.error(f"Error rebuilding submissions table: {str(e)}")
             app.logger.error(traceback.format_exc())
             return False
@@ -2032,52 +2857,120 @@ def check_and_update_database():
         db.session.execute(text("SELECT portfolio_id FROM submissions LIMIT 1"))
         app.logger.info("submissions table already has portfolio_id column")
     except Exception:
+        # End the failed read before the rebuild takes its own connection
+        db.session.rollback()
         app.logger.warning("submissions table needs to be updated with portfolio_id column")
         rebuild_submissions_table()
         
     # ... [existing code]
 
-# Register API blueprints
-try:
-    # Use absolute import with correct case sensitivity
-    import sys
-    import os
-    
-    # Get the absolute path to the current directory (with correct case)
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    if current_dir not in sys.path:
-        sys.path.insert(0, current_dir)
-    
-    # Now import the blueprint using the correct path
-    from api_portfolio import portfolio_api
-    app.register_blueprint(portfolio_api)
-    app.logger.info("Registered portfolio API blueprint")
-except ImportError as e:
-    app.logger.error(f"Could not register portfolio API blueprint: {str(e)}")
-
-# Register error logging API blueprint
-try:
-    # Use absolute import with correct case sensitivity
-    from error_logging_api import error_logging_api
-    app.register_blueprint(error_logging_api)
-    app.logger.info("Registered error logging API blueprint")
-except ImportError as e:
-    app.logger.error(f"Could not register error logging API blueprint: {str(e)}")
-    
-# Register diagnostics API blueprint
-try:
-    # Use absolute import with correct case sensitivity
-    from diagnostics_api import diagnostics_api
-    app.register_blueprint(diagnostics_api)
-    app.logger.info("Registered diagnostics API blueprint")
-except ImportError as e:
-    app.logger.error(f"Could not register diagnostics API blueprint: {str(e)}")
+def backfill_field_counts():
+    """Add form_definitions.field_count if missing and fill counts left NULL by older rows."""
+    columns = [row[1] for row in db.session.execute(text("PRAGMA table_info(form_definitions)"))]
+    if 'field_count' not in columns:
+        db.session.execute(text("ALTER TABLE form_definitions ADD COLUMN field_count INTEGER"))
+        app.logger.info("Added field_count column to form_definitions")
+    
+    for form_def in FormDefinition.query.filter(FormDefinition.field_count.is_(None)):
+        form_def.field_count = len(form_def.get_schema().get('fields', []))
+    for filled_form in FilledForm.query.filter(FilledForm.field_count.is_(None)):
+        filled_form.field_count = len(filled_form.get_field_values())
+    db.session.commit()
+
+# Register API blueprints; a missing module fails at import time above
+app.register_blueprint(portfolio_api)
+app.register_blueprint(error_logging_api)
+app.register_blueprint(diagnostics_api)
+app.logger.info("Registered portfolio, error logging and diagnostics API blueprints")
+
+# Keys that now have unique indexes but where older versions inserted a new
+# row on every save: (table, key column, columns elsewhere that reference the
+# table's id, column holding the row's file on disk). Parents come before the
+# tables that reference them.
+UNIQUE_KEY_DEDUPES = [
+    ('created_files', 'original_file_id',
+     [('pdf_portfolios', 'surface_file_id'), ('filled_forms', 'source_file_id')], 'file_path'),
+    ('pdf_portfolios', 'base_file_id', [('submissions', 'portfolio_id')], None),
+    ('submissions', 'filled_file_id', [], None),
+]
+
+def _dedupe_rows(conn, table, key, references, file_column=None):
+    """
+    Keep the newest row per key in table and repoint references to the rows removed.
+    
+    Returns:
+        list of file_column paths only the removed rows used; the caller
+        deletes them once the transaction has committed
+    """
+    duplicates = (f"SELECT id FROM {table} WHERE {key} IS NOT NULL AND id NOT IN "
+                  f"(SELECT MAX(id) FROM {table} WHERE {key} IS NOT NULL GROUP BY {key})")
+    orphaned = []
+    if file_column:
+        orphaned = conn.execute(text(
+            f"SELECT DISTINCT {file_column} FROM {table} WHERE id IN ({duplicates}) "
+            f"AND {file_column} NOT IN (SELECT {file_column} FROM {table} WHERE id NOT IN ({duplicates}))"
+        )).scalars().all()
+    for ref_table, ref_column in references:
+        conn.execute(text(
+            f"UPDATE {ref_table} SET {ref_column} = "
+            f"(SELECT MAX(kept.id) FROM {table} kept JOIN {table} dup ON dup.{key} = kept.{key} "
+            f"WHERE dup.id = {ref_table}.{ref_column}) "
+            f"WHERE {ref_column} IN ({duplicates})"
+        ))
+    removed = conn.execute(text(f"DELETE FROM {table} WHERE id IN ({duplicates})")).rowcount
+    if removed:
+        app.logger.warning(f"Removed {removed} duplicate {table} rows sharing a {key}")
+    return orphaned
+
+def dedupe_unique_keys():
+    """Keep the newest row per unique key, repoint references and delete the removed rows' files."""
+    orphaned = []
+    with db.engine.begin() as conn:
+        for table, key, references, file_column in UNIQUE_KEY_DEDUPES:
+            orphaned.extend(_dedupe_rows(conn, table, key, references, file_column))
+    # Only after the commit: a rolled-back dedupe must not lose files
+    for path in orphaned:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            app.logger.error(f"Could not remove {path} of a duplicate row: {str(e)}")
+
+def migrate_database():
+    """Create missing tables and indexes and bring older schemas up to date."""
+    db.create_all()
+    check_and_update_database()
+    backfill_field_counts()
+    # Unique indexes can't be built over duplicates left by older versions
+    dedupe_unique_keys()
+    # create_all skips indexes on tables that already exist
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(db.engine, checkfirst=True)
+            except Exception as e:
+                app.logger.error(f"Could not create index {index.name}: {str(e)}")
+                # The ON CONFLICT upserts need the unique indexes; stop rather
+                # than leave every save failing at runtime
+                if index.unique:
+                    raise
+    # Refresh planner statistics where they are stale so new indexes get used
+    with db.engine.connect() as conn:
+        conn.execute(text("PRAGMA optimize"))
+
+@app.cli.command('migrate')
+def migrate_command():
+    """Create and update the database schema."""
+    migrate_database()
+    print("Database schema is up to date")
 
 # Run the application when script is executed directly
 if __name__ == "__main__":
-    # Create all database tables if they don't exist
-    with app.app_context():
-        db.create_all()
+    # Schema checks run via `flask migrate`; AUTO_MIGRATE=1 also runs them here
+    if os.environ.get('AUTO_MIGRATE') == '1':
+        with app.app_context():
+            migrate_database()
     
     # Run the Flask application
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    app.run(debug=True, host='0.0.0.0', port=5000)
@@ -2,20 +2,44 @@
 API routes for handling PDF Portfolio requests
 """
 import os
-import traceback
-from flask import Blueprint, send_file, jsonify, abort, current_app, session, g
+from flask import Blueprint, jsonify, abort, current_app, session, request, g
 from functools import wraps
+from werkzeug.wsgi import FileWrapper
 from app import login_required, File, CreatedFile, PDFPortfolio
 
 # Create a Blueprint for portfolio API routes
 portfolio_api = Blueprint('portfolio_api', __name__, url_prefix='/api/portfolio')
 
+# Block size handed to the WSGI server's file wrapper
+PDF_WRAPPER_BLOCKSIZE = 65536
+
+def send_pdf_file(file_path):
+    """
+    Stream a PDF through the WSGI server's file wrapper so servers that
+    support it (gunicorn, uWSGI) can use sendfile(2)
+    """
+    f = open(file_path, 'rb')
+    try:
+        size = os.fstat(f.fileno()).st_size
+        wrapper = request.environ.get('wsgi.file_wrapper', FileWrapper)
+        response = current_app.response_class(
+            wrapper(f, PDF_WRAPPER_BLOCKSIZE),
+            mimetype='application/pdf',
+            direct_passthrough=True
+        )
+    except Exception:
+        f.close()
+        raise
+    
+    response.content_length = size
+    return response
+
 @portfolio_api.route('/<int:portfolio_id>/surface-file', methods=['GET'])
 @login_required
 def get_surface_file(portfolio_id):
     """Get the surface file for a given portfolio ID"""
     # Log the request
-    current_app.logger.debug(f"Surface file requested for portfolio ID: {portfolio_id}")
+    current_app.logger.debug("Surface file requested for portfolio ID: %s", portfolio_id)
     
     try:
         # Import db from app context to ensure proper registration
@@ -23,40 +47,39 @@ def get_surface_file(portfolio_id):
         
         # Look up the portfolio
         portfolio = PDFPortfolio.query.get_or_404(portfolio_id)
-        current_app.logger.debug(f"Portfolio found: {portfolio.id}")
+        current_app.logger.debug("Portfolio found: %s", portfolio.id)
         
         # Make sure we have a surface file ID
         if not portfolio.surface_file_id:
-            current_app.logger.warning(f"No surface file ID for portfolio {portfolio_id}")
+            current_app.logger.warning("No surface file ID for portfolio %s", portfolio_id)
             return jsonify({
                 'success': False,
                 'error': 'No surface file exists for this portfolio'
             }), 404
         
-        current_app.logger.debug(f"Surface file ID: {portfolio.surface_file_id}")
+        current_app.logger.debug("Surface file ID: %s", portfolio.surface_file_id)
         
         # Get the surface file
         surface_file = CreatedFile.query.get_or_404(portfolio.surface_file_id)
-        current_app.logger.debug(f"Surface file found: {surface_file.id}, path: {surface_file.file_path}")
+        current_app.logger.debug("Surface file found: %s, path: %s", surface_file.id, surface_file.file_path)
         
         # Security check: file owner should match the logged-in user
         if surface_file.user_email != session.get('user_email'):
-            current_app.logger.warning(f"Access denied: User {session.get('user_email')} attempted to access file owned by {surface_file.user_email}")
+            current_app.logger.warning("Access denied: User %s attempted to access file owned by %s", session.get('user_email'), surface_file.user_email)
             return abort(403)
         
         # Check that file exists
         file_path = surface_file.file_path
         if not os.path.exists(file_path):
-            current_app.logger.warning(f"Surface file not found on disk: {file_path}")
+            current_app.logger.warning("Surface file not found on disk: %s", file_path)
             return jsonify({
                 'success': False,
                 'error': 'Surface file not found on server'
             }), 404
             
-        current_app.logger.debug(f"Serving surface file from: {file_path}")
+        current_app.logger.debug("Serving surface file from: %s", file_path)
     except Exception as e:
-        tb = traceback.format_exc()
-        current_app.logger.error(f"Error getting surface file: {str(e)}\n{tb}")
+        current_app.logger.exception("Error getting surface file")
         return jsonify({
             'success': False,
             'error': f'Error retrieving surface file: {str(e)}'
@@ -65,16 +88,16 @@ def get_surface_file(portfolio_id):
     # Stream the file
     try:
         # Debug info
-        current_app.logger.debug(f"Attempting to send file {file_path} using send_file")
+        current_app.logger.debug("Attempting to send file %s using send_file", file_path)
         
         # Check file exists and is accessible
         if not os.path.isfile(file_path):
-            current_app.logger.error(f"File not found or not accessible: {file_path}")
+            current_app.logger.error("File not found or not accessible: %s", file_path)
             
             # Check if directory exists
             dir_path = os.path.dirname(file_path)
             if not os.path.isdir(dir_path):
-                current_app.logger.error(f"Directory does not exist: {dir_path}")
+                current_app.logger.error("Directory does not exist: %s", dir_path)
                 return jsonify({
                     'success': False,
                     'error': f'Surface file directory not found on the server: {dir_path}'
@@ -83,9 +106,9 @@ def get_surface_file(portfolio_id):
             # List directory contents for debugging
             try:
                 dir_contents = os.listdir(dir_path)
-                current_app.logger.debug(f"Directory contents of {dir_path}: {dir_contents}")
+                current_app.logger.debug("Directory contents of %s: %s", dir_path, dir_contents)
             except Exception as e:
-                current_app.logger.error(f"Error listing directory: {str(e)}")
+                current_app.logger.error("Error listing directory: %s", e)
                 
             return jsonify({
                 'success': False,
@@ -94,18 +117,14 @@ def get_surface_file(portfolio_id):
             
         # Get file size for logging
         file_size = os.path.getsize(file_path)
-        current_app.logger.debug(f"File size: {file_size} bytes")
+        current_app.logger.debug("File size: %s bytes", file_size)
             
         # Stream the file
-        return send_file(
-            file_path,
-            mimetype='application/pdf',
-            as_attachment=False,
-            download_name=surface_file.original_filename
-        )
+        response = send_pdf_file(file_path)
+        response.headers.set('Content-Disposition', 'inline', filename=surface_file.original_filename)
+        return response
     except Exception as e:
-        tb = traceback.format_exc()
-        current_app.logger.error(f"Error sending file: {str(e)}\n{tb}")
+        current_app.logger.exception("Error sending file")
         return jsonify({
             'success': False,
             'error': f'Error sending file: {str(e)}'
@@ -129,8 +148,7 @@ def get_portfolio_info(portfolio_id):
             surface_file = CreatedFile.query.get(portfolio.surface_file_id)
             
     except Exception as e:
-        tb = traceback.format_exc()
-        current_app.logger.error(f"Error getting portfolio info: {str(e)}\n{tb}")
+        current_app.logger.exception("Error getting portfolio info")
         return jsonify({
             'success': False,
             'error': f'Error retrieving portfolio information: {str(e)}'
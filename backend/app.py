@@ -23,7 +23,6 @@ from reportlab.pdfbase.acroform import AcroForm
 from flask import send_from_directory
 from pypdf import PdfReader, PdfWriter
 from pypdf.generic import DecodedStreamObject, NameObject, DictionaryObject, create_string_object, BooleanObject
-import json
 # Import PdfWrapper from PyPDFForm for form field handling
 from PyPDFForm import PdfWrapper
 
@@ -33,8 +32,21 @@ app = Flask(__name__)
 app.secret_key = 'your-temporary-secret-key'
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///files.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Let browsers cache static assets (e.g. the diagnostics stylesheet) for a year;
+# static_cache_buster below changes their URLs whenever the files change
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = int(os.environ.get('SEND_FILE_MAX_AGE_DEFAULT', 31536000))
 db = SQLAlchemy(app)
 
+@app.url_defaults
+def static_cache_buster(endpoint, values):
+    """Add the file's mtime as ?v= to static URLs so edited assets are refetched."""
+    if endpoint != 'static' or 'filename' not in values or 'v' in values:
+        return
+    try:
+        values['v'] = os.stat(os.path.join(app.static_folder, values['filename'])).st_mtime_ns
+    except OSError:
+        pass
+
 # Custom filters
 @app.template_filter('hash')
 def hash_filter(value):
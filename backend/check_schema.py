@@ -4,43 +4,91 @@ import sqlite3
 # Path to the SQLite database file
 DB_PATH = os.path.join('instance', 'files.db')
 
-def check_table_schema(table_name):
+# Tables inspected when the script is run directly
+TABLES = ['submissions', 'files', 'created_files', 'filled_forms', 'pdf_portfolios']
+
+def check_table_schema(cursor, table_name):
     """Check the schema of a specific table"""
     try:
-        # Connect to the database
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Get table info
-        cursor.execute(f"PRAGMA table_info({table_name})")
+        # Get table info; the table-valued pragma takes the name as a parameter
+        cursor.execute("SELECT name, type, pk, \"notnull\" FROM pragma_table_info(?)", (table_name,))
         columns = cursor.fetchall()
-        
+
         print(f"Schema for table {table_name}:")
-        for col in columns:
-            print(f"  {col[1]} ({col[2]}) {'PRIMARY KEY' if col[5] == 1 else ''} {'NOT NULL' if col[3] == 1 else 'NULL'}")
-        
-        # Check if table has data
-        cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
+        for name, col_type, pk, notnull in columns:
+            print(f"  {name} ({col_type}) {'PRIMARY KEY' if pk == 1 else ''} {'NOT NULL' if notnull == 1 else 'NULL'}")
+
+        # Check if table has data; identifiers can't be bound, so only known tables get here
+        cursor.execute(f'SELECT COUNT(*) FROM "{table_name}"')
         count = cursor.fetchone()[0]
         print(f"Table {table_name} has {count} rows")
-        
-        conn.close()
+
         return True
     except Exception as e:
         print(f"Error checking schema: {e}")
         return False
 
+def check_all(cursor, tables):
+    """Check several tables with the same cursor"""
+    results = []
+    for table_name in tables:
+        results.append(check_table_schema(cursor, table_name))
+        print("\n")
+    return all(results)
+
+def print_pragmas(cursor):
+    """Print the database's journal mode and this connection's SQLite settings"""
+    try:
+        # journal_mode is stored in the file; the others are per-connection
+        # defaults, which the app overrides on each of its own connections
+        for pragma in ('journal_mode', 'synchronous', 'cache_size', 'temp_store', 'mmap_size'):
+            cursor.execute(f"PRAGMA {pragma}")
+            print(f"  {pragma} = {cursor.fetchone()[0]}")
+
+        return True
+    except Exception as e:
+        print(f"Error reading pragmas: {e}")
+        return False
+
+# Indexes on the ID columns used by hot lookups; names match the models in
+# app.py so db.create_all() and this script never create duplicates.
+# created_files.original_file_id and submissions.filled_file_id are covered
+# by the app's unique indexes.
+INDEXES = [
+    ("ix_pdf_portfolios_surface_file_id", "pdf_portfolios", "surface_file_id"),
+    ("ix_form_definitions_file_id", "form_definitions", "file_id"),
+]
+
+def ensure_indexes(conn):
+    """Create any missing lookup indexes and refresh planner statistics"""
+    try:
+        cursor = conn.cursor()
+
+        for index_name, table_name, column in INDEXES:
+            sql = f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name}({column})"
+            print(sql)
+            cursor.execute(sql)
+
+        # Let the query planner see the new indexes
+        cursor.execute("ANALYZE")
+        conn.commit()
+        return True
+    except Exception as e:
+        print(f"Error creating indexes: {e}")
+        return False
+
 if __name__ == "__main__":
     print(f"Checking database schema in {DB_PATH}...")
     if os.path.exists(DB_PATH):
-        check_table_schema('submissions')
-        print("\n")
-        check_table_schema('files')
-        print("\n")
-        check_table_schema('created_files')
-        print("\n")
-        check_table_schema('filled_forms')
-        print("\n")
-        check_table_schema('pdf_portfolios')
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            cursor = conn.cursor()
+            print("SQLite settings:")
+            print_pragmas(cursor)
+            print("\n")
+            check_all(cursor, TABLES)
+            ensure_indexes(conn)
+        finally:
+            conn.close()
     else:
         print(f"Database file {DB_PATH} not found!")
@@ -4,14 +4,18 @@ PDF Portfolio Diagnostics API
 This module provides API endpoints for PDF portfolio diagnostics and testing.
 """
 import os
+import re
 import sys
 import traceback
+import importlib.metadata
 import logging
+import threading
 import time
 from datetime import datetime
 from io import BytesIO
 from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, send_file, current_app, session
-from functools import wraps
+from functools import wraps, lru_cache
+from jinja2 import Template
 
 # Create a Blueprint for diagnostics
 diagnostics_api = Blueprint('diagnostics', __name__, url_prefix='/diagnostics')
@@ -33,6 +37,121 @@ except ImportError:
     pdf_diagnostics = PlaceholderDiagnostics()
     logging.warning("pdf_portfolio_diagnostics module not found")
 
+# Keys for the field dicts passed to validate_portfolio, in query column order
+FIELD_KEYS = ('name', 'type', 'x', 'y', 'width', 'height', 'page', 'default_value')
+
+# Portfolio validation results, keyed by everything the diagnostic reads
+VALIDATE_CACHE_TTL = 300
+VALIDATE_CACHE_SIZE = 256
+_validate_cache = {}
+_validate_cache_lock = threading.Lock()
+
+def _mtime_ns(path):
+    """Modification time of path in nanoseconds, or None if it is missing"""
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+def _cached_validation(key):
+    """Return cached validation results for key if still fresh"""
+    with _validate_cache_lock:
+        cached = _validate_cache.get(key)
+    if cached and time.time() - cached[0] < VALIDATE_CACHE_TTL:
+        return cached[1]
+    return None
+
+def _store_validation(key, results):
+    """Cache validation results, evicting expired and then oldest entries"""
+    now = time.time()
+    with _validate_cache_lock:
+        for stale_key in [k for k, (stored_at, _) in _validate_cache.items() if now - stored_at >= VALIDATE_CACHE_TTL]:
+            del _validate_cache[stale_key]
+        while len(_validate_cache) >= VALIDATE_CACHE_SIZE:
+            del _validate_cache[next(iter(_validate_cache))]
+        _validate_cache[key] = (now, results)
+
+def _get_owned_portfolio(portfolio_id, user_email):
+    """
+    Fetch a portfolio only if it belongs to user_email
+    
+    Ownership is part of the WHERE clause, so missing and foreign portfolios
+    both come back as None and callers answer both with the same 404.
+    """
+    from app import PDFPortfolio
+    return PDFPortfolio.query.filter_by(id=portfolio_id, user_email=user_email).first()
+
+# Test page templates, compiled once at import; styles are in static/diagnostics/test-pdf.css
+_TEST_PDF_TPL = Template("""\
+<!DOCTYPE html>
+<html>
+<head>
+    <title>PDF Test Results</title>
+    <link rel="stylesheet" href="{{ css_url }}">
+</head>
+<body>
+    <h1>PDF Test Results</h1>
+
+    <h2>Portfolio Information</h2>
+    <table>
+        <tr>
+            <th>Field</th>
+            <th>Value</th>
+        </tr>
+        <tr>
+            <td>Portfolio ID</td>
+            <td>{{ portfolio.id }}</td>
+        </tr>
+        <tr>
+            <td>Base File ID</td>
+            <td>{{ portfolio.base_file_id }}</td>
+        </tr>
+        <tr>
+            <td>Surface File ID</td>
+            <td>{{ portfolio.surface_file_id }}</td>
+        </tr>
+        <tr>
+            <td>Surface File Path</td>
+            <td>{{ surface_file.file_path }}</td>
+        </tr>
+        <tr>
+            <td>File Exists</td>
+            <td class="{{ 'success' if file_exists else 'error' }}">{{ file_exists }}</td>
+        </tr>
+        <tr>
+            <td>File Size</td>
+            <td>{{ file_size }} bytes</td>
+        </tr>
+    </table>
+
+    <h2>File Preview</h2>
+    <p>If the PDF displays correctly below, the problem is likely with the frontend PDF loading.</p>
+    <iframe src="/api/portfolio/{{ portfolio.id }}/surface-file"></iframe>
+
+    <h2>Direct Link</h2>
+    <p><a href="/api/portfolio/{{ portfolio.id }}/surface-file" target="_blank">Open PDF directly</a></p>
+</body>
+</html>
+""", autoescape=True)
+
+_TEST_PDF_ERR_TPL = Template("""\
+<!DOCTYPE html>
+<html>
+<head>
+    <title>PDF Test Error</title>
+    <link rel="stylesheet" href="{{ css_url }}">
+</head>
+<body>
+    <h1>PDF Test Error</h1>
+
+    <p class="error">Error: {{ error }}</p>
+
+    <h2>Stack Trace</h2>
+    <pre>{{ tb }}</pre>
+</body>
+</html>
+""", autoescape=True)
+
 @diagnostics_api.route('/test-pdf/<int:portfolio_id>', methods=['GET'])
 def test_pdf(portfolio_id):
     """Test PDF loading for a specific portfolio"""
@@ -52,96 +171,29 @@ def test_pdf(portfolio_id):
             
         surface_file = CreatedFile.query.get_or_404(portfolio.surface_file_id)
         
-        # Create HTML with test results
-        file_exists = os.path.exists(surface_file.file_path)
-        file_size = os.path.getsize(surface_file.file_path) if file_exists else 0
-        
-        html = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>PDF Test Results</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 20px; }}
-                .success {{ color: green; }}
-                .error {{ color: red; }}
-                pre {{ background: #f0f0f0; padding: 10px; overflow-x: auto; }}
-                table {{ border-collapse: collapse; }}
-                th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
-                th {{ background-color: #f2f2f2; }}
-                iframe {{ width: 100%; height: 600px; border: 1px solid #ddd; }}
-            </style>
-        </head>
-        <body>
-            <h1>PDF Test Results</h1>
-            
-            <h2>Portfolio Information</h2>
-            <table>
-                <tr>
-                    <th>Field</th>
-                    <th>Value</th>
-                </tr>
-                <tr>
-                    <td>Portfolio ID</td>
-                    <td>{portfolio.id}</td>
-                </tr>
-                <tr>
-                    <td>Base File ID</td>
-                    <td>{portfolio.base_file_id}</td>
-                </tr>
-                <tr>
-                    <td>Surface File ID</td>
-                    <td>{portfolio.surface_file_id}</td>
-                </tr>
-                <tr>
-                    <td>Surface File Path</td>
-                    <td>{surface_file.file_path}</td>
-                </tr>
-                <tr>
-                    <td>File Exists</td>
-                    <td class="{'success' if file_exists else 'error'}">{file_exists}</td>
-                </tr>
-                <tr>
-                    <td>File Size</td>
-                    <td>{file_size} bytes</td>
-                </tr>
-            </table>
-            
-            <h2>File Preview</h2>
-            <p>If the PDF displays correctly below, the problem is likely with the frontend PDF loading.</p>
-            <iframe src="/api/portfolio/{portfolio_id}/surface-file"></iframe>
-            
-            <h2>Direct Link</h2>
-            <p><a href="/api/portfolio/{portfolio_id}/surface-file" target="_blank">Open PDF directly</a></p>
-        </body>
-        </html>
-        """
+        # Gather file details for the test page
+        try:
+            file_size = os.stat(surface_file.file_path).st_size
+            file_exists = True
+        except FileNotFoundError:
+            file_exists = False
+            file_size = 0
         
-        return html
+        return _TEST_PDF_TPL.render(
+            css_url=url_for('static', filename='diagnostics/test-pdf.css'),
+            portfolio=portfolio,
+            surface_file=surface_file,
+            file_exists=file_exists,
+            file_size=file_size
+        )
         
     except Exception as e:
         tb = traceback.format_exc()
-        return f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>PDF Test Error</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 20px; }}
-                .error {{ color: red; }}
-                pre {{ background: #f0f0f0; padding: 10px; overflow-x: auto; }}
-            </style>
-        </head>
-        <body>
-            <h1>PDF Test Error</h1>
-            
-            <p class="error">Error: {str(e)}</p>
-            
-            <h2>Stack Trace</h2>
-            <pre>{tb}</pre>
-        </body>
-        </html>
-        """
+        return _TEST_PDF_ERR_TPL.render(
+            css_url=url_for('static', filename='diagnostics/test-pdf.css'),
+            error=str(e),
+            tb=tb
+        )
 
 @diagnostics_api.route('/portfolio/<int:portfolio_id>/validate', methods=['GET'])
 def validate_portfolio(portfolio_id):
@@ -157,20 +209,19 @@ def validate_portfolio(portfolio_id):
             return jsonify({'success': False, 'error': 'Not logged in'}), 401
         
         # Import models here to avoid circular imports
-        from app import PDFPortfolio, CreatedFile, File, PDFFormField
+        from app import db, PDFPortfolio, CreatedFile, File, PDFFormField
         
-        # Get the portfolio
-        portfolio = PDFPortfolio.query.get(portfolio_id)
+        # Get the portfolio - only the owner can run diagnostics
+        portfolio = _get_owned_portfolio(portfolio_id, session['user_email'])
         if not portfolio:
             return jsonify({'success': False, 'error': 'Portfolio not found'}), 404
-            
-        # Security check - only the owner can run diagnostics
-        if portfolio.user_email != session.get('user_email', ''):
-            return jsonify({'success': False, 'error': 'Unauthorized access'}), 403
         
-        # Get the base and surface files
-        base_file = File.query.get(portfolio.base_file_id)
-        surface_file = CreatedFile.query.get(portfolio.surface_file_id)
+        # Get the base and surface files in one query; a missing file comes back as None
+        base_file, surface_file = db.session.query(File, CreatedFile).select_from(PDFPortfolio).outerjoin(
+            File, File.id == PDFPortfolio.base_file_id
+        ).outerjoin(
+            CreatedFile, CreatedFile.id == PDFPortfolio.surface_file_id
+        ).filter(PDFPortfolio.id == portfolio.id).one()
         
         if not base_file or not surface_file:
             return jsonify({
@@ -182,6 +233,22 @@ def validate_portfolio(portfolio_id):
                 }
             }), 404
         
+        # Inputs change rarely, so reuse the last result while the files and
+        # field rows are unchanged
+        field_count = PDFFormField.query.filter_by(form_id=portfolio.form_definition_id).count() if portfolio.form_definition_id else 0
+        cache_key = (
+            portfolio.id,
+            _mtime_ns(base_file.file_path),
+            _mtime_ns(surface_file.file_path),
+            portfolio.form_definition_id,
+            field_count
+        )
+        results = _cached_validation(cache_key)
+        if results is not None:
+            response = jsonify({'success': True, 'results': results})
+            response.headers['Cache-Control'] = 'private, max-age=60'
+            return response
+        
         # Prepare portfolio data for validation
         portfolio_data = {
             'id': portfolio.id,
@@ -191,19 +258,19 @@ def validate_portfolio(portfolio_id):
             'fields': []
         }
         
-        # Add fields from database
-        fields = PDFFormField.query.filter_by(form_id=portfolio.form_definition_id).all() if portfolio.form_definition_id else []
-        for field in fields:
-            portfolio_data['fields'].append({
-                'name': field.name,
-                'type': field.field_type,
-                'x': field.x,
-                'y': field.y,
-                'width': field.width,
-                'height': field.height,
-                'page': field.page,
-                'default_value': field.default_value
-            })
+        # Add fields from database as plain rows, skipping ORM instance construction
+        if portfolio.form_definition_id:
+            rows = db.session.query(
+                PDFFormField.name,
+                PDFFormField.field_type,
+                PDFFormField.x,
+                PDFFormField.y,
+                PDFFormField.width,
+                PDFFormField.height,
+                PDFFormField.page,
+                PDFFormField.default_value
+            ).filter_by(form_id=portfolio.form_definition_id).all()
+            portfolio_data['fields'] = [dict(zip(FIELD_KEYS, row)) for row in rows]
         
         # Run the diagnostics
         results = pdf_diagnostics.validate_portfolio(
@@ -220,11 +287,14 @@ def validate_portfolio(portfolio_id):
             'base_file_name': base_file.original_filename,
             'surface_file_name': surface_file.original_filename
         }
+        _store_validation(cache_key, results)
         
-        return jsonify({
+        response = jsonify({
             'success': True,
             'results': results
         })
+        response.headers['Cache-Control'] = 'private, max-age=60'
+        return response
         
     except Exception as e:
         logging.error(f"Error running portfolio diagnostics: {str(e)}")
@@ -245,17 +315,13 @@ def test_form_fill(portfolio_id):
             return jsonify({'success': False, 'error': 'Not logged in'}), 401
             
         # Import models here to avoid circular imports
-        from app import PDFPortfolio, CreatedFile
+        from app import CreatedFile
         
-        # Get the portfolio
-        portfolio = PDFPortfolio.query.get(portfolio_id)
+        # Get the portfolio - only the owner can run tests
+        portfolio = _get_owned_portfolio(portfolio_id, session['user_email'])
         if not portfolio:
             return jsonify({'success': False, 'error': 'Portfolio not found'}), 404
             
-        # Security check - only the owner can run tests
-        if portfolio.user_email != session.get('user_email', ''):
-            return jsonify({'success': False, 'error': 'Unauthorized access'}), 403
-            
         # Get the surface file
         surface_file = CreatedFile.query.get(portfolio.surface_file_id)
         if not surface_file:
@@ -287,6 +353,21 @@ def test_form_fill(portfolio_id):
         logging.error(traceback.format_exc())
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# Package names reported by /system-info
+_PDF_PKG_RE = re.compile(r'(pdf|pypdf2?|reportlab|pdfform)', re.I)
+
+@lru_cache(maxsize=1)
+def _pdf_packages():
+    """PDF-related installed packages; enumerated once since they can't change at runtime"""
+    packages = [
+        {'name': dist.metadata['Name'], 'version': dist.version}
+        for dist in importlib.metadata.distributions()
+        if dist.metadata['Name']
+    ]
+    
+    # Filter for relevant packages
+    return tuple(p for p in packages if _PDF_PKG_RE.search(p['name']))
+
 @diagnostics_api.route('/system-info', methods=['GET'])
 def get_system_info():
     """Get system diagnostic information"""
@@ -296,26 +377,12 @@ def get_system_info():
             return jsonify({'success': False, 'error': 'Not logged in'}), 401
             
         import platform
-        import sys
-        import pkg_resources
-        
-        # Get Python packages
-        packages = [
-            {'name': p.project_name, 'version': p.version}
-            for p in pkg_resources.working_set
-        ]
-        
-        # Filter for relevant packages
-        pdf_packages = [p for p in packages if any(
-            pdf_lib in p['name'].lower() for pdf_lib in 
-            ['pdf', 'pypdf', 'pypdf2', 'reportlab', 'pdfform']
-        )]
         
         # Get system info
         system_info = {
             'platform': platform.platform(),
             'python_version': sys.version,
-            'packages': pdf_packages,
+            'packages': list(_pdf_packages()),
             'timestamp': datetime.utcnow().isoformat()
         }
         
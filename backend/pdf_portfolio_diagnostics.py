@@ -7,21 +7,165 @@ This module provides diagnostic functions for validating and testing PDF portfol
 import os
 import json
 import logging
+import tempfile
 import time
+from collections import Counter
+from collections.abc import Mapping
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
 from pypdf import PdfReader
 
 # Import our portfolio utilities
 from pdf_portfolio_utils import surface_pdf_generator
 
+
+# Field flag and type names used to classify PDF form fields
+_RADIO_FLAG = 1 << 15
+_FT_TX, _FT_BTN = "/Tx", "/Btn"
+
+# Field type classes; _field_type returns an index into FIELD_TYPES
+FIELD_TYPES = ('text', 'checkbox', 'radio', 'other')
+_TEXT, _CHECKBOX, _RADIO, _OTHER = range(len(FIELD_TYPES))
+
+
+def _field_type(field_type, flags):
+    """Classify a PDF form field by its /FT and /Ff, returning an index into FIELD_TYPES"""
+    if field_type == _FT_TX:  # Text
+        return _TEXT
+    if field_type == _FT_BTN:  # Button (checkbox or radio)
+        if flags & _RADIO_FLAG:  # Radio button
+            return _RADIO
+        return _CHECKBOX
+    return _OTHER
+
+
+def _iter_field_types(reader):
+    """
+    Walk /AcroForm/Fields directly and yield each terminal field's type
+
+    Only /T, /FT, /Ff and /Kids are read, skipping the attribute expansion that
+    reader.get_fields() does for every field. /FT and /Ff are inherited from
+    parent fields, and names are joined with '.' as in get_fields().
+
+    Args:
+        reader: PdfReader for the document
+
+    Yields:
+        tuple: (name, field_type, flags) for each field that holds a value
+    """
+    acro_form = reader.trailer["/Root"].get("/AcroForm")
+    if acro_form is None:
+        return
+
+    # Dictionary values may be indirect references; [] reads resolve them
+    acro_form = acro_form.get_object()
+    fields = acro_form["/Fields"] if "/Fields" in acro_form else []
+
+    stack = [(ref, None, None, 0) for ref in reversed(fields)]
+    while stack:
+        ref, parent_name, field_type, flags = stack.pop()
+        field = ref.get_object()
+        partial_name = field.get("/T")
+        if partial_name is None:
+            name = parent_name
+        elif parent_name is None:
+            name = str(partial_name)
+        else:
+            name = f"{parent_name}.{partial_name}"
+        field_type = field.get("/FT", field_type)
+        flags = field.get("/Ff", flags)
+
+        # Kids without /T are widget annotations of this field, not child fields
+        kids = field["/Kids"] if "/Kids" in field else []
+        kids = [kid for kid in kids if "/T" in kid.get_object()]
+        if kids:
+            stack.extend((kid, name, field_type, flags) for kid in reversed(kids))
+        elif name is not None:
+            yield name, field_type, flags
+
+
+def _summarize_fields(reader):
+    """
+    Summarize the pages and form fields of an open PdfReader
+
+    Returns:
+        tuple: (page_count, field_type_counts, fields) where field_type_counts
+        is a tuple of (type, count) pairs and fields a tuple of (name, type) pairs
+    """
+    counts = [0] * len(FIELD_TYPES)
+    fields = []
+    for field_name, field_type, flags in _iter_field_types(reader):
+        field_type = _field_type(field_type, flags)
+        counts[field_type] += 1
+        fields.append((field_name, FIELD_TYPES[field_type]))
+
+    return len(reader.pages), tuple(zip(FIELD_TYPES, counts)), tuple(fields)
+
+
+@lru_cache(maxsize=128)
+def _extract_fields(path, mtime_ns, size):
+    """
+    Parse a PDF once and summarize its form fields
+
+    mtime_ns and size are only part of the cache key, so a file that changes
+    on disk is parsed again on the next call.
+
+    Args:
+        path: Path to the PDF file
+        mtime_ns: st_mtime_ns of the file
+        size: st_size of the file
+
+    Returns:
+        tuple: See _summarize_fields
+    """
+    with open(path, 'rb') as f:
+        return _summarize_fields(PdfReader(f))
+
+
+def _stat(path):
+    """Return os.stat(path), or None if path is empty or missing"""
+    if not path:
+        return None
+    try:
+        return os.stat(path)
+    except FileNotFoundError:
+        return None
+
+
+def _extract_fields_for(path, st, reader=None):
+    """
+    Field summary for path: from reader if the caller already has one open,
+    otherwise from the cache keyed by the file's stat result
+    """
+    if reader is not None:
+        return _summarize_fields(reader)
+    return _extract_fields(path, st.st_mtime_ns, st.st_size)
+
+
+class _TestDataView(Mapping):
+    """Read-only view of available_fields mapping each field name to its test value"""
+
+    def __init__(self, available_fields):
+        self._fields = available_fields
+
+    def __getitem__(self, field_name):
+        return self._fields[field_name]['test_value']
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+
 class PDFPortfolioDiagnostics:
     """
     Diagnostic tools for PDF Portfolio validation and testing
     """
     
     @staticmethod
-    def validate_portfolio(portfolio_data, base_file_path=None, surface_file_path=None):
+    def validate_portfolio(portfolio_data, base_file_path=None, surface_file_path=None, surface_reader=None):
         """
         Validate a PDF portfolio's structure and field configuration
         
@@ -29,6 +173,7 @@ class PDFPortfolioDiagnostics:
             portfolio_data: Dictionary containing portfolio data
             base_file_path: Optional path to the base PDF file
             surface_file_path: Optional path to the surface PDF file
+            surface_reader: Optional PdfReader already open on the surface file
             
         Returns:
             dict: Diagnostic results
@@ -50,16 +195,17 @@ class PDFPortfolioDiagnostics:
             results['errors'].extend(errors)
             
         # Check base file if provided
-        if base_file_path and os.path.exists(base_file_path):
+        # One stat per file gives both existence and the parse cache key
+        base_stat = _stat(base_file_path)
+        if base_stat:
             try:
                 base_results = {}
-                with open(base_file_path, 'rb') as f:
-                    reader = PdfReader(f)
-                    base_results['pages'] = len(reader.pages)
-                    base_results['valid_pdf'] = True
-                    base_results['has_fields'] = bool(reader.get_fields())
-                    if base_results['has_fields']:
-                        results['warnings'].append("Base PDF already contains form fields")
+                page_count, _, fields = _extract_fields_for(base_file_path, base_stat)
+                base_results['pages'] = page_count
+                base_results['valid_pdf'] = True
+                base_results['has_fields'] = bool(fields)
+                if base_results['has_fields']:
+                    results['warnings'].append("Base PDF already contains form fields")
                 results['file_checks']['base_file'] = base_results
             except Exception as e:
                 results['file_checks']['base_file'] = {
@@ -74,50 +220,32 @@ class PDFPortfolioDiagnostics:
             results['file_checks']['base_file'] = {'valid_pdf': False, 'exists': False}
             
         # Check surface file if provided
-        if surface_file_path and os.path.exists(surface_file_path):
+        surface_stat = _stat(surface_file_path) if surface_reader is None else None
+        if surface_stat or surface_reader is not None:
             try:
                 surface_results = {}
-                with open(surface_file_path, 'rb') as f:
-                    reader = PdfReader(f)
-                    surface_results['pages'] = len(reader.pages)
-                    surface_results['valid_pdf'] = True
-                    
-                    # Check fields
-                    fields = reader.get_fields()
-                    surface_results['has_fields'] = bool(fields)
-                    
-                    # Get field count by type
-                    if fields:
-                        field_types = {'text': 0, 'checkbox': 0, 'radio': 0, 'other': 0}
-                        for field_name, field_refs in fields.items():
-                            field_key = list(field_refs.keys())[0]
-                            field_ref = field_refs[field_key]
-                            field = reader.get_object(field_ref)
-                            
-                            # Determine field type
-                            if field.get("/FT") == "/Tx":  # Text
-                                field_types['text'] += 1
-                            elif field.get("/FT") == "/Btn":  # Button (checkbox or radio)
-                                if field.get("/Ff", 0) & (1 << 15):  # Radio button
-                                    field_types['radio'] += 1
-                                else:  # Checkbox
-                                    field_types['checkbox'] += 1
-                            else:
-                                field_types['other'] += 1
-                                
-                        surface_results['field_counts'] = field_types
-                        surface_results['total_fields'] = sum(field_types.values())
-                        
-                        # Compare with expected field count
-                        expected_fields = len(portfolio_data.get('fields', []))
-                        if expected_fields != surface_results['total_fields']:
-                            results['warnings'].append(
-                                f"Field count mismatch: Expected {expected_fields}, found {surface_results['total_fields']}"
-                            )
-                    else:
-                        results['errors'].append("Surface PDF has no form fields")
-                        results['valid'] = False
-                
+                page_count, field_type_counts, fields = _extract_fields_for(surface_file_path, surface_stat, surface_reader)
+                surface_results['pages'] = page_count
+                surface_results['valid_pdf'] = True
+
+                # Check fields
+                surface_results['has_fields'] = bool(fields)
+
+                # Get field count by type
+                if fields:
+                    surface_results['field_counts'] = dict(field_type_counts)
+                    surface_results['total_fields'] = len(fields)
+
+                    # Compare with expected field count
+                    expected_fields = len(portfolio_data.get('fields', []))
+                    if expected_fields != surface_results['total_fields']:
+                        results['warnings'].append(
+                            f"Field count mismatch: Expected {expected_fields}, found {surface_results['total_fields']}"
+                        )
+                else:
+                    results['errors'].append("Surface PDF has no form fields")
+                    results['valid'] = False
+
                 results['file_checks']['surface_file'] = surface_results
             except Exception as e:
                 results['file_checks']['surface_file'] = {
@@ -140,25 +268,17 @@ class PDFPortfolioDiagnostics:
                 'invalid_positions': []
             }
             
-            # Count by type
-            type_counts = {}
-            field_names = set()
-            duplicate_names = set()
+            fields = portfolio_data['fields']
             
-            for field in portfolio_data['fields']:
-                # Check field type
-                field_type = field.get('type', 'unknown')
-                type_counts[field_type] = type_counts.get(field_type, 0) + 1
-                
-                # Check for duplicate names
-                name = field.get('name', '')
-                if name in field_names:
-                    duplicate_names.add(name)
-                else:
-                    field_names.add(name)
-                    
+            # Count by type and by name in C rather than per-field dict updates
+            type_counts = Counter(field.get('type', 'unknown') for field in fields)
+            name_counts = Counter(field.get('name', '') for field in fields)
+            duplicate_names = [name for name, count in name_counts.items() if count > 1]
+            
+            for field in fields:
                 # Check field positions
                 if field.get('x', 0) < 0 or field.get('y', 0) < 0:
+                    name = field.get('name', '')
                     field_checks['invalid_positions'].append({
                         'name': name,
                         'x': field.get('x', 0),
@@ -166,8 +286,8 @@ class PDFPortfolioDiagnostics:
                     })
                     results['warnings'].append(f"Field '{name}' has invalid position: ({field.get('x', 0)}, {field.get('y', 0)})")
             
-            field_checks['by_type'] = type_counts
-            field_checks['duplicate_names'] = list(duplicate_names)
+            field_checks['by_type'] = dict(type_counts)
+            field_checks['duplicate_names'] = duplicate_names
             
             if duplicate_names:
                 results['warnings'].append(f"Found {len(duplicate_names)} duplicate field names")
@@ -177,13 +297,14 @@ class PDFPortfolioDiagnostics:
         return results
     
     @staticmethod
-    def test_form_filling(surface_file_path, test_data=None):
+    def test_form_filling(surface_file_path, test_data=None, surface_reader=None):
         """
         Test form filling with sample data
         
         Args:
             surface_file_path: Path to the surface PDF file
             test_data: Optional dictionary of field values for testing
+            surface_reader: Optional PdfReader already open on the surface file
             
         Returns:
             dict: Test results
@@ -198,75 +319,68 @@ class PDFPortfolioDiagnostics:
             'performance': {}
         }
         
-        if not os.path.exists(surface_file_path):
+        surface_stat = _stat(surface_file_path) if surface_reader is None else None
+        if not surface_stat and surface_reader is None:
             results['errors'].append(f"Surface file not found: {surface_file_path}")
             return results
         
         try:
             # Get available fields
             available_fields = {}
-            with open(surface_file_path, 'rb') as f:
-                reader = PdfReader(f)
-                pdf_fields = reader.get_fields()
-                
-                if not pdf_fields:
-                    results['errors'].append("No form fields found in the PDF")
-                    return results
-                
-                for field_name in pdf_fields:
-                    field_key = list(pdf_fields[field_name].keys())[0]
-                    field_ref = pdf_fields[field_name][field_key]
-                    field = reader.get_object(field_ref)
-                    
-                    # Determine field type
-                    if field.get("/FT") == "/Tx":  # Text
-                        available_fields[field_name] = {'type': 'text', 'test_value': f"Test value for {field_name}"}
-                    elif field.get("/FT") == "/Btn":  # Button (checkbox or radio)
-                        if field.get("/Ff", 0) & (1 << 15):  # Radio button
-                            available_fields[field_name] = {'type': 'radio', 'test_value': "Yes"}
-                        else:  # Checkbox
-                            available_fields[field_name] = {'type': 'checkbox', 'test_value': True}
+            _, _, pdf_fields = _extract_fields_for(surface_file_path, surface_stat, surface_reader)
+
+            if not pdf_fields:
+                results['errors'].append("No form fields found in the PDF")
+                return results
+
+            for field_name, field_type in pdf_fields:
+                if field_type == 'text':
+                    available_fields[field_name] = {'type': 'text', 'test_value': f"Test value for {field_name}"}
+                elif field_type == 'radio':
+                    available_fields[field_name] = {'type': 'radio', 'test_value': "Yes"}
+                elif field_type == 'checkbox':
+                    available_fields[field_name] = {'type': 'checkbox', 'test_value': True}
             
             # Generate test data if not provided
             if not test_data:
-                test_data = {field: info['test_value'] for field, info in available_fields.items()}
+                test_data = _TestDataView(available_fields)
                 
-            # Measure fill performance
-            start_time = time.time()
-            
-            # Create temp output file
-            temp_output = os.path.join(os.path.dirname(surface_file_path), f"test_filled_{datetime.now().strftime('%Y%m%d%H%M%S')}.pdf")
-            
-            # Fill the form
-            filled_path = surface_pdf_generator.fill_surface_pdf(surface_file_path, test_data, temp_output)
+            # Fill into a scratch file outside the user's storage; it is
+            # removed once verified so test runs never leave files behind
+            fd, temp_output = tempfile.mkstemp(suffix='.pdf', prefix='test_filled_', dir=tempfile.gettempdir())
+            os.close(fd)
             
-            end_time = time.time()
-            fill_time = end_time - start_time
-            
-            # Verify filled form
-            with open(filled_path, 'rb') as f:
-                reader = PdfReader(f)
-                filled_fields = reader.get_fields()
-                
-                # Check that fields were filled
-                fields_filled = 0
-                for field_name, field_refs in filled_fields.items():
-                    if field_name in test_data:
-                        field_key = list(field_refs.keys())[0]
-                        field_ref = field_refs[field_key]
-                        field = reader.get_object(field_ref)
-                        
-                        if "/V" in field:
-                            fields_filled += 1
-                
-                results['info'].append(f"Filled {fields_filled} out of {len(test_data)} fields")
-                
-                if fields_filled < len(test_data):
-                    results['warnings'].append(f"Not all fields were filled: {fields_filled}/{len(test_data)}")
+            try:
+                # Measure fill performance
+                start_time = time.time()
+
+                # Fill the form
+                filled_path = surface_pdf_generator.fill_surface_pdf(surface_file_path, test_data, temp_output)
+
+                end_time = time.time()
+                fill_time = end_time - start_time
+
+                # Verify filled form
+                with open(filled_path, 'rb') as f:
+                    reader = PdfReader(f)
+                    filled_fields = reader.get_fields() or {}
+
+                    # Check that fields were filled; get_fields() already
+                    # carries each field's /V, so no object lookups are needed
+                    fields_filled = sum(
+                        1 for field_name, field in filled_fields.items()
+                        if field_name in test_data and "/V" in field
+                    )
+
+                    results['info'].append(f"Filled {fields_filled} out of {len(test_data)} fields")
+
+                    if fields_filled < len(test_data):
+                        results['warnings'].append(f"Not all fields were filled: {fields_filled}/{len(test_data)}")
+            finally:
+                os.unlink(temp_output)
             
             # Record results
             results['success'] = True
-            results['filled_file'] = filled_path
             results['performance'] = {
                 'fill_time_seconds': fill_time,
                 'fields_per_second': len(test_data) / fill_time if fill_time > 0 else 0
@@ -10,37 +10,64 @@ This module provides utilities for:
 import os
 import uuid
 import json
+import atexit
 import logging
+import threading
 from datetime import datetime
 from io import BytesIO
 from pathlib import Path
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
 
 # PDF manipulation libraries
 from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfbase.acroform import AcroForm
 from pypdf import PdfReader, PdfWriter
 from pypdf.generic import DecodedStreamObject, NameObject, DictionaryObject, create_string_object, BooleanObject
 from PyPDFForm import PdfWrapper
+# Portfolio structure checked by validate_pdf_portfolio
+PORTFOLIO_REQUIRED_KEYS = ('surface_file_id', 'base_file_id', 'name')
+FIELD_TYPES = ('text', 'checkbox', 'radio', 'signature')
+FIELD_COORDS = ('x', 'y', 'width', 'height')
+FIELD_REQUIRED_KEYS = frozenset(('name', 'type', 'page') + FIELD_COORDS)
+
+# Output files are written through a 1 MiB buffer; PDF writers emit many
+# small chunks that would otherwise each become a write() syscall
+PDF_WRITE_BUFFER_SIZE = 1 << 20
+
+# Worker processes for rendering page overlays of large forms
+SURFACE_RENDER_WORKERS = int(os.environ.get('SURFACE_RENDER_WORKERS', 4))
+# Forms with fields on fewer pages than this are rendered in-process
+SURFACE_RENDER_PARALLEL_MIN_PAGES = int(os.environ.get('SURFACE_RENDER_PARALLEL_MIN_PAGES', 4))
+_render_executor = None
+_render_executor_lock = threading.Lock()
+
+# pdfrw is optional; fill_surface_pdf falls back to pypdf when it isn't installed
+try:
+    import pdfrw
+except ImportError:
+    pdfrw = None
 
 
 # Field rendering helper functions
-def render_text_field(canvas_obj, field_data, adjusted_y):
+def render_text_field(canvas_obj, form, field_data, adjusted_y):
     """
     Render a text field on the PDF canvas
     
     Args:
         canvas_obj: ReportLab canvas object
+        form: AcroForm of the canvas, shared by every field on the page
         field_data: Dictionary with field properties
         adjusted_y: Y coordinate adjusted for PDF coordinate system
     """
-    x = field_data.get('x', 0)
+    # Bind the lookup once; every property below is read through it
+    get = field_data.get
+    x = get('x', 0)
     y = adjusted_y
-    width = field_data.get('width', 100)
-    height = field_data.get('height', 20)
-    field_name = field_data.get('name', '')
+    width = get('width', 100)
+    height = get('height', 20)
+    field_name = get('name', '')
     
     # Draw field border and label
     canvas_obj.rect(x, y, width, height)
@@ -48,7 +75,6 @@ def render_text_field(canvas_obj, field_data, adjusted_y):
     canvas_obj.drawString(x + 2, y + height + 10, field_name)
     
     # Add text form field
-    form = AcroForm(canvas_obj)
     form.textfield(
         name=field_name,
         x=x,
@@ -56,26 +82,28 @@ def render_text_field(canvas_obj, field_data, adjusted_y):
         width=width,
         height=height,
         borderWidth=1,
-        borderColor=field_data.get('border_color', 'black'),
-        fillColor=field_data.get('fill_color', 'white'),
-        textColor=field_data.get('text_color', 'black'),
-        fontSize=field_data.get('font_size', 10),
+        borderColor=get('border_color', 'black'),
+        fillColor=get('fill_color', 'white'),
+        textColor=get('text_color', 'black'),
+        fontSize=get('font_size', 10),
     )
 
-def render_checkbox_field(canvas_obj, field_data, adjusted_y):
+def render_checkbox_field(canvas_obj, form, field_data, adjusted_y):
     """
     Render a checkbox field on the PDF canvas
     
     Args:
         canvas_obj: ReportLab canvas object
+        form: AcroForm of the canvas, shared by every field on the page
         field_data: Dictionary with field properties
         adjusted_y: Y coordinate adjusted for PDF coordinate system
     """
-    x = field_data.get('x', 0)
+    get = field_data.get
+    x = get('x', 0)
     y = adjusted_y
-    width = field_data.get('width', 100)
-    height = field_data.get('height', 20)
-    field_name = field_data.get('name', '')
+    width = get('width', 100)
+    height = get('height', 20)
+    field_name = get('name', '')
     
     # Draw field border and label
     canvas_obj.rect(x, y, width, height)
@@ -83,33 +111,34 @@ def render_checkbox_field(canvas_obj, field_data, adjusted_y):
     canvas_obj.drawString(x + 2, y + height + 10, field_name)
     
     # Add checkbox form field with improved layout
-    form = AcroForm(canvas_obj)
     form.checkbox(
         name=field_name,
         x=x + width/4,
         y=y + height/4,
-        buttonStyle=field_data.get('button_style', 'check'),
-        borderColor=field_data.get('border_color', 'black'),
-        fillColor=field_data.get('fill_color', 'white'),
-        textColor=field_data.get('text_color', 'black'),
+        buttonStyle=get('button_style', 'check'),
+        borderColor=get('border_color', 'black'),
+        fillColor=get('fill_color', 'white'),
+        textColor=get('text_color', 'black'),
         width=width/2,
         height=height/2
     )
 
-def render_radio_field(canvas_obj, field_data, adjusted_y):
+def render_radio_field(canvas_obj, form, field_data, adjusted_y):
     """
     Render a radio button field on the PDF canvas
     
     Args:
         canvas_obj: ReportLab canvas object
+        form: AcroForm of the canvas, shared by every field on the page
         field_data: Dictionary with field properties
         adjusted_y: Y coordinate adjusted for PDF coordinate system
     """
-    x = field_data.get('x', 0)
+    get = field_data.get
+    x = get('x', 0)
     y = adjusted_y
-    width = field_data.get('width', 100)
-    height = field_data.get('height', 20)
-    field_name = field_data.get('name', '')
+    width = get('width', 100)
+    height = get('height', 20)
+    field_name = get('name', '')
     
     # Draw field border and label
     canvas_obj.rect(x, y, width, height)
@@ -117,34 +146,35 @@ def render_radio_field(canvas_obj, field_data, adjusted_y):
     canvas_obj.drawString(x + 2, y + height + 10, field_name)
     
     # Add radio form field
-    form = AcroForm(canvas_obj)
     form.radio(
         name=field_name,
-        value=field_data.get('value', 'Option'),
+        value=get('value', 'Option'),
         x=x + width/4,
         y=y + height/4,
-        buttonStyle=field_data.get('button_style', 'circle'),
-        borderColor=field_data.get('border_color', 'black'),
-        fillColor=field_data.get('fill_color', 'white'),
-        textColor=field_data.get('text_color', 'black'),
+        buttonStyle=get('button_style', 'circle'),
+        borderColor=get('border_color', 'black'),
+        fillColor=get('fill_color', 'white'),
+        textColor=get('text_color', 'black'),
         width=width/2,
         height=height/2
     )
 
-def render_signature_field(canvas_obj, field_data, adjusted_y):
+def render_signature_field(canvas_obj, form, field_data, adjusted_y):
     """
     Render a signature field on the PDF canvas
     
     Args:
         canvas_obj: ReportLab canvas object
+        form: AcroForm of the canvas, shared by every field on the page
         field_data: Dictionary with field properties
         adjusted_y: Y coordinate adjusted for PDF coordinate system
     """
-    x = field_data.get('x', 0)
+    get = field_data.get
+    x = get('x', 0)
     y = adjusted_y
-    width = field_data.get('width', 200)
-    height = field_data.get('height', 50)
-    field_name = field_data.get('name', '')
+    width = get('width', 200)
+    height = get('height', 50)
+    field_name = get('name', '')
     
     # Draw field border with dashed lines
     canvas_obj.setDash([3, 3])
@@ -160,7 +190,6 @@ def render_signature_field(canvas_obj, field_data, adjusted_y):
     canvas_obj.line(x + 10, line_y, x + width - 10, line_y)
     
     # Add signature text field
-    form = AcroForm(canvas_obj)
     form.textfield(
         name=field_name,
         x=x,
@@ -168,12 +197,178 @@ def render_signature_field(canvas_obj, field_data, adjusted_y):
         width=width,
         height=height,
         borderWidth=0,  # No border since we drew it custom
-        fillColor=field_data.get('fill_color', 'white'),
-        textColor=field_data.get('text_color', 'black'),
-        fontSize=field_data.get('font_size', 10),
+        fillColor=get('fill_color', 'white'),
+        textColor=get('text_color', 'black'),
+        fontSize=get('font_size', 10),
     )
 
 
+def _iter_terminal_fields(reader):
+    """
+    Yield (qualified_name, field, field_type, flags) for each terminal AcroForm
+    field of a pypdf reader
+
+    Walks /AcroForm/Fields once, naming fields the same way reader.get_fields()
+    does, and returns the field dictionaries themselves so callers don't have
+    to look each one up again. /FT and /Ff are resolved once per parent and
+    handed down to kids that inherit them.
+    """
+    root = reader.trailer["/Root"]
+    if "/AcroForm" not in root:
+        return
+    acro_form = root["/AcroForm"]
+    fields = acro_form["/Fields"] if "/Fields" in acro_form else []
+
+    stack = [(ref, None, None, 0) for ref in reversed(fields)]
+    while stack:
+        ref, parent_name, field_type, flags = stack.pop()
+        field = ref.get_object()
+        partial_name = field.get("/T")
+        if partial_name is None:
+            name = parent_name
+        elif parent_name is None:
+            name = str(partial_name)
+        else:
+            name = f"{parent_name}.{partial_name}"
+        field_type = field.get("/FT", field_type)
+        flags = field.get("/Ff", flags)
+
+        # Kids without /T are widgets of this field, not child fields
+        kids = field["/Kids"] if "/Kids" in field else []
+        kids = [kid for kid in kids if "/T" in kid.get_object()]
+        if kids:
+            stack.extend((kid, name, field_type, flags) for kid in reversed(kids))
+        elif name is not None:
+            yield name, field, field_type, flags
+
+
+def _iter_pdfrw_fields(fields, parent_name=None):
+    """Yield (qualified_name, field) for each terminal field in a pdfrw /Fields array"""
+    for field in fields or []:
+        name = field.T.decode() if field.T is not None else None
+        if parent_name and name:
+            name = f"{parent_name}.{name}"
+        elif parent_name:
+            name = parent_name
+
+        # Kids without /T are widgets of this field, not child fields
+        kids = [kid for kid in field.Kids or [] if kid.T is not None]
+        if kids:
+            yield from _iter_pdfrw_fields(kids, name)
+        elif name:
+            yield name, field
+
+
+def _fill_with_pdfrw(surface_pdf_path, form_data, output_path):
+    """
+    Fill AcroForm values with pdfrw, which copies the document without
+    rebuilding pypdf's object graph
+
+    Values are written to /V (and /AS for buttons) and viewers are asked to
+    regenerate appearances via /NeedAppearances.
+    """
+    template = pdfrw.PdfReader(surface_pdf_path)
+    acro_form = template.Root.AcroForm
+
+    if acro_form is not None and form_data:
+        for field_name, field in _iter_pdfrw_fields(acro_form.Fields):
+            if field_name not in form_data:
+                continue
+            field_value = form_data[field_name]
+
+            # /FT may be inherited from a parent field
+            field_type, parent = field.FT, field.Parent
+            while field_type is None and parent is not None:
+                field_type, parent = parent.FT, parent.Parent
+
+            if field_type == '/Btn':
+                # Checkbox or radio button
+                if isinstance(field_value, bool):
+                    field_value = "Yes" if field_value else "Off"
+                state = pdfrw.PdfName(str(field_value).lstrip('/'))
+                field.V = state
+                # Only the kid with an appearance for this state is switched
+                # on; its radio siblings are turned off
+                for widget in field.Kids or [field]:
+                    appearances = widget.AP.N if widget.AP is not None else None
+                    if isinstance(appearances, pdfrw.PdfDict) and appearances.stream is None \
+                            and state not in appearances:
+                        widget.AS = pdfrw.PdfName('Off')
+                    else:
+                        widget.AS = state
+            else:
+                # Text fields
+                field.V = pdfrw.PdfString.encode(str(field_value))
+                field.AP = None
+
+        acro_form.NeedAppearances = pdfrw.PdfObject('true')
+
+    with open(output_path, "wb", buffering=PDF_WRITE_BUFFER_SIZE) as output_file:
+        pdfrw.PdfWriter().write(output_file, template)
+    return output_path
+
+
+# Field renderers by field type; unknown types are skipped
+FIELD_RENDERERS = {
+    'text': render_text_field,
+    'checkbox': render_checkbox_field,
+    'radio': render_radio_field,
+    'signature': render_signature_field,
+}
+
+
+def render_page_overlay(page_fields, page_size):
+    """
+    Render one page's form fields onto a single-page overlay PDF
+    
+    Module-level so it can run in a worker process.
+    
+    Args:
+        page_fields: Field definitions for this page
+        page_size: (width, height) of the page in points
+        
+    Returns:
+        bytes: The overlay PDF
+    """
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=page_size)
+    
+    # Set up basic form field formatting
+    c.setFont("Helvetica", 10)
+    
+    # One AcroForm per overlay, shared by all of the page's fields
+    form = c.acroForm
+    
+    # PDF coordinates start from the bottom; the page height is the same for every field
+    page_height = page_size[1]
+    
+    # For each field on this page, add it
+    for field in page_fields:
+        field_type = field.get('type', 'text')
+        
+        # Adjust y-coordinate (PDF coordinates start from bottom)
+        adjusted_y = page_height - field.get('y', 0) - field.get('height', 20)
+        
+        # Use the appropriate field renderer based on type
+        renderer = FIELD_RENDERERS.get(field_type)
+        if renderer:
+            renderer(c, form, field, adjusted_y)
+    
+    c.save()
+    return buffer.getvalue()
+
+
+def _get_render_executor():
+    """Create the overlay rendering pool on first use and reuse it afterwards"""
+    global _render_executor
+    # Concurrent first requests must not each start a pool
+    with _render_executor_lock:
+        if _render_executor is None:
+            _render_executor = ProcessPoolExecutor(max_workers=SURFACE_RENDER_WORKERS)
+            atexit.register(_render_executor.shutdown, wait=False)
+        return _render_executor
+
+
 class SurfacePDFGenerator:
     """Generates blank surface PDFs with AcroForm fields"""
     
@@ -191,9 +386,8 @@ class SurfacePDFGenerator:
         self.filled_dir = filled_dir
         
         # Ensure directories exist
-        os.makedirs(self.upload_dir, exist_ok=True)
-        os.makedirs(self.created_dir, exist_ok=True)
-        os.makedirs(self.filled_dir, exist_ok=True)
+        for directory in (self.upload_dir, self.created_dir, self.filled_dir):
+            Path(directory).mkdir(parents=True, exist_ok=True)
         
         logging.debug(f"SurfacePDFGenerator initialized with: upload_dir={upload_dir}, "
                      f"created_dir={created_dir}, filled_dir={filled_dir}")
@@ -214,80 +408,57 @@ class SurfacePDFGenerator:
             output_filename = f"{uuid.uuid4()}.pdf"
             output_path = os.path.join(self.created_dir, output_filename)
         
-        logging.debug(f"Creating surface PDF at {output_path} from base {base_pdf_path}")
-        logging.debug(f"Adding {len(form_fields)} form fields")
+        logging.debug("Creating surface PDF at %s from base %s", output_path, base_pdf_path)
+        logging.debug("Adding %d form fields", len(form_fields))
         
         # Create PDF fields using reportlab for field creation
         try:
-            # First create a PDF with fields using reportlab
-            temp_file = BytesIO()
-            c = canvas.Canvas(temp_file, pagesize=letter)
+            # Parse the base PDF once; it drives the page loop and the merge
+            original_pdf = PdfReader(base_pdf_path)
+            page_count = len(original_pdf.pages)
             
-            # Set up basic form field formatting
-            c.setFont("Helvetica", 10)
+            # Group fields by page; pages without fields need no overlay
+            fields_by_page = {}
+            for field in form_fields:
+                page_num = field.get('page', 0)
+                if 0 <= page_num < page_count:
+                    fields_by_page.setdefault(page_num, []).append(field)
+            page_nums = sorted(fields_by_page)
+            page_fields = [fields_by_page[page_num] for page_num in page_nums]
             
-            # Get original PDF dimensions to match form fields correctly
-            with open(base_pdf_path, 'rb') as f:
-                reader = PdfReader(f)
-                
-                # For each page, create a new page in the output PDF
-                for page_num in range(len(reader.pages)):
-                    # Only add fields for the requested page
-                    page_fields = [f for f in form_fields if f.get('page', 0) == page_num]
-                    
-                    # If we have fields for this page, add them
-                    if page_num > 0:  # If not the first page, create a new page
-                        c.showPage()
-                    
-                    # For each field on this page, add it
-                    for field in page_fields:
-                        field_name = field.get('name', '')
-                        field_type = field.get('type', 'text')
-                        x = field.get('x', 0)
-                        y = field.get('y', 0)  # PDF coordinates are from bottom-left
-                        width = field.get('width', 100)
-                        height = field.get('height', 20)
-                        
-                        # Adjust y-coordinate (PDF coordinates start from bottom)
-                        page_height = 792  # Letter height in points
-                        adjusted_y = page_height - y - height
-                        
-                        # Use the appropriate field renderer based on type
-                        if field_type == 'text':
-                            render_text_field(c, field, adjusted_y)
-                        elif field_type == 'checkbox':
-                            render_checkbox_field(c, field, adjusted_y)
-                        elif field_type == 'radio':
-                            render_radio_field(c, field, adjusted_y)
-                        elif field_type == 'signature':
-                            render_signature_field(c, field, adjusted_y)
+            # Size each overlay to its base page so field coordinates line up
+            # on non-Letter documents
+            page_sizes = []
+            for page_num in page_nums:
+                mediabox = original_pdf.pages[page_num].mediabox
+                page_sizes.append((float(mediabox.width), float(mediabox.height)))
             
-            # Save the canvas with form fields
-            c.save()
+            # Pages render independently, so large forms are spread across
+            # worker processes; small ones aren't worth the pickling
+            if len(page_nums) >= SURFACE_RENDER_PARALLEL_MIN_PAGES:
+                overlays = list(_get_render_executor().map(render_page_overlay, page_fields, page_sizes))
+            else:
+                overlays = list(map(render_page_overlay, page_fields, page_sizes))
+            overlays = dict(zip(page_nums, overlays))
             
             # Now merge with original PDF
-            overlay_pdf = PdfReader(BytesIO(temp_file.getvalue()))
-            original_pdf = PdfReader(base_pdf_path)
             writer = PdfWriter()
             
-            # For each page, merge the original with our form field overlay
-            for i in range(len(original_pdf.pages)):
-                if i < len(overlay_pdf.pages):
-                    page = original_pdf.pages[i]
-                    page.merge_page(overlay_pdf.pages[i])
-                    writer.add_page(page)
-                else:
-                    writer.add_page(original_pdf.pages[i])
+            # For each page, merge the original with its form field overlay
+            for i, page in enumerate(original_pdf.pages):
+                if i in overlays:
+                    page.merge_page(PdfReader(BytesIO(overlays[i])).pages[0])
+                writer.add_page(page)
             
             # Save the merged PDF to the output path
-            with open(output_path, "wb") as output_file:
+            with open(output_path, "wb", buffering=PDF_WRITE_BUFFER_SIZE) as output_file:
                 writer.write(output_file)
             
-            logging.info(f"Surface PDF created successfully: {output_path}")
+            logging.info("Surface PDF created successfully: %s", output_path)
             return output_path
             
         except Exception as e:
-            logging.error(f"Error creating surface PDF: {str(e)}")
+            logging.error("Error creating surface PDF: %s", e)
             raise
     
     def fill_surface_pdf(self, surface_pdf_path, form_data, output_path=None):
@@ -309,51 +480,58 @@ class SurfacePDFGenerator:
         logging.debug(f"Filling surface PDF {surface_pdf_path} with data, output to {output_path}")
         
         try:
+            if pdfrw is not None:
+                _fill_with_pdfrw(surface_pdf_path, form_data, output_path)
+                logging.info(f"Form filled successfully: {output_path}")
+                return output_path
+            
             # Fill the form using PyPDF
             reader = PdfReader(surface_pdf_path)
             writer = PdfWriter()
             
-            # Get form fields from the PDF
-            form_fields = reader.get_fields()
+            # Map each field name to its field dictionary once, up front
+            form_fields = {
+                name: (field, field_type)
+                for name, field, field_type, _ in _iter_terminal_fields(reader)
+            }
             
             # Copy all pages
             for page_num, page in enumerate(reader.pages):
                 writer.add_page(page)
             
-            # Get the AcroForm from the source document
-            if "/AcroForm" in reader.trailer["/Root"]:
-                writer._root_object.update({
-                    NameObject("/AcroForm"): reader.trailer["/Root"]["/AcroForm"]
-                })
+            # Get the AcroForm from the source document; raw_get keeps the
+            # indirect reference so the writer copies the field tree once at
+            # write time instead of resolving it here
+            source_root = reader.trailer["/Root"]
+            if "/AcroForm" in source_root:
+                writer._root_object[NameObject("/AcroForm")] = source_root.raw_get("/AcroForm")
                 
                 # Fill form fields with data provided
                 if form_data:
                     for field_name, field_value in form_data.items():
-                        if field_name in form_fields:
-                            # Update the field value in the PDF
-                            field_key = list(form_fields[field_name].keys())[0]
-                            field_ref = form_fields[field_name][field_key]
-                            field = reader.get_object(field_ref)
-                            
-                            # Handle different field types appropriately
-                            if field.get("/FT") == "/Btn":
-                                # Checkbox or radio button
-                                if isinstance(field_value, bool):
-                                    # Convert boolean to proper checkbox value
-                                    field_value = "Yes" if field_value else "Off"
-                                field.update({
-                                    NameObject("/V"): NameObject(f"/{field_value}"),
-                                    NameObject("/AS"): NameObject(f"/{field_value}")
-                                })
-                            else:
-                                # Text fields
-                                field.update({
-                                    NameObject("/V"): create_string_object(str(field_value)),
-                                    NameObject("/AP"): None
-                                })
+                        if field_name not in form_fields:
+                            continue
+                        field, field_type = form_fields[field_name]
+                        
+                        # Handle different field types appropriately
+                        if field_type == "/Btn":
+                            # Checkbox or radio button
+                            if isinstance(field_value, bool):
+                                # Convert boolean to proper checkbox value
+                                field_value = "Yes" if field_value else "Off"
+                            field.update({
+                                NameObject("/V"): NameObject(f"/{field_value}"),
+                                NameObject("/AS"): NameObject(f"/{field_value}")
+                            })
+                        else:
+                            # Text fields
+                            field.update({
+                                NameObject("/V"): create_string_object(str(field_value)),
+                                NameObject("/AP"): None
+                            })
             
             # Write the output PDF
-            with open(output_path, "wb") as output_file:
+            with open(output_path, "wb", buffering=PDF_WRITE_BUFFER_SIZE) as output_file:
                 writer.write(output_file)
             
             logging.info(f"Form filled successfully: {output_path}")
@@ -373,118 +551,153 @@ class SurfacePDFGenerator:
         Returns:
             dict: Dictionary of PDF metadata
         """
-        metadata = {}
         try:
-            with open(pdf_path, 'rb') as f:
-                reader = PdfReader(f)
-                info = reader.metadata
-                
-                if info:
-                    for key in info:
-                        metadata[key] = info[key]
-                
-                # Add additional metadata
-                metadata['pages'] = len(reader.pages)
-                metadata['has_form'] = bool(reader.get_fields())
-                metadata['extracted_at'] = datetime.utcnow().isoformat()
-                
-                # Count field types
-                field_count = {
-                    'text': 0,
-                    'checkbox': 0,
-                    'radio': 0,
-                    'signature': 0,
-                    'other': 0
-                }
-                
-                # Get all form fields
-                fields = reader.get_fields()
-                if fields:
-                    for field_name, field_refs in fields.items():
-                        # Get the field object
-                        field_key = list(field_refs.keys())[0]
-                        field_ref = field_refs[field_key]
-                        field = reader.get_object(field_ref)
-                        
-                        # Determine field type
-                        if field.get("/FT") == "/Tx":  # Text
-                            field_count['text'] += 1
-                        elif field.get("/FT") == "/Btn":  # Button (checkbox or radio)
-                            if field.get("/Ff", 0) & (1 << 15):  # Radio button
-                                field_count['radio'] += 1
-                            else:  # Checkbox
-                                field_count['checkbox'] += 1
-                        else:
-                            field_count['other'] += 1
-                
-                metadata['field_count'] = field_count
-                metadata['total_fields'] = sum(field_count.values())
-                
-            return metadata
+            # Unchanged files are answered from the cache; mtime and size in
+            # the key make a rewritten file miss
+            st = os.stat(pdf_path)
+            return dict(_cached_pdf_metadata(self, pdf_path, st.st_mtime_ns, st.st_size))
         
         except Exception as e:
             logging.error(f"Error extracting PDF metadata: {str(e)}")
             return {'error': str(e)}
     
-    def validate_pdf_portfolio(self, portfolio_data):
+    def _read_pdf_metadata(self, pdf_path):
+        """
+        Parse a PDF file and build its metadata dictionary
+        
+        Args:
+            pdf_path: Path to the PDF file
+            
+        Returns:
+            dict: Dictionary of PDF metadata
+        """
+        metadata = {}
+        with open(pdf_path, 'rb') as f:
+            reader = PdfReader(f)
+            info = reader.metadata
+
+            if info:
+                for key in info:
+                    metadata[key] = info[key]
+
+            # Walk the form fields once for both has_form and the counts
+            fields = list(_iter_terminal_fields(reader))
+
+            # Add additional metadata
+            metadata['pages'] = len(reader.pages)
+            metadata['has_form'] = bool(fields)
+            metadata['extracted_at'] = datetime.utcnow().isoformat()
+
+            # Count field types
+            field_count = {
+                'text': 0,
+                'checkbox': 0,
+                'radio': 0,
+                'signature': 0,
+                'other': 0
+            }
+
+            for field_name, field, field_type, flags in fields:
+                # Determine field type
+                if field_type == "/Tx":  # Text
+                    field_count['text'] += 1
+                elif field_type == "/Btn":  # Button (checkbox or radio)
+                    if flags & (1 << 15):  # Radio button
+                        field_count['radio'] += 1
+                    else:  # Checkbox
+                        field_count['checkbox'] += 1
+                else:
+                    field_count['other'] += 1
+
+            metadata['field_count'] = field_count
+            metadata['total_fields'] = sum(field_count.values())
+        
+        return metadata
+    
+    def validate_pdf_portfolio(self, portfolio_data, fail_fast=False):
         """
         Validate PDF portfolio data structure
         
         Args:
             portfolio_data: Dictionary with portfolio data
+            fail_fast: Stop at the first error instead of collecting them all
             
         Returns:
             tuple: (valid, errors) where valid is a boolean and errors is a list of error messages
         """
-        errors = []
+        error_iter = _iter_portfolio_errors(portfolio_data)
+        if fail_fast:
+            first_error = next(error_iter, None)
+            if first_error is None:
+                return True, []
+            return False, [first_error]
         
-        # Check required fields
-        required_fields = ['surface_file_id', 'base_file_id', 'name']
-        for field in required_fields:
-            if field not in portfolio_data:
-                errors.append(f"Missing required field: {field}")
-                
-        # Validate file IDs exist
-        if 'surface_file_id' in portfolio_data and not isinstance(portfolio_data['surface_file_id'], int):
-            errors.append("surface_file_id must be an integer")
+        errors = list(error_iter)
+        return len(errors) == 0, errors
+
+
+def _iter_portfolio_errors(portfolio_data):
+    """Yield validate_pdf_portfolio's error messages one at a time."""
+    # Check required fields
+    for field in PORTFOLIO_REQUIRED_KEYS:
+        if field not in portfolio_data:
+            yield f"Missing required field: {field}"
             
-        if 'base_file_id' in portfolio_data and not isinstance(portfolio_data['base_file_id'], int):
-            errors.append("base_file_id must be an integer")
+    # Validate file IDs exist
+    if 'surface_file_id' in portfolio_data and not isinstance(portfolio_data['surface_file_id'], int):
+        yield "surface_file_id must be an integer"
         
-        # Check if fields array is valid
-        if 'fields' in portfolio_data:
-            if not isinstance(portfolio_data['fields'], list):
-                errors.append("fields must be a list")
-            else:
-                # Check each field has required properties
-                for i, field in enumerate(portfolio_data['fields']):
-                    if not isinstance(field, dict):
-                        errors.append(f"Field at index {i} must be an object")
-                        continue
-                        
-                    # Check required field properties
-                    if 'name' not in field:
-                        errors.append(f"Field at index {i} missing required property: name")
-                        
-                    if 'type' not in field:
-                        errors.append(f"Field at index {i} missing required property: type")
-                    elif field['type'] not in ['text', 'checkbox', 'radio', 'signature']:
-                        errors.append(f"Field at index {i} has invalid type: {field['type']}")
-                        
-                    # Check coordinates
-                    for coord in ['x', 'y', 'width', 'height']:
-                        if coord not in field:
-                            errors.append(f"Field '{field.get('name', f'at index {i}')}' missing required property: {coord}")
-                        elif not isinstance(field[coord], (int, float)):
-                            errors.append(f"Field '{field.get('name', f'at index {i}')}' {coord} must be a number")
+    if 'base_file_id' in portfolio_data and not isinstance(portfolio_data['base_file_id'], int):
+        yield "base_file_id must be an integer"
+    
+    # Check if fields array is valid
+    if 'fields' in portfolio_data:
+        if not isinstance(portfolio_data['fields'], list):
+            yield "fields must be a list"
+        else:
+            # Check each field has required properties
+            for i, field in enumerate(portfolio_data['fields']):
+                if not isinstance(field, dict):
+                    yield f"Field at index {i} must be an object"
+                    continue
+                
+                # A field with every property present and well-typed needs
+                # no further checks; only bad fields build error messages
+                if (FIELD_REQUIRED_KEYS <= field.keys()
+                        and field['type'] in FIELD_TYPES
+                        and all(isinstance(field[coord], (int, float)) for coord in FIELD_COORDS)
+                        and isinstance(field['page'], int) and field['page'] >= 0):
+                    continue
                     
-                    # Check page number
-                    if 'page' not in field:
-                        errors.append(f"Field '{field.get('name', f'at index {i}')}' missing required property: page")
-                    elif not isinstance(field['page'], int) or field['page'] < 0:
-                        errors.append(f"Field '{field.get('name', f'at index {i}')}' page must be a non-negative integer")
-        
-        return len(errors) == 0, errors
+                # Check required field properties
+                if 'name' not in field:
+                    yield f"Field at index {i} missing required property: name"
+                    
+                if 'type' not in field:
+                    yield f"Field at index {i} missing required property: type"
+                elif field['type'] not in FIELD_TYPES:
+                    yield f"Field at index {i} has invalid type: {field['type']}"
+                
+                label = field.get('name', f'at index {i}')
+                    
+                # Check coordinates
+                for coord in FIELD_COORDS:
+                    if coord not in field:
+                        yield f"Field '{label}' missing required property: {coord}"
+                    elif not isinstance(field[coord], (int, float)):
+                        yield f"Field '{label}' {coord} must be a number"
+                
+                # Check page number
+                if 'page' not in field:
+                    yield f"Field '{label}' missing required property: page"
+                elif not isinstance(field['page'], int) or field['page'] < 0:
+                    yield f"Field '{label}' page must be a non-negative integer"
+
+
+@lru_cache(maxsize=1024)
+def _cached_pdf_metadata(generator, pdf_path, mtime_ns, size):
+    """Parse a PDF's metadata once per (path, mtime, size)."""
+    return generator._read_pdf_metadata(pdf_path)
 
 
 # Instantiate a global generator for use throughout the application
@@ -8,19 +8,26 @@ DB_PATH = os.path.join('instance', 'files.db')
 def add_column_to_created_files():
     """Add original_file_id column to created_files table if it doesn't exist"""
     try:
-        # Connect to the database
-        conn = sqlite3.connect(DB_PATH)
+        # Connect in autocommit mode so the migration controls its own transaction
+        conn = sqlite3.connect(DB_PATH, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
         cursor = conn.cursor()
         
         # Check if the column already exists
         cursor.execute("PRAGMA table_info(created_files)")
-        columns = cursor.fetchall()
-        column_names = [col[1] for col in columns]
+        column_names = {col[1] for col in cursor.fetchall()}
         
         if 'original_file_id' not in column_names:
             print("Adding original_file_id column to created_files table...")
-            cursor.execute("ALTER TABLE created_files ADD COLUMN original_file_id INTEGER")
-            conn.commit()
+            cursor.execute("BEGIN")
+            try:
+                cursor.execute("ALTER TABLE created_files ADD COLUMN original_file_id INTEGER")
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                conn.close()
+                raise
             print("Column added successfully!")
         else:
             print("Column original_file_id already exists in created_files table.")
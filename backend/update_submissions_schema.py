@@ -8,14 +8,15 @@ DB_PATH = os.path.join('instance', 'files.db')
 def update_submissions_table():
     """Add portfolio_id, filled_file_id, form_data, form_metadata, submitted_at, and status columns to submissions table"""
     try:
-        # Connect to the database
-        conn = sqlite3.connect(DB_PATH)
+        # Connect in autocommit mode so the migration controls its own transaction
+        conn = sqlite3.connect(DB_PATH, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
         cursor = conn.cursor()
         
         # Check if the submissions table has the expected structure from SQLAlchemy model
         cursor.execute("PRAGMA table_info(submissions)")
-        columns = cursor.fetchall()
-        column_names = [col[1] for col in columns]
+        column_names = {col[1] for col in cursor.fetchall()}
         
         columns_to_add = {
             'portfolio_id': 'INTEGER',
@@ -26,49 +27,71 @@ def update_submissions_table():
             'status': 'VARCHAR(20)'
         }
         
-        for col_name, col_type in columns_to_add.items():
-            if col_name not in column_names:
-                print(f"Adding {col_name} column to submissions table...")
-                cursor.execute(f"ALTER TABLE submissions ADD COLUMN {col_name} {col_type}")
-                print(f"Column {col_name} added successfully!")
-            else:
-                print(f"Column {col_name} already exists in submissions table.")
-        
-        # Remove form_id constraint if it exists (since we're moving to portfolio_id)
+        # Bulk-copy settings for the table rebuild: keep temp b-trees in
+        # memory, give the copy a large page cache, and hold off WAL
+        # checkpoints until the copy is committed
         if 'form_id' in column_names:
-            # SQLite doesn't support dropping columns directly, so we need to recreate the table
-            print("Migrating submissions table to new schema...")
-            
-            # Create new table with desired schema
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS submissions_new (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    portfolio_id INTEGER,
-                    filled_file_id INTEGER,
-                    form_data TEXT,
-                    form_metadata TEXT,
-                    submitted_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    user_email VARCHAR(255),
-                    status VARCHAR(20) DEFAULT 'submitted'
-                )
-            """)
+            cursor.execute("PRAGMA wal_autocheckpoint")
+            wal_autocheckpoint = cursor.fetchone()[0]
+            cursor.execute("PRAGMA temp_store=MEMORY")
+            cursor.execute("PRAGMA cache_size=-200000")
+            cursor.execute("PRAGMA wal_autocheckpoint=0")
+        
+        # Run every change in one transaction: one sync at COMMIT, and a
+        # failure part-way leaves the table untouched. IMMEDIATE takes the
+        # write lock up front so the app can't interleave writes mid-copy
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            for col_name, col_type in columns_to_add.items():
+                if col_name not in column_names:
+                    print(f"Adding {col_name} column to submissions table...")
+                    cursor.execute(f"ALTER TABLE submissions ADD COLUMN {col_name} {col_type}")
+                    print(f"Column {col_name} added successfully!")
+                else:
+                    print(f"Column {col_name} already exists in submissions table.")
             
-            # Copy data from old table to new, mapping columns appropriately
-            try:
+            # Remove form_id constraint if it exists (since we're moving to portfolio_id)
+            if 'form_id' in column_names:
+                # SQLite doesn't support dropping columns directly, so we need to recreate the table
+                print("Migrating submissions table to new schema...")
+                
+                # Create new table with desired schema
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS submissions_new (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        portfolio_id INTEGER,
+                        filled_file_id INTEGER,
+                        form_data TEXT,
+                        form_metadata TEXT,
+                        submitted_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        user_email VARCHAR(255),
+                        status VARCHAR(20) DEFAULT 'submitted'
+                    )
+                """)
+                
+                # Copy data from old table to new, mapping columns appropriately;
+                # a failed copy rolls back instead of dropping the old rows
                 cursor.execute("""
                     INSERT INTO submissions_new (id, user_email, form_data)
                     SELECT id, user_email, data FROM submissions
                 """)
                 print("Data migrated successfully!")
-            except Exception as e:
-                print(f"Error migrating data: {e}")
+                
+                # Drop old table and rename new one
+                cursor.execute("DROP TABLE submissions")
+                cursor.execute("ALTER TABLE submissions_new RENAME TO submissions")
+                print("Table structure updated successfully!")
             
-            # Drop old table and rename new one
-            cursor.execute("DROP TABLE submissions")
-            cursor.execute("ALTER TABLE submissions_new RENAME TO submissions")
-            print("Table structure updated successfully!")
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            conn.close()
+            raise
+        
+        if 'form_id' in column_names:
+            cursor.execute(f"PRAGMA wal_autocheckpoint={int(wal_autocheckpoint)}")
+            cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
         
-        conn.commit()
         conn.close()
         return True
     except Exception as e:
@@ -7,35 +7,64 @@ It includes conversion from DOCX to PDF and file validation.
 
 import os
 import uuid
+import atexit
 import logging
+import platform
+import threading
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
 from werkzeug.utils import secure_filename
 from datetime import datetime
-import pythoncom
-from docx2pdf import convert as docx2pdf_convert
 from pypdf import PdfReader
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# Number of conversion worker processes kept warm between uploads
+DOCX_CONVERT_WORKERS = int(os.environ.get('DOCX_CONVERT_WORKERS', 2))
+# Seconds to wait for a single conversion before giving up
+DOCX_CONVERT_TIMEOUT = int(os.environ.get('DOCX_CONVERT_TIMEOUT', 120))
+
+_convert_executor = None
+_convert_executor_lock = threading.Lock()
 
 # PDF Validation
-def is_valid_pdf(file_path):
+# Bytes read from the end of the file when looking for the %%EOF marker
+PDF_TAIL_BYTES = 1024
+
+def is_valid_pdf(file_path, deep=False):
     """
-    Check if a file is a valid PDF by attempting to open it with PdfReader.
+    Check if a file is a valid PDF.
+    
+    By default only the %PDF- header and a trailing %%EOF marker are checked,
+    which costs two small reads. With deep=True the file is opened with
+    PdfReader and its page tree parsed.
     
     Args:
         file_path (str): Path to the PDF file
+        deep (bool): Parse the whole document instead of probing its markers
         
     Returns:
         bool: True if the file is a valid PDF, False otherwise
     """
     try:
         with open(file_path, 'rb') as f:
-            reader = PdfReader(f)
-            # Access a property to ensure it's readable
-            num_pages = len(reader.pages)
+            if deep:
+                reader = PdfReader(f)
+                # Access a property to ensure it's readable
+                num_pages = len(reader.pages)
+                return True
+            
+            if f.read(5) != b'%PDF-':
+                logger.error("Invalid PDF file: missing %%PDF- header in %s", file_path)
+                return False
+            size = f.seek(0, os.SEEK_END)
+            f.seek(max(size - PDF_TAIL_BYTES, 0))
+            if b'%%EOF' not in f.read():
+                logger.error("Invalid PDF file: missing %%%%EOF marker in %s", file_path)
+                return False
             return True
     except Exception as e:
-        logging.error(f"Invalid PDF file: {str(e)}")
+        logger.error("Invalid PDF file: %s", e)
         return False
 
 # File Upload
@@ -65,15 +94,81 @@ def save_uploaded_file(file, upload_folder):
     
     # Save the uploaded file
     file.save(file_path)
-    logging.debug(f"File saved to: {file_path}")
+    logger.debug("File saved to: %s", file_path)
     
     return file_path, unique_filename, file_ext
 
 # DOCX to PDF Conversion
+def _init_convert_worker():
+    """Per-process setup: initialize COM once so docx2pdf can drive Word."""
+    if platform.system() == 'Windows':
+        import pythoncom
+        pythoncom.CoInitialize()
+        atexit.register(pythoncom.CoUninitialize)
+
+def _convert_in_worker(docx_path, pdf_path):
+    """Platform-specific conversion; runs inside a worker process."""
+    if platform.system() in ('Windows', 'Darwin'):
+        from docx2pdf import convert as docx2pdf_convert
+        docx2pdf_convert(docx_path, pdf_path)
+    else:
+        subprocess.run([
+            'soffice', '--headless', '--convert-to', 'pdf',
+            '--outdir', os.path.dirname(pdf_path),
+            docx_path
+        ], check=True, capture_output=True)
+        generated_pdf = os.path.join(
+            os.path.dirname(pdf_path),
+            os.path.splitext(os.path.basename(docx_path))[0] + '.pdf'
+        )
+        if generated_pdf != pdf_path:
+            os.replace(generated_pdf, pdf_path)
+    return pdf_path
+
+def _get_convert_executor():
+    """Create the conversion worker pool on first use, or again after a reset."""
+    global _convert_executor
+    with _convert_executor_lock:
+        if _convert_executor is None:
+            _convert_executor = ProcessPoolExecutor(
+                max_workers=DOCX_CONVERT_WORKERS,
+                initializer=_init_convert_worker
+            )
+        return _convert_executor
+
+def _reset_convert_executor(executor):
+    """
+    Replace a pool whose worker is stuck in a conversion.
+    
+    The next conversion gets a fresh pool; conversions still queued on the
+    old one fail rather than wait behind the hung worker.
+    """
+    global _convert_executor
+    with _convert_executor_lock:
+        if _convert_executor is executor:
+            _convert_executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+    # A hung Word or LibreOffice never returns on its own
+    if hasattr(executor, 'terminate_workers'):
+        executor.terminate_workers()
+    else:
+        for process in list((executor._processes or {}).values()):
+            process.terminate()
+
+def _shutdown_convert_executor():
+    with _convert_executor_lock:
+        if _convert_executor is not None:
+            _convert_executor.shutdown(wait=False)
+
+atexit.register(_shutdown_convert_executor)
+
 def convert_docx_to_pdf(docx_path, output_folder=None):
     """
     Convert a DOCX file to PDF.
     
+    Conversions run in a pool of long-lived worker processes, so COM is
+    initialized once per worker rather than once per upload.
+    
     Args:
         docx_path (str): Path to the DOCX file
         output_folder (str, optional): Folder to save the PDF. If None,
@@ -83,9 +178,6 @@ def convert_docx_to_pdf(docx_path, output_folder=None):
         str: Path to the generated PDF file, or None if conversion failed
     """
     try:
-        # Initialize COM for docx2pdf (required for Windows)
-        pythoncom.CoInitialize()
-        
         # Generate PDF path
         if output_folder is None:
             output_folder = os.path.dirname(docx_path)
@@ -95,21 +187,31 @@ def convert_docx_to_pdf(docx_path, output_folder=None):
         pdf_path = os.path.join(output_folder, f"{file_name}.pdf")
         
         # Convert DOCX to PDF
-        logging.debug(f"Converting DOCX to PDF: {docx_path} -> {pdf_path}")
-        docx2pdf_convert(docx_path, pdf_path)
+        logger.debug("Converting DOCX to PDF: %s -> %s", docx_path, pdf_path)
+        executor = _get_convert_executor()
+        future = executor.submit(_convert_in_worker, docx_path, pdf_path)
+        try:
+            future.result(timeout=DOCX_CONVERT_TIMEOUT)
+        except TimeoutError:
+            # Still queued: just drop it. Running: the worker is hung, so replace the pool
+            if not future.cancel():
+                logger.error("DOCX conversion of %s timed out; restarting the conversion pool", docx_path)
+                _reset_convert_executor(executor)
+            raise
         
-        # Verify the PDF was created and is valid
+        # Verify the PDF was created and is valid; the converter just wrote
+        # it, so the header/trailer probe is enough
         if os.path.exists(pdf_path) and is_valid_pdf(pdf_path):
-            logging.debug("DOCX to PDF conversion successful")
+            logger.debug("DOCX to PDF conversion successful")
             return pdf_path
         else:
-            logging.error("PDF conversion completed but resulted in invalid PDF")
+            logger.error("PDF conversion completed but resulted in invalid PDF")
             return None
             
     except Exception as e:
-        logging.error(f"Error during DOCX to PDF conversion: {str(e)}")
+        logger.error("Error during DOCX to PDF conversion: %s", e)
         import traceback
-        logging.error(traceback.format_exc())
+        logger.error(traceback.format_exc())
         return None
 
 # Get PDF Metadata
@@ -141,5 +243,5 @@ def get_pdf_metadata(pdf_path):
                 'is_valid': True
             }
     except Exception as e:
-        logging.error(f"Error reading PDF metadata: {str(e)}")
+        logger.error("Error reading PDF metadata: %s", e)
         return None
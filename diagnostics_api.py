@@ -2,19 +2,45 @@
 API routes for system diagnostics
 """
 import os
-import json
+import sys
+import time
+import queue
+import platform
 import traceback
-from flask import Blueprint, request, jsonify, current_app, session
+from uuid import uuid4
+from datetime import datetime
+from flask import Blueprint, request, jsonify, current_app, g
 from functools import wraps
+from sqlalchemy import select, func, text
+from error_logging_api import enqueue_log_event
 
 # Create a Blueprint for diagnostics API
 diagnostics_api = Blueprint('diagnostics', __name__, url_prefix='/api/diagnostics')
 
+# Models and db from the application module, bound at registration because
+# app.py imports this module while it is still loading
+db = None
+File = None
+CreatedFile = None
+PDFPortfolio = None
+Submission = None
+
+@diagnostics_api.record_once
+def _bind_app_models(state):
+    """Bind the models of the application registering this blueprint"""
+    global db, File, CreatedFile, PDFPortfolio, Submission
+    app_module = sys.modules[state.app.import_name]
+    db = app_module.db
+    File = app_module.File
+    CreatedFile = app_module.CreatedFile
+    PDFPortfolio = app_module.PDFPortfolio
+    Submission = app_module.Submission
+
 def require_login(f):
     """Ensure user is logged in"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'user_email' not in session:
+        if not g.user_email:
             return jsonify({
                 'success': False,
                 'error': 'Authentication required'
@@ -27,7 +53,7 @@ def require_login(f):
 def report_diagnostics():
     """Save diagnostic information"""
     try:
-        data = request.json
+        data = request.get_json(silent=True)
         if not data:
             return jsonify({
                 'success': False,
@@ -35,27 +61,28 @@ def report_diagnostics():
             }), 400
         
         # Generate a reference ID for this report
-        from uuid import uuid4
         reference_id = str(uuid4())
         
         # Add metadata
         data['metadata'] = {
-            'user_email': session.get('user_email', 'unknown'),
-            'timestamp': str(current_app.datetime.utcnow()),
+            'user_email': g.user_email or 'unknown',
+            'timestamp': time.time(),
             'reference_id': reference_id,
             'remote_ip': request.remote_addr,
-            'user_agent': request.user_agent.string
+            'user_agent': request.headers.get('User-Agent', '')
         }
         
-        # Save to diagnostics file
-        diagnostics_dir = os.path.join(current_app.root_path, 'logs', 'diagnostics')
-        os.makedirs(diagnostics_dir, exist_ok=True)
-        
-        diagnostics_file = os.path.join(diagnostics_dir, f"{reference_id}.json")
-        with open(diagnostics_file, 'w') as f:
-            json.dump(data, f, indent=2)
+        # Store in the diagnostics database through the background writer
+        try:
+            enqueue_log_event('diagnostics', reference_id, data['metadata']['user_email'], data)
+        except queue.Full:
+            current_app.logger.error(f"Diagnostics log queue full, dropping report {reference_id}")
+            return jsonify({
+                'success': False,
+                'error': 'Diagnostics queue is full, try again later'
+            }), 503
             
-        current_app.logger.info(f"Diagnostic report saved: {reference_id}")
+        current_app.logger.info(f"Diagnostic report queued: {reference_id}")
         
         return jsonify({
             'success': True,
@@ -71,40 +98,28 @@ def report_diagnostics():
             'error': str(e)
         }), 500
 
+# Connection check for system-info, built once
+_PING = text("SELECT 1")
+
 @diagnostics_api.route('/system-info', methods=['GET'])
 @require_login
 def get_system_info():
     """Get basic system information"""
     try:
-        from app import db
-        
-        # Import system modules
-        import platform
-        import sys
-        from datetime import datetime
-        
         # Check database connection
         db_status = "ok"
         try:
-            db.session.execute("SELECT 1")
+            db.session.execute(_PING).scalar()
         except Exception as e:
             db_status = f"error: {str(e)}"
         
-        # Get uploaded files count
-        from app import File
-        files_count = File.query.count()
-        
-        # Get created files count
-        from app import CreatedFile
-        created_files_count = CreatedFile.query.count()
-        
-        # Get portfolios count
-        from app import PDFPortfolio
-        portfolios_count = PDFPortfolio.query.count()
-        
-        # Get submissions count
-        from app import Submission
-        submissions_count = Submission.query.count()
+        # Get all four table counts in one round trip
+        counts = db.session.execute(select(
+            select(func.count(File.id)).scalar_subquery().label('files'),
+            select(func.count(CreatedFile.id)).scalar_subquery().label('created_files'),
+            select(func.count(PDFPortfolio.id)).scalar_subquery().label('portfolios'),
+            select(func.count(Submission.id)).scalar_subquery().label('submissions')
+        )).one()
         
         # System information
         system_info = {
@@ -113,12 +128,8 @@ def get_system_info():
             'platform': platform.platform(),
             'database': {
                 'status': db_status,
-                'counts': {
-                    'files': files_count,
-                    'created_files': created_files_count,
-                    'portfolios': portfolios_count,
-                    'submissions': submissions_count
-                }
+                'pool': db.engine.pool.status(),
+                'counts': dict(counts._mapping)
             },
             'app_info': {
                 'debug_mode': current_app.debug,
@@ -145,8 +156,6 @@ def get_system_info():
 def test_portfolio(portfolio_id):
     """Test portfolio API and access"""
     try:
-        from app import PDFPortfolio, File, CreatedFile
-        
         results = {
             'portfolio_found': False,
             'base_file_found': False,
@@ -157,7 +166,7 @@ def test_portfolio(portfolio_id):
         }
         
         # Get portfolio
-        portfolio = PDFPortfolio.query.get(portfolio_id)
+        portfolio = db.session.get(PDFPortfolio, portfolio_id)
         if not portfolio:
             return jsonify({
                 'success': False,
@@ -167,7 +176,7 @@ def test_portfolio(portfolio_id):
         
         results['portfolio_found'] = True
         results['portfolio_user'] = portfolio.user_email
-        results['permissions_valid'] = portfolio.user_email == session.get('user_email')
+        results['permissions_valid'] = portfolio.user_email == g.user_email
         
         # Check if user is authorized
         if not results['permissions_valid']:
@@ -178,14 +187,14 @@ def test_portfolio(portfolio_id):
             }), 403
         
         # Get base file
-        base_file = File.query.get(portfolio.base_file_id)
+        base_file = db.session.get(File, portfolio.base_file_id)
         if base_file:
             results['base_file_found'] = True
             results['base_file_path'] = base_file.file_path
             results['base_file_exists'] = os.path.exists(base_file.file_path)
         
         # Get surface file
-        surface_file = CreatedFile.query.get(portfolio.surface_file_id) if portfolio.surface_file_id else None
+        surface_file = db.session.get(CreatedFile, portfolio.surface_file_id) if portfolio.surface_file_id else None
         if surface_file:
             results['surface_file_found'] = True
             results['surface_file_path'] = surface_file.file_path
@@ -197,7 +206,6 @@ def test_portfolio(portfolio_id):
         results['portfolio_updated'] = str(portfolio.updated_at)
         
         # Get submissions
-        from app import Submission
         submissions = Submission.query.filter_by(portfolio_id=portfolio_id).count()
         results['submission_count'] = submissions
         
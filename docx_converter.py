@@ -0,0 +1,135 @@
+"""
+DOCX to PDF Conversion
+
+This module runs DOCX to PDF conversion in a small pool of worker processes:
+1. Each worker initializes COM once (Windows) instead of once per upload
+2. Slow Word / LibreOffice conversions don't tie up the web process
+3. The pool is created lazily on first use and reused for the app's lifetime
+
+It is kept separate from app.py so worker processes only import what they need.
+"""
+
+import os
+import atexit
+import logging
+import platform
+import threading
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+# Number of conversion worker processes
+DOCX_CONVERT_WORKERS = int(os.environ.get('DOCX_CONVERT_WORKERS', 2))
+# Seconds to wait for a single conversion before giving up
+DOCX_CONVERT_TIMEOUT = int(os.environ.get('DOCX_CONVERT_TIMEOUT', 120))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _init_worker():
+    """Per-process setup: initialize COM once so docx2pdf can drive Word."""
+    if platform.system() == 'Windows':
+        import pythoncom
+        pythoncom.CoInitialize()
+        atexit.register(pythoncom.CoUninitialize)
+
+
+def _convert_with_libreoffice(docx_path, pdf_path):
+    """Convert with headless LibreOffice and move the result to pdf_path."""
+    subprocess.run([
+        'soffice', '--headless', '--convert-to', 'pdf',
+        '--outdir', os.path.dirname(pdf_path),
+        docx_path
+    ], check=True)
+    # Rename if needed
+    generated_pdf = os.path.splitext(docx_path)[0] + '.pdf'
+    if os.path.exists(generated_pdf) and generated_pdf != pdf_path:
+        os.rename(generated_pdf, pdf_path)
+
+
+def _convert(docx_path, pdf_path):
+    """Platform-specific conversion; runs inside a worker process."""
+    system = platform.system()
+    if system == 'Windows':
+        from docx2pdf import convert
+        convert(docx_path, pdf_path)
+    elif system == 'Darwin':  # macOS
+        # Try docx2pdf (which uses AppleScript if Word is installed)
+        try:
+            from docx2pdf import convert
+            convert(docx_path, pdf_path)
+        except Exception as mac_err:
+            logging.error(f"Native docx2pdf failed on macOS: {str(mac_err)}")
+            # Fall back to LibreOffice if available
+            try:
+                _convert_with_libreoffice(docx_path, pdf_path)
+            except subprocess.SubprocessError as libre_err:
+                raise Exception(f"LibreOffice conversion failed: {str(libre_err)}")
+    else:  # Linux or other
+        _convert_with_libreoffice(docx_path, pdf_path)
+    return pdf_path
+
+
+def _get_executor():
+    """Create the conversion pool on first use, or again after a reset."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=DOCX_CONVERT_WORKERS, initializer=_init_worker)
+        return _executor
+
+
+def _reset_executor(executor):
+    """
+    Replace a pool whose worker is stuck in a conversion.
+
+    The next conversion gets a fresh pool; conversions still queued on the
+    old one fail rather than wait behind the hung worker.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+    # A hung Word or LibreOffice never returns on its own
+    if hasattr(executor, 'terminate_workers'):
+        executor.terminate_workers()
+    else:
+        for process in list((executor._processes or {}).values()):
+            process.terminate()
+
+
+def _shutdown_executor():
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+
+
+atexit.register(_shutdown_executor)
+
+
+def convert_docx_to_pdf(docx_path, pdf_path, timeout=DOCX_CONVERT_TIMEOUT):
+    """
+    Convert a DOCX file to PDF using the shared worker pool.
+
+    Args:
+        docx_path: Path to the source DOCX file
+        pdf_path: Path where the PDF should be written
+        timeout: Seconds to wait for the conversion
+
+    Returns:
+        Path to the generated PDF
+
+    Raises:
+        Exception: If the conversion fails or times out
+    """
+    executor = _get_executor()
+    future = executor.submit(_convert, docx_path, pdf_path)
+    try:
+        return future.result(timeout=timeout)
+    except TimeoutError:
+        # Still queued: just drop it. Running: the worker is hung, so replace the pool
+        if not future.cancel():
+            logging.error(f"DOCX conversion of {docx_path} timed out; restarting the conversion pool")
+            _reset_executor(executor)
+        raise
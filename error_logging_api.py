@@ -3,20 +3,179 @@ API routes for error logging
 """
 import os
 import json
+import time
 import uuid
-import datetime
+import queue
+import atexit
+import logging
+import sqlite3
+import threading
 import traceback
-from flask import Blueprint, request, jsonify, current_app, session
+from functools import lru_cache
+from flask import Blueprint, request, jsonify, current_app, g
+# orjson is optional; stdlib json is used when it isn't installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Create a Blueprint for error logging API
 error_logging_api = Blueprint('error_logging', __name__, url_prefix='/api')
 
-def ensure_log_directory():
-    """Ensure the log directory exists"""
-    log_dir = os.path.join(current_app.root_path, 'logs')
-    if not os.path.exists(log_dir):
-        os.makedirs(log_dir)
-    return log_dir
+# Log events waiting to be written; bounded so an error storm
+# can't grow memory without limit
+LOG_QUEUE_SIZE = 10000
+# Events inserted per transaction; a partial batch is written after LOG_FLUSH_INTERVAL seconds
+LOG_WRITE_BATCH = 100
+LOG_FLUSH_INTERVAL = 5.0
+_log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+
+# Client errors and diagnostic reports share one SQLite database under logs/
+LOG_DB_NAME = 'diagnostics.db'
+_LOG_DB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (id TEXT PRIMARY KEY, ts REAL, user TEXT, kind TEXT, data BLOB);
+CREATE INDEX IF NOT EXISTS ix_events_ts ON events(ts);
+CREATE INDEX IF NOT EXISTS ix_events_user ON events(user);
+"""
+
+def enqueue_log_event(kind, event_id, user_email, data):
+    """
+    Queue an event for the diagnostics database
+    
+    Args:
+        kind: Event kind, e.g. 'client_error' or 'diagnostics'
+        event_id: Unique ID returned to the client
+        user_email: User the event belongs to
+        data: JSON-serializable dict stored with the event
+        
+    Raises:
+        queue.Full: If the writer has fallen too far behind
+    """
+    _ensure_log_writer()
+    _log_queue.put_nowait((event_id, time.time(), user_email, kind, data))
+
+def _open_log_db(db_path):
+    """Open the diagnostics database in WAL mode and create its table if needed"""
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_LOG_DB_SCHEMA)
+    return conn
+
+# Compact JSON bytes for the events table's data column
+if orjson is not None:
+    def _encode_event(data):
+        # json.dumps turns non-string keys into strings; orjson needs the option
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+else:
+    def _encode_event(data):
+        return json.dumps(data, separators=(',', ':')).encode()
+
+def _insert_events(conn, batch):
+    """Insert a batch of queued events in one transaction"""
+    rows = [
+        (event_id, ts, user_email, kind, _encode_event(data))
+        for event_id, ts, user_email, kind, data in batch
+    ]
+    try:
+        with conn:
+            conn.executemany("INSERT INTO events VALUES (?, ?, ?, ?, ?)", rows)
+    except Exception as e:
+        logging.error(f"Error writing {len(rows)} log events: {str(e)}")
+
+def _log_events_without_db(batch):
+    """Send events to the application log when the database can't be opened"""
+    for event_id, ts, user_email, kind, data in batch:
+        logging.error(f"Unstored {kind} event {event_id} for {user_email}: {_encode_event(data).decode()}")
+
+def _write_queued_logs(db_path):
+    """Insert queued events off the request path; the connection stays on this thread"""
+    try:
+        conn = _open_log_db(db_path)
+    except Exception as e:
+        # Keep draining so the queue never fills up behind a broken database
+        logging.error(f"Error opening log database {db_path}: {str(e)}")
+        conn = None
+
+    try:
+        while True:
+            item = _log_queue.get()
+            batch = []
+            deadline = time.monotonic() + LOG_FLUSH_INTERVAL
+            # Collect until the batch is full, the interval is up or the stop marker arrives
+            while item is not None:
+                batch.append(item)
+                if len(batch) >= LOG_WRITE_BATCH:
+                    break
+                try:
+                    item = _log_queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+
+            if batch:
+                if conn is not None:
+                    _insert_events(conn, batch)
+                else:
+                    _log_events_without_db(batch)
+            if item is None:
+                return
+    finally:
+        if conn is not None:
+            conn.close()
+
+_log_db_path = None
+_log_writer = None
+_log_writer_lock = threading.Lock()
+_log_writer_atexit = False
+
+def _ensure_log_writer():
+    """
+    Start the writer thread in this process if it isn't running
+    
+    Workers forked from a preloaded app inherit no running threads, and a
+    writer that died must not leave the queue to fill up, so this runs on
+    every enqueue rather than once at registration.
+    """
+    global _log_writer, _log_writer_atexit
+    if _log_writer is not None and _log_writer.is_alive():
+        return
+    with _log_writer_lock:
+        if _log_writer is not None and _log_writer.is_alive():
+            return
+        if _log_db_path is None:
+            raise RuntimeError("error_logging_api blueprint is not registered")
+        _log_writer = threading.Thread(target=_write_queued_logs, args=(_log_db_path,),
+                                       name='log-event-writer', daemon=True)
+        _log_writer.start()
+        if not _log_writer_atexit:
+            atexit.register(_stop_log_writer)
+            _log_writer_atexit = True
+
+def _stop_log_writer():
+    """Write out the events still queued before the interpreter exits"""
+    if _log_writer is None or not _log_writer.is_alive():
+        return
+    try:
+        _log_queue.put(None, timeout=LOG_FLUSH_INTERVAL)
+    except queue.Full:
+        # The writer is stuck; don't hold up shutdown waiting for it
+        return
+    _log_writer.join(timeout=LOG_FLUSH_INTERVAL)
+
+@error_logging_api.record_once
+def _configure_log_writer(state):
+    """Create the log directory when the blueprint is registered; the writer starts on first use"""
+    global _log_db_path
+    _log_db_path = os.path.join(ensure_dir(os.path.join(state.app.root_path, 'logs')), LOG_DB_NAME)
+
+@lru_cache(maxsize=None)
+def ensure_dir(path):
+    """Create path on first use only; later calls skip the makedirs stat"""
+    os.makedirs(path, exist_ok=True)
+    return path
+
+# Keys whose values are never written to the error log
+_REDACTED_KEYS = frozenset(('password', 'token', 'key', 'secret', 'auth'))
 
 def sanitize_error_data(data):
     """
@@ -26,23 +185,33 @@ def sanitize_error_data(data):
         data: The error data dictionary
         
     Returns:
-        dict: Sanitized error data
+        dict: Sanitized error data; the original object when nothing needed redacting
     """
-    # Make a copy to avoid modifying the original
-    sanitized = data.copy() if isinstance(data, dict) else {'error': str(data)}
-    
-    # Remove sensitive information
-    for key in list(sanitized.keys()):
-        if key.lower() in ('password', 'token', 'key', 'secret', 'auth'):
-            sanitized[key] = '[REDACTED]'
-    
-    return sanitized
+    if not isinstance(data, dict):
+        return {'error': str(data)}
+    return _redact(data)
+
+def _redact(value):
+    """Redact sensitive keys at any depth, copying only the containers that change"""
+    if isinstance(value, dict):
+        sanitized = None
+        for key, item in value.items():
+            new_item = '[REDACTED]' if key.lower() in _REDACTED_KEYS else _redact(item)
+            if new_item is not item:
+                if sanitized is None:
+                    sanitized = dict(value)
+                sanitized[key] = new_item
+        return value if sanitized is None else sanitized
+    if isinstance(value, list):
+        items = [_redact(item) for item in value]
+        return value if all(new is old for new, old in zip(items, value)) else items
+    return value
 
 @error_logging_api.route('/error-log', methods=['POST'])
 def log_client_error():
     """Log client-side errors for debugging"""
     try:
-        data = request.json
+        data = request.get_json(silent=True)
         if not data:
             return jsonify({
                 'success': False,
@@ -54,10 +223,10 @@ def log_client_error():
         
         # Add additional context
         context = {
-            'timestamp': datetime.datetime.now().isoformat(),
-            'user_email': session.get('user_email', 'anonymous'),
+            'timestamp': time.time(),
+            'user_email': g.user_email or 'anonymous',
             'ip_address': request.remote_addr,
-            'user_agent': request.user_agent.string,
+            'user_agent': request.headers.get('User-Agent', ''),
             'path': request.path,
             'method': request.method,
             'error_id': error_id
@@ -69,15 +238,15 @@ def log_client_error():
             'context': context
         }
         
-        # Create log directory if needed
-        log_dir = ensure_log_directory()
-        
-        # Create log file with unique ID
-        log_file = os.path.join(log_dir, f"client_error_{error_id}.json")
-        
-        # Write error data to file
-        with open(log_file, 'w') as f:
-            json.dump(log_data, f, indent=2)
+        # Hand the write to the background writer
+        try:
+            enqueue_log_event('client_error', error_id, context['user_email'], log_data)
+        except queue.Full:
+            current_app.logger.error(f"Client error log queue full, dropping [{error_id}]")
+            return jsonify({
+                'success': False,
+                'error': 'Error log queue is full, try again later'
+            }), 503
         
         # Log to application logger
         error_type = data.get('type', 'unknown')
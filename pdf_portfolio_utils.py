@@ -8,27 +8,103 @@ This module provides utilities for:
 """
 
 import os
-import uuid
 import json
+import mmap
+import shutil
+import hashlib
+import secrets
 import logging
+import time
 from datetime import datetime
 from io import BytesIO
 from pathlib import Path
+from collections import defaultdict
+from functools import lru_cache
 
-# PDF manipulation libraries
-from reportlab.pdfgen import canvas
+# PDF manipulation libraries; the ReportLab canvas is imported in _build_overlay,
+# so only processes that draw overlays load it
 from reportlab.lib.pagesizes import letter
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfbase.acroform import AcroForm
 from pypdf import PdfReader, PdfWriter
-from pypdf.generic import DecodedStreamObject, NameObject, DictionaryObject, create_string_object, BooleanObject
-from PyPDFForm import PdfWrapper
+from pypdf.generic import NameObject, BooleanObject
+
+# Overlay pages are letter-sized; field y coordinates are measured from the top
+PAGE_HEIGHT = letter[1]
+
+# Part of every surface cache key; bump it when overlay drawing changes so
+# surfaces built by older code are not reused
+SURFACE_CACHE_VERSION = b'1'
+# Read size used when hashing base PDFs for the surface cache
+SURFACE_HASH_BUFSIZE = 1 << 20
+# Cache entries younger than this are kept even when nothing links to them,
+# so filesystems without hard links still get some reuse
+SURFACE_CACHE_MIN_AGE = int(os.environ.get('SURFACE_CACHE_MIN_AGE', 3600))
+# Seconds between sweeps of the surface cache in one process
+SURFACE_CACHE_PRUNE_INTERVAL = int(os.environ.get('SURFACE_CACHE_PRUNE_INTERVAL', 600))
+
+# The app keeps its uploads next to this module; see UPLOAD_FOLDER_* in app.py
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _add_text_field(form, field, name, x, y, width, height):
+    form.textfield(
+        name=name,
+        x=x,
+        y=y,
+        width=width,
+        height=height,
+        tooltip=field.get('tooltip', name),
+        readonly=field.get('read_only', False)
+    )
+
+
+def _add_checkbox_field(form, field, name, x, y, width, height):
+    form.checkbox(
+        name=name,
+        x=x + width/4,
+        y=y + height/4,
+        buttonStyle='check',
+        borderColor='black',
+        fillColor='white',
+        textColor='black',
+        width=width/2,
+        height=height/2,
+        tooltip=field.get('tooltip', name)
+    )
+
+
+def _add_signature_field(form, field, name, x, y, width, height):
+    form.textfield(
+        name=name,
+        x=x,
+        y=y,
+        width=width,
+        height=height,
+        tooltip=field.get('tooltip', f"Sign here: {name}")
+    )
+
+
+def _add_date_field(form, field, name, x, y, width, height):
+    form.textfield(
+        name=name,
+        x=x,
+        y=y,
+        width=width,
+        height=height,
+        tooltip=field.get('tooltip', "Enter date (MM/DD/YYYY)")
+    )
 
 
 class SurfacePDFGenerator:
     """Generates blank surface PDFs with AcroForm fields"""
     
+    # AcroForm widget for each field type; other types are skipped
+    _FIELD_HANDLERS = {
+        'text': _add_text_field,
+        'checkbox': _add_checkbox_field,
+        'signature': _add_signature_field,
+        'date': _add_date_field,
+    }
+    
     def __init__(self, upload_dir='uploads', created_dir='uploads/created', filled_dir='uploads/filled'):
         """
         Initialize the generator with configurable paths
@@ -41,21 +117,26 @@ class SurfacePDFGenerator:
         self.upload_dir = upload_dir
         self.created_dir = created_dir
         self.filled_dir = filled_dir
+        # Surfaces keyed by base PDF and field layout; see create_surface_pdf_with_fields.
+        # Absolute, so the cache doesn't move with the working directory
+        self.surface_cache_dir = os.path.join(os.path.abspath(created_dir), 'cache')
+        self._last_cache_prune = 0.0
         
-        # Ensure directories exist
-        os.makedirs(self.upload_dir, exist_ok=True)
-        os.makedirs(self.created_dir, exist_ok=True)
-        os.makedirs(self.filled_dir, exist_ok=True)
+        # Ensure directories exist; the shared generator below is built once
+        # per process, so requests never repeat these checks
+        for directory in (self.upload_dir, self.created_dir, self.filled_dir, self.surface_cache_dir):
+            Path(directory).mkdir(parents=True, exist_ok=True)
         
         logging.debug(f"SurfacePDFGenerator initialized with: upload_dir={upload_dir}, "
                      f"created_dir={created_dir}, filled_dir={filled_dir}")
     
-    def create_form_field(self, canvas, field, page_height):
+    def create_form_field(self, canvas, form, field, page_height):
         """
         Create an individual form field on the canvas
         
         Args:
-            canvas: ReportLab canvas object
+            canvas: ReportLab canvas object, with the label font already set
+            form: The canvas's AcroForm, shared by every field on it
             field: Field definition dict with properties (name, type, x, y, width, height, etc)
             page_height: Height of the PDF page for coordinate adjustment
             
@@ -63,7 +144,10 @@ class SurfacePDFGenerator:
             None (modifies canvas in-place)
         """
         field_name = field.get('name', '')
-        field_type = field.get('type', 'text')
+        handler = self._FIELD_HANDLERS.get(field.get('type', 'text'))
+        if handler is None:
+            return
+        
         x = field.get('x', 0)
         y = field.get('y', 0)
         width = field.get('width', 100)
@@ -72,246 +156,156 @@ class SurfacePDFGenerator:
         # Adjust y-coordinate (PDF coordinates start from bottom)
         adjusted_y = page_height - y - height
         
-        # Set up form
-        form = AcroForm(canvas)
-        
-        # Add field based on type
-        if field_type == 'text':
-            canvas.rect(x, adjusted_y, width, height)
-            canvas.setFont("Helvetica", 8)
-            canvas.drawString(x + 2, adjusted_y + height + 10, field_name)
-            form.textfield(
-                name=field_name,
-                x=x,
-                y=adjusted_y,
-                width=width,
-                height=height,
-                tooltip=field.get('tooltip', field_name),
-                readonly=field.get('read_only', False)
-            )
-        elif field_type == 'checkbox':
-            canvas.rect(x, adjusted_y, width, height)
-            canvas.setFont("Helvetica", 8)
-            canvas.drawString(x + 2, adjusted_y + height + 10, field_name)
-            form.checkbox(
-                name=field_name,
-                x=x + width/4,
-                y=adjusted_y + height/4,
-                buttonStyle='check',
-                borderColor='black',
-                fillColor='white',
-                textColor='black',
-                width=width/2,
-                height=height/2,
-                tooltip=field.get('tooltip', field_name)
-            )
-        elif field_type == 'signature':
-            canvas.rect(x, adjusted_y, width, height)
-            canvas.setFont("Helvetica", 8)
-            canvas.drawString(x + 2, adjusted_y + height + 10, field_name)
-            form.textfield(
-                name=field_name,
-                x=x,
-                y=adjusted_y,
-                width=width,
-                height=height,
-                tooltip=field.get('tooltip', f"Sign here: {field_name}")
-            )
-        elif field_type == 'date':
-            canvas.rect(x, adjusted_y, width, height)
-            canvas.setFont("Helvetica", 8)
-            canvas.drawString(x + 2, adjusted_y + height + 10, field_name)
-            form.textfield(
-                name=field_name,
-                x=x,
-                y=adjusted_y,
-                width=width,
-                height=height,
-                tooltip=field.get('tooltip', "Enter date (MM/DD/YYYY)")
-            )
+        # Outline and label are the same for every field type
+        canvas.rect(x, adjusted_y, width, height)
+        canvas.drawString(x + 2, adjusted_y + height + 10, field_name)
+        handler(form, field, field_name, x, adjusted_y, width, height)
 
-    def create_surface_pdf_with_fields(self, base_pdf_path, fields, output_path=None):
+    def _build_overlay(self, base_page_count, fields):
         """
-        Create a surface PDF with AcroForm fields
+        Draw the form fields on a blank ReportLab overlay, one page per base page
         
         Args:
-            base_pdf_path: Path to the base PDF file
+            base_page_count: Number of pages in the base PDF
             fields: List of field definitions
-            output_path: Optional path for output file
             
         Returns:
-            output_path: Path to the created surface PDF
+            BytesIO: The overlay PDF
         """
-        if not output_path:
-            output_filename = f"{uuid.uuid4()}.pdf"
-            output_path = os.path.join(self.created_dir, output_filename)
+        from reportlab.pdfgen import canvas
         
-        logging.debug(f"Creating surface PDF with fields at {output_path}")
+        temp_file = BytesIO()
+        c = canvas.Canvas(temp_file, pagesize=letter)
+        # One AcroForm for the whole canvas
+        form = c.acroForm
         
-        try:
-            # Create form fields overlay using ReportLab
-            temp_file = BytesIO()
-            c = canvas.Canvas(temp_file, pagesize=letter)
-            c.setFont("Helvetica", 10)
-            
-            # Get original PDF dimensions
-            with open(base_pdf_path, 'rb') as f:
-                reader = PdfReader(f)
-                
-                # Process each page
-                for page_num in range(len(reader.pages)):
-                    # Get fields for this page
-                    page_fields = [f for f in fields if f.get('page', 0) == page_num]
-                    
-                    # Create a new page if needed
-                    if page_num > 0:
-                        c.showPage()
-                    
-                    # Add fields to this page
-                    page_height = 792  # Letter height in points
-                    for field in page_fields:
-                        self.create_form_field(c, field, page_height)
-            
-            # Save the form fields overlay
-            c.save()
-            
-            # Merge with original PDF
-            overlay_pdf = PdfReader(BytesIO(temp_file.getvalue()))
-            original_pdf = PdfReader(base_pdf_path)
-            writer = PdfWriter()
+        # Group the fields by page in one pass
+        fields_by_page = defaultdict(list)
+        for field in fields:
+            fields_by_page[field.get('page', 0)].append(field)
+        
+        # Process each page
+        for page_num in range(base_page_count):
+            # Get fields for this page
+            page_fields = fields_by_page.get(page_num, ())
             
-            # Merge each page
-            for i in range(len(original_pdf.pages)):
-                if i < len(overlay_pdf.pages):
-                    page = original_pdf.pages[i]
-                    page.merge_page(overlay_pdf.pages[i])
-                    writer.add_page(page)
-                else:
-                    writer.add_page(original_pdf.pages[i])
+            # Create a new page if needed
+            if page_num > 0:
+                c.showPage()
             
-            # Write output file
-            with open(output_path, "wb") as output_file:
-                writer.write(output_file)
-                
-            return output_path
+            # Label font, set once per page since showPage resets it
+            c.setFont("Helvetica", 8)
             
-        except Exception as e:
-            logging.error(f"Error creating surface PDF with fields: {str(e)}")
-            raise
+            # Add fields to this page
+            for field in page_fields:
+                self.create_form_field(c, form, field, PAGE_HEIGHT)
+        
+        # Save the form fields overlay
+        c.save()
+        return temp_file
+    
+    def _merge(self, base_reader, overlay, output_path):
+        """
+        Merge the overlay onto the base PDF and write the result
+        
+        Args:
+            base_reader: PdfReader for the base PDF
+            overlay: BytesIO holding the overlay from _build_overlay
+            output_path: Path for the merged PDF
+        """
+        # Read the overlay buffer in place rather than copying its bytes
+        overlay.seek(0)
+        overlay_pdf = PdfReader(overlay)
+        
+        # Clone the original PDF in one pass and merge each overlay page onto its copy
+        writer = PdfWriter(clone_from=base_reader)
+        for page, overlay_page in zip(writer.pages, overlay_pdf.pages):
+            page.merge_page(overlay_page)
+        _compress_identical_objects(writer)
+        
+        # Write output file
+        _write_pdf_atomically(writer, output_path)
     
-    def create_surface_pdf(self, base_pdf_path, form_fields, output_path=None):
+    def create_surface_pdf_with_fields(self, base_pdf_path, fields, output_path=None):
         """
         Create a surface PDF with AcroForm fields based on a base PDF
         
         Args:
             base_pdf_path: Path to the base PDF file
-            form_fields: List of field definitions to add to the PDF
-            output_path: Optional path for the output file. If None, generates one in created_dir
+            fields: List of field definitions
+            output_path: Optional path for output file. If None, generates one in created_dir
             
         Returns:
             output_path: Path to the created surface PDF
         """
         if not output_path:
-            output_filename = f"{uuid.uuid4()}.pdf"
+            output_filename = f"{secrets.token_hex(16)}.pdf"
             output_path = os.path.join(self.created_dir, output_filename)
         
         logging.debug(f"Creating surface PDF at {output_path} from base {base_pdf_path}")
-        logging.debug(f"Adding {len(form_fields)} form fields")
+        logging.debug(f"Adding {len(fields)} form fields")
         
-        # Create PDF fields using reportlab for field creation
         try:
-            # First create a PDF with fields using reportlab
-            temp_file = BytesIO()
-            c = canvas.Canvas(temp_file, pagesize=letter)
-            
-            # Set up basic form field formatting
-            c.setFont("Helvetica", 10)
-            
-            # Get original PDF dimensions to match form fields correctly
-            with open(base_pdf_path, 'rb') as f:
-                reader = PdfReader(f)
-                
-                # For each page, create a new page in the output PDF
-                for page_num in range(len(reader.pages)):
-                    # Only add fields for the requested page
-                    page_fields = [f for f in form_fields if f.get('page', 0) == page_num]
-                    
-                    # If we have fields for this page, add them
-                    if page_num > 0:  # If not the first page, create a new page
-                        c.showPage()
-                    
-                    # For each field on this page, add it
-                    for field in page_fields:
-                        field_name = field.get('name', '')
-                        field_type = field.get('type', 'text')
-                        x = field.get('x', 0)
-                        y = field.get('y', 0)  # PDF coordinates are from bottom-left
-                        width = field.get('width', 100)
-                        height = field.get('height', 20)
-                        
-                        # Adjust y-coordinate (PDF coordinates start from bottom)
-                        page_height = 792  # Letter height in points
-                        adjusted_y = page_height - y - height
-                        
-                        # Add field based on type
-                        if field_type == 'text':
-                            c.rect(x, adjusted_y, width, height)
-                            c.setFont("Helvetica", 8)
-                            c.drawString(x + 2, adjusted_y + height + 10, field_name)
-                            # Add text form field
-                            form = AcroForm(c)
-                            form.textfield(
-                                name=field_name,
-                                x=x,
-                                y=adjusted_y,
-                                width=width,
-                                height=height
-                            )
-                        elif field_type == 'checkbox':
-                            c.rect(x, adjusted_y, width, height)
-                            c.setFont("Helvetica", 8)
-                            c.drawString(x + 2, adjusted_y + height + 10, field_name)
-                            # Add checkbox form field
-                            form = AcroForm(c)
-                            form.checkbox(
-                                name=field_name,
-                                x=x + width/4,
-                                y=adjusted_y + height/4,
-                                buttonStyle='check',
-                                borderColor='black',
-                                fillColor='white',
-                                textColor='black',
-                                width=width/2,
-                                height=height/2
-                            )
-            
-            # Save the canvas with form fields
-            c.save()
-            
-            # Now merge with original PDF
-            overlay_pdf = PdfReader(BytesIO(temp_file.getvalue()))
-            original_pdf = PdfReader(base_pdf_path)
-            writer = PdfWriter()
+            # The same base PDF with the same fields always gives the same
+            # surface, so a cached one only needs linking into place
+            cache_path = os.path.join(self.surface_cache_dir, f"{_surface_cache_key(base_pdf_path, fields)}.pdf")
+            if os.path.exists(cache_path):
+                _publish_cached_pdf(cache_path, output_path)
+                logging.info(f"Surface PDF reused from cache: {output_path}")
+                return output_path
             
-            # For each page, merge the original with our form field overlay
-            for i in range(len(original_pdf.pages)):
-                if i < len(overlay_pdf.pages):
-                    page = original_pdf.pages[i]
-                    page.merge_page(overlay_pdf.pages[i])
-                    writer.add_page(page)
-                else:
-                    writer.add_page(original_pdf.pages[i])
-            
-            # Save the merged PDF to the output path
-            with open(output_path, "wb") as output_file:
-                writer.write(output_file)
+            # The base PDF is opened once and serves both the page count and the merge.
+            # /Count comes straight from the page tree root; len(pages) would
+            # flatten the whole tree before the overlay needs it
+            base_reader = PdfReader(base_pdf_path)
+            page_count = int(base_reader.trailer["/Root"]["/Pages"]["/Count"])
+            overlay = self._build_overlay(page_count, fields)
+            self._merge(base_reader, overlay, cache_path)
+            _publish_cached_pdf(cache_path, output_path)
             
             logging.info(f"Surface PDF created successfully: {output_path}")
-            return output_path
             
         except Exception as e:
             logging.error(f"Error creating surface PDF: {str(e)}")
             raise
+        
+        # Only a miss adds an entry, so only a miss needs to sweep
+        if time.monotonic() - self._last_cache_prune >= SURFACE_CACHE_PRUNE_INTERVAL:
+            self._last_cache_prune = time.monotonic()
+            self.prune_surface_cache()
+        return output_path
+    
+    def prune_surface_cache(self):
+        """
+        Remove cached surfaces that no created file uses any more
+        
+        Every surface published from the cache is a hard link to its entry,
+        so an entry whose link count is back to one has no CreatedFile left
+        pointing at its bytes.
+        
+        Returns:
+            int: Number of entries removed
+        """
+        cutoff = time.time() - SURFACE_CACHE_MIN_AGE
+        removed = 0
+        try:
+            with os.scandir(self.surface_cache_dir) as entries:
+                for entry in entries:
+                    if not entry.name.endswith('.pdf'):
+                        continue
+                    try:
+                        st = entry.stat(follow_symlinks=False)
+                        if st.st_nlink <= 1 and st.st_mtime < cutoff:
+                            os.remove(entry.path)
+                            removed += 1
+                    except FileNotFoundError:
+                        # Another process pruned it first
+                        continue
+        except OSError as e:
+            logging.error(f"Error pruning surface cache: {str(e)}")
+        if removed:
+            logging.info(f"Pruned {removed} unused surface cache entries")
+        return removed
     
     def fill_surface_pdf(self, surface_pdf_path, form_data, output_path=None):
         """
@@ -325,51 +319,60 @@ class SurfacePDFGenerator:
         Returns:
             output_path: Path to the filled PDF
         """
+        return self.fill_surface_pdf_with_metadata(surface_pdf_path, form_data, output_path)[0]
+    
+    def fill_surface_pdf_with_metadata(self, surface_pdf_path, form_data, output_path=None):
+        """
+        Fill a surface PDF and describe the result without parsing it again
+        
+        Args:
+            surface_pdf_path: Path to the surface PDF with AcroForm fields
+            form_data: Dictionary of field names and values
+            output_path: Optional path for the output file. If None, generates one in filled_dir
+            
+        Returns:
+            tuple: (path to the filled PDF, metadata dict as extract_pdf_metadata returns it)
+        """
         if not output_path:
-            output_filename = f"filled_{uuid.uuid4()}.pdf"
+            output_filename = f"filled_{secrets.token_hex(16)}.pdf"
             output_path = os.path.join(self.filled_dir, output_filename)
         
         logging.debug(f"Filling surface PDF {surface_pdf_path} with data, output to {output_path}")
         
         try:
-            # Fill the form using PyPDF
+            # Fill the form using PyPDF; cloning copies the pages and the
+            # AcroForm in one pass
             reader = PdfReader(surface_pdf_path)
-            writer = PdfWriter()
+            writer = PdfWriter(clone_from=reader)
             
             # Get form fields from the PDF
             form_fields = reader.get_fields()
             
-            # Copy all pages
-            for page_num, page in enumerate(reader.pages):
-                writer.add_page(page)
-            
-            # Get the AcroForm from the source document
-            if "/AcroForm" in reader.trailer["/Root"]:
-                writer._root_object.update({
-                    NameObject("/AcroForm"): reader.trailer["/Root"]["/AcroForm"]
-                })
+            if "/AcroForm" in writer._root_object:
+                # Have viewers draw the new values instead of the empty widget appearances
+                writer._root_object["/AcroForm"][NameObject("/NeedAppearances")] = BooleanObject(True)
                 
-                # Fill form fields with data provided
+                # Fill form fields with data provided; pypdf matches each page's
+                # widgets by name and only sets /AS on buttons
                 if form_data:
-                    for field_name, field_value in form_data.items():
-                        if field_name in form_fields:
-                            # Update the field value in the PDF
-                            field_key = list(form_fields[field_name].keys())[0]
-                            field_ref = form_fields[field_name][field_key]
-                            field = reader.get_object(field_ref)
-                            
-                            # Set the field value
-                            field.update({
-                                NameObject("/V"): create_string_object(field_value),
-                                NameObject("/AS"): NameObject(field_value) if field.get("/FT") == "/Btn" else None
-                            })
+                    for page in writer.pages:
+                        writer.update_page_form_field_values(page, form_data)
             
             # Write the output PDF
-            with open(output_path, "wb") as output_file:
-                writer.write(output_file)
+            _write_pdf_atomically(writer, output_path)
+            
+            # The writer already holds everything the metadata needs
+            metadata = {}
+            info = writer.metadata
+            if info:
+                for key in info:
+                    metadata[key] = info[key]
+            metadata['pages'] = len(writer.pages)
+            metadata['has_form'] = "/AcroForm" in writer._root_object and bool(form_fields)
+            metadata['extracted_at'] = datetime.utcnow().isoformat()
             
             logging.info(f"Form filled successfully: {output_path}")
-            return output_path
+            return output_path, metadata
             
         except Exception as e:
             logging.error(f"Error filling PDF form: {str(e)}")
@@ -385,31 +388,123 @@ class SurfacePDFGenerator:
         Returns:
             dict: Dictionary of PDF metadata
         """
-        metadata = {}
         try:
-            with open(pdf_path, 'rb') as f:
-                reader = PdfReader(f)
-                info = reader.metadata
-                
-                if info:
-                    for key in info:
-                        metadata[key] = info[key]
-                
-                # Add additional metadata
-                metadata['pages'] = len(reader.pages)
-                metadata['has_form'] = bool(reader.get_fields())
-                metadata['extracted_at'] = datetime.utcnow().isoformat()
-                
-            return metadata
+            # Unchanged files are answered from the cache; the mtime in the key
+            # makes a rewritten file miss
+            return dict(_cached_pdf_metadata(self, pdf_path, os.stat(pdf_path).st_mtime_ns))
         
         except Exception as e:
             logging.error(f"Error extracting PDF metadata: {str(e)}")
             return {'error': str(e)}
+    
+    def extract_pdf_metadata_from_reader(self, reader):
+        """
+        Extract metadata from an already opened PDF
+        
+        Args:
+            reader: PdfReader for the PDF; its stream must still be open
+            
+        Returns:
+            dict: Dictionary of PDF metadata
+        """
+        metadata = {}
+        info = reader.metadata
+        
+        if info:
+            for key in info:
+                metadata[key] = info[key]
+        
+        # Add additional metadata
+        metadata['pages'] = len(reader.pages)
+        metadata['has_form'] = bool(reader.get_fields())
+        metadata['extracted_at'] = datetime.utcnow().isoformat()
+        
+        return metadata
+
+
+def _write_pdf_atomically(writer, output_path):
+    """Write the PDF to a private temp name and rename it into place"""
+    # Readers of output_path see either the old file or the complete new one,
+    # never a half-written PDF
+    temp_path = f"{output_path}.{secrets.token_hex(16)}.part"
+    try:
+        with open(temp_path, "wb") as output_file:
+            writer.write(output_file)
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+@lru_cache(maxsize=256)
+def _file_digest(path, mtime_ns, size):
+    """Hash a file's bytes once per (path, mtime, size)"""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(SURFACE_HASH_BUFSIZE), b''):
+            h.update(chunk)
+    return h.digest()
+
+
+def _surface_cache_key(base_pdf_path, fields):
+    """Hash the base PDF's digest and the canonical field list into a cache file name"""
+    st = os.stat(base_pdf_path)
+    h = hashlib.blake2b(SURFACE_CACHE_VERSION, digest_size=16)
+    h.update(_file_digest(base_pdf_path, st.st_mtime_ns, st.st_size))
+    h.update(json.dumps(fields, sort_keys=True, separators=(',', ':')).encode())
+    return h.hexdigest()
+
+
+def _publish_cached_pdf(cache_path, output_path):
+    """Give output_path its own directory entry for a cached PDF"""
+    # A hard link costs no copy, and deleting output_path later leaves the
+    # cache intact; fall back to copying where links aren't supported
+    temp_path = f"{output_path}.{secrets.token_hex(16)}.part"
+    try:
+        try:
+            os.link(cache_path, temp_path)
+        except OSError:
+            shutil.copyfile(cache_path, temp_path)
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def _compress_identical_objects(writer):
+    """Share the resources each merged overlay page repeats, e.g. the field font"""
+    # Added in pypdf 4.3; older versions write the duplicates as before
+    if hasattr(writer, 'compress_identical_objects'):
+        writer.compress_identical_objects()
+
+
+@lru_cache(maxsize=512)
+def _cached_pdf_metadata(generator, pdf_path, mtime_ns):
+    """Parse a PDF's metadata once per (path, mtime)."""
+    # pypdf seeks and reads in small pieces while parsing; serving those
+    # from a read-only mapping avoids a syscall per read
+    with open(pdf_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return generator.extract_pdf_metadata_from_reader(PdfReader(mm))
 
 
 # Instantiate a global generator for use throughout the application
 surface_pdf_generator = SurfacePDFGenerator(
-    upload_dir='uploads',
-    created_dir='uploads/created',
-    filled_dir='uploads/filled'
+    upload_dir=os.path.join(_BASE_DIR, 'uploads'),
+    created_dir=os.path.join(_BASE_DIR, 'uploads', 'created'),
+    filled_dir=os.path.join(_BASE_DIR, 'uploads', 'filled')
 )
+
+
+def fill_surface_pdf_task(surface_pdf_path, form_data, output_path):
+    """
+    Fill a surface PDF and read back its metadata; safe to run in a worker process
+    
+    Args:
+        surface_pdf_path: Path to the surface PDF with AcroForm fields
+        form_data: Dictionary of field names and values
+        output_path: Path for the filled PDF
+        
+    Returns:
+        tuple: (filled PDF path, metadata dict)
+    """
+    return surface_pdf_generator.fill_surface_pdf_with_metadata(surface_pdf_path, form_data, output_path)
@@ -810,14 +810,53 @@ function saveForm() {
     })
     .then(data => {
         if (data.success) {
+            // Store portfolio ID for later use
+            if (data.portfolio_id) {
+                localStorage.setItem('portfolioId', data.portfolio_id);
+            }
+            
+            // The surface PDF is generated in the background; wait for it
+            if (data.status === 'pending' && data.job_id) {
+                pollSurfaceJob(data.job_id);
+                return;
+            }
+            
             showNotification('Form saved successfully', 'success');
             
             // Store created file ID for later use
             if (data.created_file_id) {
                 localStorage.setItem('createdFileId', data.created_file_id);
             }
+        } else {
+            showNotification(`Error: ${data.error || 'Unknown error'}`, 'error');
+        }
+    })
+    .catch(error => {
+        console.error('Error saving form:', error);
+        showNotification(`Error saving form: ${error.message}`, 'error');
+    });
+}
+
+/**
+ * Poll a background surface PDF job until it finishes
+ * @param {string} jobId - Job ID returned by /api/save-form-schema
+ */
+function pollSurfaceJob(jobId) {
+    fetch(`/api/form-status/${jobId}`)
+    .then(response => response.json())
+    .then(data => {
+        if (data.status === 'pending') {
+            setTimeout(() => pollSurfaceJob(jobId), 1000);
+            return;
+        }
+        
+        if (data.status === 'done') {
+            showNotification('Form saved successfully', 'success');
             
-            // Store portfolio ID for later use
+            // Store created file ID for later use
+            if (data.created_file_id) {
+                localStorage.setItem('createdFileId', data.created_file_id);
+            }
             if (data.portfolio_id) {
                 localStorage.setItem('portfolioId', data.portfolio_id);
             }
@@ -826,7 +865,7 @@ function saveForm() {
         }
     })
     .catch(error => {
-        console.error('Error saving form:', error);
+        console.error('Error checking form status:', error);
         showNotification(`Error saving form: ${error.message}`, 'error');
     });
 }